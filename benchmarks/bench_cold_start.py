@@ -0,0 +1,161 @@
+"""
+Cold-start cost of the Lambda module: import time and first-invocation latency.
+
+Every sample runs in a fresh interpreter, like a new Lambda container. AWS and
+NVD endpoints point at a local stub (DynamoDB answers {}, NVD answers no
+vulnerabilities), so the numbers cover imports, client construction and
+request handling rather than network time. Scenarios:
+
+    import        import lambda_function
+    api_analyze   POST /analyze with a 20-component SBOM (DynamoDB CVE cache off)
+    job_poll      GET /jobs/{job_id} (one DynamoDB GetItem)
+    s3_event      direct S3 invocation; the stub has no object, so one S3 GetObject fails fast
+
+--compare REV runs the same scenarios against lambda_function/ at another git
+revision, e.g. the commit before a cold-start change.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 10] [--compare REV]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCENARIOS = ['import', 'api_analyze', 'job_poll', 's3_event']
+
+WORKER = r'''
+import json, sys, time
+scenario = sys.argv[1]
+start = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+if scenario == 'api_analyze':
+    sbom = {"components": [{"name": f"lib-{i}", "version": "1.0.0", "purl": f"pkg:npm/lib-{i}@1.0.0"}
+                           for i in range(20)]}
+    event = {"httpMethod": "POST", "path": "/analyze", "body": json.dumps({"sbom": sbom})}
+elif scenario == 'job_poll':
+    event = {"httpMethod": "GET", "path": "/jobs/0123", "pathParameters": {"job_id": "0123"}}
+elif scenario == 's3_event':
+    event = {"bucket": "bench", "key": "sboms/missing.json"}
+else:
+    event = None
+status = lambda_function.lambda_handler(event, None)['statusCode'] if event else None
+done = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "first_invocation_ms": (done - imported) * 1000,
+                  "status": status}))
+'''
+
+class StubHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # Concurrent lookups overflow the default backlog of 5, stalling connects for 1s
+
+class StubEndpoint:
+    """Answers every AWS JSON-protocol POST with {} and every GET (NVD, S3) with an empty result."""
+
+    def __init__(self):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                self._reply(200, b'{}', 'application/x-amz-json-1.0')
+
+            def do_PUT(self):
+                self.do_POST()
+
+            def do_GET(self):
+                if 'cves' in self.path:
+                    self._reply(200, b'{"vulnerabilities": []}', 'application/json')
+                else:
+                    self._reply(404, b'<Error><Code>NoSuchKey</Code><Message>missing</Message></Error>',
+                                'application/xml')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = StubHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+def run_sample(lambda_dir: str, scenario: str, endpoint: str) -> Dict:
+    env = dict(os.environ,
+               PYTHONPATH=lambda_dir,
+               AWS_DEFAULT_REGION='us-east-1',
+               AWS_ACCESS_KEY_ID='bench',
+               AWS_SECRET_ACCESS_KEY='bench',
+               AWS_ENDPOINT_URL=endpoint,
+               AWS_MAX_ATTEMPTS='1',
+               NVD_API_URL=f"{endpoint}/rest/json/cves/2.0",
+               NVD_API_KEY='bench',  # API-key quota, so the 20 lookups are not rate limited
+               CVE_CACHE_TTL_SECONDS='0',
+               METRICS_ENABLED='false')
+    env.pop('AWS_PROFILE', None)
+    output = subprocess.run([sys.executable, '-c', WORKER, scenario], cwd=lambda_dir, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def extract_revision(revision: str, target: str) -> str:
+    """Write lambda_function/ as of revision into target and return its path."""
+    archive = subprocess.run(['git', 'archive', '--format=tar', revision, 'lambda_function'], cwd=REPO_DIR,
+                             check=True, capture_output=True).stdout
+    with tempfile.TemporaryFile() as f:
+        f.write(archive)
+        f.seek(0)
+        with tarfile.open(fileobj=f) as tar:
+            tar.extractall(target)
+    return os.path.join(target, 'lambda_function')
+
+def summarize(values: List[float]) -> str:
+    """Median and nearest-rank p90."""
+    ordered = sorted(values)
+    return f"{statistics.median(ordered):>9.1f} {ordered[max(0, -(-9 * len(ordered) // 10) - 1)]:>7.1f}"
+
+def measure(label: str, lambda_dir: str, endpoint: str, runs: int) -> None:
+    for scenario in SCENARIOS:
+        samples = [run_sample(lambda_dir, scenario, endpoint) for _ in range(runs)]
+        status = samples[-1]['status'] if samples[-1]['status'] is not None else ''
+        print(f"{label:<12} {scenario:<12} {summarize([sample['import_ms'] for sample in samples])} "
+              f"{summarize([sample['first_invocation_ms'] for sample in samples])} "
+              f"{summarize([sample['import_ms'] + sample['first_invocation_ms'] for sample in samples])} "
+              f"{status:>6}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--compare', help="git revision to measure as the baseline")
+    args = parser.parse_args(argv)
+
+    print(f"{'tree':<12} {'scenario':<12} {'import ms':>9} {'p90':>7} {'first ms':>9} {'p90':>7} "
+          f"{'total ms':>9} {'p90':>7} {'status':>6}")
+    with StubEndpoint() as endpoint, tempfile.TemporaryDirectory() as tmp:
+        if args.compare:
+            measure(args.compare[:12], extract_revision(args.compare, tmp), endpoint.url, args.runs)
+        measure('working', os.path.join(REPO_DIR, 'lambda_function'), endpoint.url, args.runs)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Dependency graph analysis time for 1k/10k/100k-component SBOMs.
+
+Builds synthetic CycloneDX component lists with a top-level dependencies[]
+array (about three edges per component, layered like a real package tree,
+plus a few injected cycles) and times calculate_dependency_depth, including
+transitive risk propagation from a random share of risky components.
+
+Usage:
+    python benchmarks/bench_dependency_graph.py [--sizes 1000 10000 100000] [--repeat 3] [--risky-fraction 0.05]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_function'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from lambda_function import calculate_dependency_depth  # noqa: E402
+
+def synthetic_graph(count: int, edges_per_node: int = 3, cycles: int = 5, seed: int = 11):
+    """Return (components, dependencies) for a layered graph with a handful of cycles."""
+    rng = random.Random(seed)
+    refs = [f"pkg:npm/package-{i}@1.0.0" for i in range(count)]
+    components = [{"name": f"package-{i}", "purl": ref, "bom-ref": ref} for i, ref in enumerate(refs)]
+    dependencies = []
+    for i, ref in enumerate(refs):
+        # Depend on later packages only, so the base graph is a DAG with realistic depth
+        targets = {rng.randrange(i + 1, count) for _ in range(edges_per_node) if i + 1 < count}
+        dependencies.append({"ref": ref, "dependsOn": sorted(refs[t] for t in targets)})
+    for _ in range(cycles):
+        # Close a loop by pointing a descendant back at its ancestor
+        start = node = rng.randrange(count // 2)
+        for _ in range(4):
+            if not dependencies[node]["dependsOn"]:
+                break
+            node = int(dependencies[node]["dependsOn"][0].split('-')[1].split('@')[0])
+        if node != start:
+            dependencies[node]["dependsOn"].append(refs[start])
+    return components, dependencies
+
+def synthetic_risks(components, fraction: float, seed: int = 13):
+    """Mark about `fraction` of the components risky, shaped like analyze_ofac's ofac_risks entries."""
+    rng = random.Random(seed)
+    return {component["bom-ref"]: {"risk_score": round(rng.random(), 2), "risk_factors": {"cve_risk": "CRITICAL"}}
+            for component in components if rng.random() < fraction}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--risky-fraction', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    print(f"{'components':>10} {'edges':>8} {'max depth':>9} {'longest':>8} {'cycles':>7} {'risky':>7} "
+          f"{'roots at risk':>13} {'best ms':>9}")
+    for count in args.sizes:
+        components, dependencies = synthetic_graph(count)
+        component_risks = synthetic_risks(components, args.risky_fraction)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = calculate_dependency_depth(components, dependencies, component_risks)
+            timings.append(time.perf_counter() - start)
+        transitive_risk = result['transitive_risk']
+        print(f"{count:>10} {result['dependency_edges']:>8} {result['max_depth']:>9} "
+              f"{result['longest_path_length']:>8} {result['cycles_detected']:>7} "
+              f"{transitive_risk['risky_components']:>7} {transitive_risk['direct_dependencies_at_risk']:>13} "
+              f"{min(timings) * 1000:>9.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
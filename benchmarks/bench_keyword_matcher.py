@@ -0,0 +1,82 @@
+"""
+OFAC keyword matching cost per domain for growing keyword lists.
+
+Compares the original per-keyword substring loop, a single combined regex
+(re alternation, which only reports non-overlapping matches) and the
+Aho-Corasick KeywordMatcher, for the built-in keywords plus synthetic
+city/transliteration/organization-like keywords up to 50k entries.
+
+Usage:
+    python benchmarks/bench_keyword_matcher.py [--keywords 1000 10000 50000] [--domains 2000]
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_function'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from keyword_matcher import KeywordMatcher  # noqa: E402
+from lambda_function import OFAC_COUNTRIES  # noqa: E402
+
+def synthetic_keywords(count: int, seed: int = 3) -> dict:
+    """OFAC_COUNTRIES padded with random lowercase words of 5-14 letters."""
+    rng = random.Random(seed)
+    keywords = dict(OFAC_COUNTRIES)
+    while len(keywords) < count:
+        word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 14)))
+        keywords.setdefault(word, 'Synthetic')
+    return keywords
+
+def synthetic_domains(count: int, keywords: dict, seed: int = 4) -> list:
+    """Mostly clean domains; about 5% embed a keyword."""
+    rng = random.Random(seed)
+    words = list(keywords)
+    domains = []
+    for _ in range(count):
+        label = ''.join(rng.choice(string.ascii_lowercase + '-') for _ in range(rng.randint(6, 20))).strip('-') or 'x'
+        if rng.random() < 0.05:
+            label = f"{label}-{rng.choice(words)}"
+        domains.append(f"{label}.{rng.choice(['com', 'org', 'io', 'net'])}")
+    return domains
+
+def naive_scan(keywords: dict, domain: str) -> list:
+    return [keyword for keyword in keywords if keyword in domain]
+
+def time_per_domain(match, domains: list) -> float:
+    start = time.perf_counter()
+    for domain in domains:
+        match(domain)
+    return (time.perf_counter() - start) / len(domains) * 1e6
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keywords', type=int, nargs='+', default=[len(OFAC_COUNTRIES), 1000, 10000, 50000])
+    parser.add_argument('--domains', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"{'keywords':>8} {'build ms':>9} {'naive us':>9} {'regex us':>9} {'matcher us':>11} {'hits':>6}")
+    for count in args.keywords:
+        keywords = synthetic_keywords(count)
+        domains = synthetic_domains(args.domains, keywords)
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build_ms = (time.perf_counter() - start) * 1000
+        # Longest first, so alternation prefers "tehran" over any shorter keyword at the same position
+        pattern = re.compile('|'.join(map(re.escape, sorted(keywords, key=len, reverse=True))))
+
+        naive = time_per_domain(lambda domain: naive_scan(keywords, domain), domains)
+        regex = time_per_domain(pattern.findall, domains)
+        compiled = time_per_domain(matcher.find_all, domains)
+        hits = sum(1 for domain in domains if matcher.find_all(domain))
+        assert hits == sum(1 for domain in domains if naive_scan(keywords, domain))
+        print(f"{count:>8} {build_ms:>9.1f} {naive:>9.1f} {regex:>9.1f} {compiled:>11.1f} {hits:>6}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
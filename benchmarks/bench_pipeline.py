@@ -0,0 +1,304 @@
+"""
+End-to-end analysis pipeline benchmark with per-stage latency, throughput and memory.
+
+Generates seeded synthetic SBOMs (synthetic_sbom.py), serves CVE lookups from a
+local stub of the NVD API with configurable latency, and runs the S3 pipeline
+minus the network: JSON parsing (or streaming ingestion), analyze_ofac and
+serialization of the report. Stage timings come from the same Metrics stages the
+Lambda reports in metadata.stages, so results map directly onto production
+metrics. Every run starts with cold in-process caches, and the DynamoDB CVE
+cache is not used.
+
+For each SBOM size the timed runs give p50/p99 latency and throughput
+(components per second at the p50) per stage; one extra run under tracemalloc
+gives each stage's peak traced memory. --output appends the results as one JSON
+line, so a file of runs tracks regressions over time.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes 1000 10000] [--repeat 5] [--ecosystems npm=0.5 pypi=0.5]
+        [--fan-out 3] [--depth 6] [--ofac-email-share 0.01] [--seed 7] [--nvd-latency-ms 5]
+        [--nvd-jitter-ms 2] [--vulnerable-share 0.1] [--ingest buffered|streaming] [--workers 8]
+        [--output-format json|ndjson] [--no-memory] [--output results.jsonl]
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'lambda_function'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import lambda_function  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from result_writer import upload_analysis  # noqa: E402
+from sbom_stream import StreamingSBOMReader  # noqa: E402
+from synthetic_sbom import generate_sbom, parse_ecosystem_mix  # noqa: E402
+
+class StubHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # Concurrent lookups overflow the default backlog of 5, stalling connects for 1s
+
+class StubNVDResponder:
+    """
+    Local NVD API stand-in. A deterministic share of package names has one to
+    three HIGH/CRITICAL CVEs (without version ranges, so every version matches);
+    each response is delayed by latency_ms plus up to jitter_ms.
+    """
+
+    def __init__(self, latency_ms: float = 5.0, jitter_ms: float = 0.0, vulnerable_share: float = 0.1,
+                 seed: int = 7):
+        responder = self
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.vulnerable_share = vulnerable_share
+        self.seed = seed
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API behind the pooled session
+            disable_nagle_algorithm = True  # Headers and body are separate writes
+
+            def do_GET(self):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                body = json.dumps(responder.response_for(query.get('keywordSearch', [''])[0])).encode('utf-8')
+                responder.delay()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = StubHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/rest/json/cves/2.0"
+
+    def delay(self) -> None:
+        with self._lock:
+            self.requests += 1
+            jitter = random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        if self.latency_ms or jitter:
+            time.sleep((self.latency_ms + jitter) / 1000)
+
+    def response_for(self, package_name: str) -> Dict:
+        digest = zlib.crc32(f"{self.seed}:{package_name}".encode('utf-8'))
+        if digest % 10000 >= self.vulnerable_share * 10000:
+            return {"vulnerabilities": []}
+        vulnerabilities = []
+        for index in range(1 + digest % 3):
+            score = 7.0 + (digest >> (4 * index)) % 30 / 10
+            vulnerabilities.append({"cve": {
+                "id": f"CVE-2024-{digest % 90000 + 10000}{index}",
+                "published": "2024-01-01T00:00:00.000",
+                "lastModified": "2024-01-02T00:00:00.000",
+                "descriptions": [{"lang": "en", "value": f"Synthetic vulnerability in {package_name}"}],
+                "metrics": {"cvssMetricV31": [{"cvssData": {
+                    "baseScore": score, "baseSeverity": "CRITICAL" if score >= 9.0 else "HIGH"}}]}
+            }})
+        return {"vulnerabilities": vulnerabilities}
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+class NullS3Client:
+    """Accepts uploads and discards them, so output_write measures serialization and compression only."""
+
+    def put_object(self, **kwargs):
+        return {}
+
+    def create_multipart_upload(self, **kwargs):
+        return {'UploadId': 'bench'}
+
+    def upload_part(self, **kwargs):
+        return {'ETag': f"etag-{kwargs['PartNumber']}"}
+
+    def complete_multipart_upload(self, **kwargs):
+        return {}
+
+    def abort_multipart_upload(self, **kwargs):
+        return {}
+
+class MemoryProfilingMetrics(Metrics):
+    """
+    Metrics that also record the peak traced memory of each stage. Stages end
+    with add_stage and never overlap, so the peak since the previous add_stage
+    belongs to the stage being recorded.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.peak_bytes: Dict[str, int] = {}
+
+    def add_stage(self, name: str, seconds: float, calls: int = 1) -> None:
+        super().add_stage(name, seconds, calls)
+        peak = tracemalloc.get_traced_memory()[1]
+        self.peak_bytes[name] = max(self.peak_bytes.get(name, 0), peak)
+        tracemalloc.reset_peak()
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def run_pipeline(body: bytes, args, metrics: Metrics) -> Dict:
+    """One cold run of parse -> analyze -> serialize. Returns the analysis results."""
+    lambda_function.clear_memo_caches()
+    if args.ingest == 'streaming':
+        reader = StreamingSBOMReader(io.BytesIO(body))
+        results = lambda_function.analyze_ofac(reader.document, max_workers=args.workers,
+                                               components=reader.components(), metrics=metrics)
+    else:
+        with metrics.stage('json_parse'):
+            sbom_data = json.loads(body.decode('utf-8'))
+        results = lambda_function.analyze_ofac(sbom_data, max_workers=args.workers, metrics=metrics)
+    with metrics.stage('output_write'):
+        upload_analysis(NullS3Client(), 'bench', 'analysis/bench.json', results, output_format=args.output_format,
+                        pretty=False, content_encoding=args.content_encoding)
+    return results
+
+def benchmark_size(count: int, args) -> Dict:
+    sbom = generate_sbom(count, args.ecosystem_mix, args.fan_out, args.depth, args.ofac_email_share, args.seed)
+    body = json.dumps(sbom).encode('utf-8')
+    del sbom
+
+    stage_seconds: Dict[str, List[float]] = {}
+    stage_calls: Dict[str, int] = {}
+    totals, nvd_latency = [], []
+    results = None
+    for run in range(args.warmup + args.repeat):
+        lambda_function.invocation_metrics.reset()
+        metrics = Metrics()
+        start = time.perf_counter()
+        results = run_pipeline(body, args, metrics)
+        elapsed = time.perf_counter() - start
+        if run < args.warmup:
+            continue
+        totals.append(elapsed)
+        for name, stage in metrics.breakdown().items():
+            stage_seconds.setdefault(name, []).append(stage['seconds'])
+            stage_calls[name] = stage['calls']
+        nvd_latency.extend(lambda_function.invocation_metrics.samples.get('NVDRequestLatency', ('', []))[1])
+    nvd_requests = lambda_function.invocation_metrics.counters.get('NVDRequests', 0)
+
+    peak_bytes = {}
+    if args.memory:
+        tracemalloc.start()
+        try:
+            metrics = MemoryProfilingMetrics()
+            run_pipeline(body, args, metrics)
+            peak_bytes = metrics.peak_bytes
+        finally:
+            tracemalloc.stop()
+
+    def summarize(seconds: List[float], calls: Optional[int] = None, peak: Optional[int] = None) -> Dict:
+        p50 = percentile(seconds, 0.5)
+        return {
+            'calls': calls,
+            'p50_ms': round(p50 * 1000, 3),
+            'p99_ms': round(percentile(seconds, 0.99) * 1000, 3),
+            'components_per_second': round(count / p50, 1) if p50 else None,
+            'peak_traced_mib': round(peak / 2 ** 20, 2) if peak is not None else None
+        }
+
+    return {
+        'components': count,
+        'sbom_bytes': len(body),
+        'components_with_cves': results['cve_analysis']['components_with_cves'],
+        'ofac_risks': len(results['ofac_risks']),
+        'max_dependency_depth': results['dependency_analysis']['max_depth'],
+        'nvd_requests_per_run': nvd_requests,
+        'nvd_latency_p50_ms': round(percentile(nvd_latency, 0.5), 3) if nvd_latency else None,
+        'nvd_latency_p99_ms': round(percentile(nvd_latency, 0.99), 3) if nvd_latency else None,
+        'stages': {name: summarize(seconds, stage_calls[name], peak_bytes.get(name))
+                   for name, seconds in stage_seconds.items()},
+        'total': summarize(totals, peak=max(peak_bytes.values()) if peak_bytes else None)
+    }
+
+def print_report(report: Dict) -> None:
+    print(f"\n{report['components']} components, {report['sbom_bytes'] / 1e6:.1f} MB: "
+          f"{report['components_with_cves']} with CVEs, {report['ofac_risks']} OFAC risks, "
+          f"depth {report['max_dependency_depth']}, {report['nvd_requests_per_run']} NVD requests "
+          f"(p50 {report['nvd_latency_p50_ms']} ms, p99 {report['nvd_latency_p99_ms']} ms)")
+    print(f"{'stage':<20} {'calls':>6} {'p50 ms':>10} {'p99 ms':>10} {'components/s':>13} {'peak MiB':>9}")
+    for name, stage in list(report['stages'].items()) + [('total', report['total'])]:
+        calls = '' if stage['calls'] is None else stage['calls']
+        throughput = '' if stage['components_per_second'] is None else f"{stage['components_per_second']:.0f}"
+        peak = '' if stage['peak_traced_mib'] is None else f"{stage['peak_traced_mib']:.1f}"
+        print(f"{name:<20} {calls:>6} {stage['p50_ms']:>10.1f} {stage['p99_ms']:>10.1f} {throughput:>13} {peak:>9}")
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--ecosystems', nargs='+', default=None, help="ecosystem=weight pairs")
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--ofac-email-share', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--nvd-latency-ms', type=float, default=5.0)
+    parser.add_argument('--nvd-jitter-ms', type=float, default=2.0)
+    parser.add_argument('--vulnerable-share', type=float, default=0.1)
+    parser.add_argument('--ingest', choices=['buffered', 'streaming'], default='buffered')
+    parser.add_argument('--workers', type=int, default=lambda_function.CVE_LOOKUP_CONCURRENCY)
+    parser.add_argument('--output-format', choices=['json', 'ndjson'], default='json')
+    parser.add_argument('--content-encoding', choices=['none', 'gzip', 'zstd'], default='none')
+    parser.add_argument('--no-memory', dest='memory', action='store_false')
+    parser.add_argument('--output', help="append the results as one JSON line to this file")
+    args = parser.parse_args(argv)
+    args.ecosystem_mix = parse_ecosystem_mix(args.ecosystems) if args.ecosystems else None
+    random.seed(args.seed)
+
+    with StubNVDResponder(args.nvd_latency_ms, args.nvd_jitter_ms, args.vulnerable_share, args.seed) as responder, \
+            patch.object(lambda_function, 'NVD_API_URL', responder.url), \
+            patch.object(lambda_function, 'CVE_SOURCE', 'online'), \
+            patch.object(lambda_function, '_nvd_rate_limiter',
+                         lambda_function.TokenBucket(rate_per_second=1e6, capacity=1e6)):
+        reports = [benchmark_size(count, args) for count in args.sizes]
+
+    for report in reports:
+        print_report(report)
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ('output', 'ecosystems')}
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({
+                'timestamp': datetime.utcnow().isoformat(),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'config': config,
+                'results': reports
+            }) + '\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
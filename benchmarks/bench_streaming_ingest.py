@@ -0,0 +1,98 @@
+"""
+Peak RSS of buffered vs streaming SBOM ingestion.
+
+Generates synthetic CycloneDX SBOMs with 1k/10k/100k components and analyzes
+each one in a fresh subprocess, either the buffered way (read + decode +
+json.loads) or through StreamingSBOMReader. CVE lookups are stubbed out so
+only parsing and analysis memory is measured.
+
+Usage:
+    python benchmarks/bench_streaming_ingest.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_function')
+ECOSYSTEMS = ['pypi', 'npm', 'maven', 'nuget']
+
+WORKER = r'''
+import json, os, resource, sys, time
+sys.path.insert(0, sys.argv[3])
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+from unittest.mock import patch
+import lambda_function
+from sbom_stream import StreamingSBOMReader
+
+mode, path = sys.argv[1], sys.argv[2]
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+with patch('lambda_function.fetch_cve_candidates', lambda name, ecosystem: []):
+    with open(path, 'rb') as body:
+        if mode == 'buffered':
+            sbom_data = json.loads(body.read().decode('utf-8'))
+            results = lambda_function.analyze_ofac(sbom_data)
+        else:
+            reader = StreamingSBOMReader(body)
+            results = lambda_function.analyze_ofac(reader.document, components=reader.components())
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'baseline_kb': baseline, 'peak_kb': peak, 'seconds': elapsed,
+                  'components': results['components_analyzed']}))
+'''
+
+def write_synthetic_sbom(path: str, count: int, seed: int = 7) -> int:
+    """Write a CycloneDX SBOM with `count` components. Returns the file size in bytes."""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('{"bomFormat": "CycloneDX", "specVersion": "1.4", "version": 1, "components": [')
+        for i in range(count):
+            ecosystem = ECOSYSTEMS[i % len(ECOSYSTEMS)]
+            version = f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 99)}"
+            component = {
+                "type": "library",
+                "name": f"package-{i}",
+                "version": version,
+                "purl": f"pkg:{ecosystem}/package-{i}@{version}",
+                "bom-ref": f"pkg:{ecosystem}/package-{i}@{version}",
+                "description": "Synthetic component " * 8,
+                "licenses": [{"license": {"id": "MIT"}}],
+                "properties": [
+                    {"name": "author_email", "value": f"dev{i}@{'example.ir' if rng.random() < 0.01 else 'example.com'}"},
+                    {"name": "maintainer_email", "value": f"maint{i}@example.org"},
+                ],
+            }
+            if i:
+                f.write(',')
+            json.dump(component, f)
+        f.write(']}')
+    return os.path.getsize(path)
+
+def run_worker(mode: str, path: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', WORKER, mode, path, LAMBDA_DIR],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args(argv)
+
+    print(f"{'components':>10} {'file MB':>8} {'mode':>9} {'peak RSS MB':>12} {'over baseline MB':>17} {'seconds':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.sizes:
+            path = os.path.join(tmp, f'sbom_{count}.json')
+            size = write_synthetic_sbom(path, count)
+            for mode in ('buffered', 'streaming'):
+                result = run_worker(mode, path)
+                assert result['components'] == count
+                print(f"{count:>10} {size / 1e6:>8.1f} {mode:>9} {result['peak_kb'] / 1024:>12.1f} "
+                      f"{(result['peak_kb'] - result['baseline_kb']) / 1024:>17.1f} {result['seconds']:>8.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
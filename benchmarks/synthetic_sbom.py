@@ -0,0 +1,104 @@
+"""
+Seeded synthetic CycloneDX SBOMs for benchmarks.
+
+The same arguments and seed always produce the same document, so timings from
+different commits compare like for like. Components are spread over the
+requested ecosystem mix and arranged in `depth` dependency layers below a root
+application; each component depends on `fan_out` components of the next layer.
+A share of components carries an author email on a sanctioned-country domain.
+
+Usage:
+    python benchmarks/synthetic_sbom.py out.json [--components 10000] [--ecosystems npm=0.4 pypi=0.3 maven=0.2 nuget=0.1]
+        [--fan-out 3] [--depth 6] [--ofac-email-share 0.01] [--seed 7]
+"""
+import argparse
+import json
+import random
+import sys
+from typing import Dict, List, Optional
+
+DEFAULT_ECOSYSTEM_MIX = {'npm': 0.4, 'pypi': 0.3, 'maven': 0.2, 'nuget': 0.1}
+OFAC_EMAIL_DOMAINS = ['mail.ir', 'example.cu', 'dev.kp', 'corp.sy', 'inbox.ru', 'tech.by']
+CLEAN_EMAIL_DOMAINS = ['example.com', 'example.org', 'users.noreply.github.com', 'example.de']
+ROOT_REF = 'pkg:generic/benchmark-app@1.0.0'
+
+def parse_ecosystem_mix(pairs: List[str]) -> Dict[str, float]:
+    """Parse ['npm=0.5', 'pypi=0.5'] into a weight mapping."""
+    mix = {}
+    for pair in pairs:
+        ecosystem, _, weight = pair.partition('=')
+        mix[ecosystem] = float(weight or 1)
+    return mix
+
+def package_url(ecosystem: str, index: int, version: str) -> str:
+    if ecosystem == 'maven':
+        return f"pkg:maven/com.example.bench/lib-{index}@{version}"
+    return f"pkg:{ecosystem}/lib-{index}@{version}"
+
+def generate_sbom(components: int, ecosystem_mix: Optional[Dict[str, float]] = None, fan_out: int = 3,
+                  depth: int = 6, ofac_email_share: float = 0.01, seed: int = 7) -> Dict:
+    """Build a CycloneDX 1.4 document with the given shape."""
+    rng = random.Random(seed)
+    mix = ecosystem_mix or DEFAULT_ECOSYSTEM_MIX
+    ecosystems, weights = list(mix), list(mix.values())
+    depth = max(1, depth)
+
+    sbom_components = []
+    for index in range(components):
+        ecosystem = rng.choices(ecosystems, weights)[0]
+        version = f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 99)}"
+        purl = package_url(ecosystem, index, version)
+        flagged = rng.random() < ofac_email_share
+        domain = rng.choice(OFAC_EMAIL_DOMAINS if flagged else CLEAN_EMAIL_DOMAINS)
+        sbom_components.append({
+            "type": "library",
+            "bom-ref": purl,
+            "name": f"lib-{index}",
+            "version": version,
+            "purl": purl,
+            "licenses": [{"license": {"id": rng.choice(['MIT', 'Apache-2.0', 'BSD-3-Clause'])}}],
+            "properties": [
+                {"name": "author_email", "value": f"author{index}@{domain}"},
+                {"name": "maintainer_email", "value": f"maint{index}@{rng.choice(CLEAN_EMAIL_DOMAINS)}"}
+            ]
+        })
+
+    # Contiguous layers; layer 0 holds the root application's direct dependencies
+    layer_size = max(1, -(-components // depth))
+    layers = [sbom_components[start:start + layer_size] for start in range(0, components, layer_size)]
+    dependencies = [{"ref": ROOT_REF, "dependsOn": [component["bom-ref"] for component in layers[0]] if layers else []}]
+    for level, layer in enumerate(layers):
+        below = layers[level + 1] if level + 1 < len(layers) else []
+        for component in layer:
+            targets = rng.sample(below, min(fan_out, len(below))) if below else []
+            dependencies.append({"ref": component["bom-ref"], "dependsOn": [target["bom-ref"] for target in targets]})
+
+    return {
+        "bomFormat": "CycloneDX",
+        "specVersion": "1.4",
+        "version": 1,
+        "metadata": {"component": {"type": "application", "bom-ref": ROOT_REF, "name": "benchmark-app",
+                                   "version": "1.0.0"}},
+        "components": sbom_components,
+        "dependencies": dependencies
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output')
+    parser.add_argument('--components', type=int, default=10000)
+    parser.add_argument('--ecosystems', nargs='+', default=None, help="ecosystem=weight pairs")
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--ofac-email-share', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    sbom = generate_sbom(args.components, parse_ecosystem_mix(args.ecosystems) if args.ecosystems else None,
+                         args.fan_out, args.depth, args.ofac_email_share, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(sbom, f)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
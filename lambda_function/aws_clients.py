@@ -0,0 +1,138 @@
+"""
+Lazily constructed AWS clients and a low-level DynamoDB table wrapper.
+
+Importing boto3, building each client and above all building the DynamoDB
+resource layer are a large share of a cold start, yet many invocations (job
+polling, component queries, API analyses with the CVE cache off) need only
+some of them. Clients are built on first use and cached for the life of the
+container.
+
+DynamoDB is used through the low-level client, which is much cheaper to build
+than boto3.resource('dynamodb'). DynamoDBTable offers the part of the resource
+Table interface the analyzer uses, with plain Python items in and out (numbers
+come back as Decimal, as from the resource), and converts to and from
+attribute values itself.
+"""
+import threading
+from typing import Dict, List, Optional
+
+from lazy_import import LazyModule
+
+boto3 = LazyModule('boto3')
+dynamodb_types = LazyModule('boto3.dynamodb.types')
+dynamodb_table = LazyModule('boto3.dynamodb.table')
+
+_clients = {}
+_clients_lock = threading.Lock()
+_codec = None
+
+def get_client(service_name: str):
+    """The shared client for service_name, built on first use."""
+    client = _clients.get(service_name)
+    if client is None:
+        # boto3's default session is not thread-safe, so clients are built under the lock
+        with _clients_lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = _clients[service_name] = boto3.client(service_name)
+    return client
+
+def _serializers():
+    global _codec
+    if _codec is None:
+        _codec = (dynamodb_types.TypeSerializer(), dynamodb_types.TypeDeserializer())
+    return _codec
+
+def serialize_item(item: Dict) -> Dict:
+    """Python values -> DynamoDB attribute values. Floats are rejected, as by the resource."""
+    serializer = _serializers()[0]
+    return {name: serializer.serialize(value) for name, value in item.items()}
+
+def deserialize_item(item: Dict) -> Dict:
+    deserializer = _serializers()[1]
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
+
+def _serialize_expression_values(kwargs: Dict) -> Dict:
+    if 'ExpressionAttributeValues' in kwargs:
+        kwargs = dict(kwargs, ExpressionAttributeValues=serialize_item(kwargs['ExpressionAttributeValues']))
+    return kwargs
+
+class DynamoDBTable:
+    """One table, accessed through the shared low-level DynamoDB client."""
+
+    def __init__(self, name: str, client=None):
+        self.name = name
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_client('dynamodb')
+
+    def get_item(self, Key: Dict, **kwargs) -> Dict:
+        response = self.client.get_item(TableName=self.name, Key=serialize_item(Key), **kwargs)
+        if 'Item' in response:
+            response['Item'] = deserialize_item(response['Item'])
+        return response
+
+    def put_item(self, Item: Dict, **kwargs) -> Dict:
+        return self.client.put_item(TableName=self.name, Item=serialize_item(Item),
+                                    **_serialize_expression_values(kwargs))
+
+    def delete_item(self, Key: Dict, **kwargs) -> Dict:
+        return self.client.delete_item(TableName=self.name, Key=serialize_item(Key),
+                                       **_serialize_expression_values(kwargs))
+
+    def update_item(self, Key: Dict, **kwargs) -> Dict:
+        response = self.client.update_item(TableName=self.name, Key=serialize_item(Key),
+                                           **_serialize_expression_values(kwargs))
+        if 'Attributes' in response:
+            response['Attributes'] = deserialize_item(response['Attributes'])
+        return response
+
+    def query(self, **kwargs) -> Dict:
+        """Query with a string KeyConditionExpression and plain ExpressionAttributeValues."""
+        if 'ExclusiveStartKey' in kwargs:
+            kwargs['ExclusiveStartKey'] = serialize_item(kwargs['ExclusiveStartKey'])
+        response = self.client.query(TableName=self.name, **_serialize_expression_values(kwargs))
+        response['Items'] = [deserialize_item(item) for item in response.get('Items', [])]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = deserialize_item(response['LastEvaluatedKey'])
+        return response
+
+    def batch_writer(self, overwrite_by_pkeys: Optional[List[str]] = None) -> 'BatchWriter':
+        return BatchWriter(dynamodb_table.BatchWriter(self.name, self.client, overwrite_by_pkeys=overwrite_by_pkeys))
+
+class BatchWriter:
+    """
+    Context manager that buffers puts and deletes into BatchWriteItem calls
+    (boto3's BatchWriter, which also resends unprocessed items).
+    """
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def put_item(self, Item: Dict) -> None:
+        self._writer.put_item(Item=serialize_item(Item))
+
+    def delete_item(self, Key: Dict) -> None:
+        self._writer.delete_item(Key=serialize_item(Key))
+
+    def __enter__(self) -> 'BatchWriter':
+        self._writer.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._writer.__exit__(*exc_info)
+
+def batch_get_item(RequestItems: Dict, client=None) -> Dict:
+    """BatchGetItem with plain keys and items, like the resource's batch_get_item."""
+    client = client or get_client('dynamodb')
+    request = {table: dict(spec, Keys=[serialize_item(key) for key in spec['Keys']])
+               for table, spec in RequestItems.items()}
+    response = client.batch_get_item(RequestItems=request)
+    response['Responses'] = {table: [deserialize_item(item) for item in items]
+                             for table, items in response.get('Responses', {}).items()}
+    if response.get('UnprocessedKeys'):
+        response['UnprocessedKeys'] = {table: dict(spec, Keys=[deserialize_item(key) for key in spec['Keys']])
+                                       for table, spec in response['UnprocessedKeys'].items()}
+    return response
@@ -0,0 +1,155 @@
+"""
+Fleet-wide inverted index of SBOM components in DynamoDB.
+
+Every analyzed SBOM writes one item per component it contains:
+
+    package (hash key)   pkg:maven/org.apache.logging.log4j/log4j-core
+    entry (range key)    2.14.1#<sbom_id>
+
+so "which SBOMs contain log4j-core 2.14?" is a single Query on the package
+with a begins_with condition on the version. A KEYS_ONLY global secondary
+index on sbom_id lists an SBOM's entries, so reprocessing an SBOM replaces its
+entries instead of accumulating stale ones. A second index on the lowercased
+product name (the part of the component name CVE data refers to) finds every
+SBOM containing a package named in a new CVE, whatever its purl namespace.
+"""
+import base64
+import json
+import urllib.parse
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+SBOM_INDEX_NAME = 'sbom-index'
+PRODUCT_INDEX_NAME = 'product-index'
+MAX_QUERY_LIMIT = 1000
+
+def split_purl(purl: str) -> Optional[Tuple[str, str]]:
+    """Split a package URL into (package, version), dropping qualifiers and subpath."""
+    if not purl or not purl.startswith('pkg:'):
+        return None
+    purl = purl.split('#', 1)[0].split('?', 1)[0]
+    # The version follows the last '@'; an '@' inside the name is percent-encoded (%40)
+    package, separator, version = purl.rpartition('@')
+    if not separator or '/' not in package:
+        return purl, ''
+    return package, version
+
+def product_name(purl_package: str, name: Optional[str] = None) -> str:
+    """Lowercased last segment of the component name (or the purl's name), as matched against CVE products."""
+    return (name or urllib.parse.unquote(purl_package.rsplit('/', 1)[-1])).lower().split('/')[-1]
+
+class ComponentIndex:
+    """
+    Maintain and query the purl -> SBOM index in the given table (an
+    aws_clients.DynamoDBTable, or anything with the same interface).
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @staticmethod
+    def entry_key(package: str, version: str, sbom_id: str) -> Dict:
+        return {'package': package, 'entry': f"{version}#{sbom_id}"}
+
+    def _existing_keys(self, sbom_id: str) -> Set[Tuple[str, str]]:
+        keys = set()
+        query = {'IndexName': SBOM_INDEX_NAME, 'KeyConditionExpression': 'sbom_id = :sbom_id',
+                 'ExpressionAttributeValues': {':sbom_id': sbom_id}}
+        while True:
+            response = self.table.query(**query)
+            keys.update((item['package'], item['entry']) for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return keys
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def update(self, sbom_id: str, components: Iterable[Tuple[str, str]], source_key: Optional[str] = None) -> Dict:
+        """
+        Make the index entries for sbom_id exactly the given (purl, name) pairs.
+        Rewriting an unchanged SBOM produces the same items, so reprocessing is idempotent.
+        """
+        entries = {}
+        for purl, name in components:
+            parts = split_purl(purl)
+            if parts:
+                item = self.entry_key(parts[0], parts[1], sbom_id)
+                entries[(item['package'], item['entry'])] = (parts[1], purl, name)
+        stale = self._existing_keys(sbom_id) - entries.keys()
+
+        indexed_at = datetime.utcnow().isoformat()
+        with self.table.batch_writer(overwrite_by_pkeys=['package', 'entry']) as batch:
+            for (package, entry), (version, purl, name) in entries.items():
+                batch.put_item(Item={
+                    'package': package,
+                    'entry': entry,
+                    'sbom_id': sbom_id,
+                    'version': version,
+                    'purl': purl,
+                    'name': name or '',
+                    'product': product_name(package, name),
+                    'source_key': source_key or '',
+                    'indexed_at': indexed_at
+                })
+            for package, entry in stale:
+                batch.delete_item(Key={'package': package, 'entry': entry})
+        return {'entries': len(entries), 'removed': len(stale)}
+
+    def query(self, package: str, version: Optional[str] = None, exact: bool = False,
+              limit: int = MAX_QUERY_LIMIT, next_token: Optional[str] = None) -> Dict:
+        """
+        SBOMs containing package, optionally restricted to versions starting
+        with version (or equal to it when exact is set). Results are paged
+        with an opaque next_token; one that was not issued for this query
+        raises ValueError.
+        """
+        condition, values = '#package = :package', {':package': package}
+        if version:
+            condition += ' AND begins_with(#entry, :version)'
+            values[':version'] = f"{version}#" if exact else version
+        query = {'KeyConditionExpression': condition, 'ExpressionAttributeValues': values,
+                 'ExpressionAttributeNames': {'#package': 'package', **({'#entry': 'entry'} if version else {})},
+                 'Limit': max(1, min(limit, MAX_QUERY_LIMIT))}
+        if next_token:
+            query['ExclusiveStartKey'] = self._start_key(next_token, package, values.get(':version', ''))
+        response = self.table.query(**query)
+
+        matches = [{
+            'sbom_id': item['sbom_id'],
+            'version': item.get('version', ''),
+            'purl': item.get('purl', ''),
+            'source_key': item.get('source_key', ''),
+            'indexed_at': item.get('indexed_at', '')
+        } for item in response.get('Items', [])]
+        result = {'package': package, 'version': version, 'exact': exact, 'count': len(matches),
+                  'sbom_ids': sorted({match['sbom_id'] for match in matches}), 'matches': matches}
+        if 'LastEvaluatedKey' in response:
+            result['next_token'] = base64.urlsafe_b64encode(
+                json.dumps(response['LastEvaluatedKey']).encode('utf-8')).decode('ascii')
+        return result
+
+    @staticmethod
+    def _start_key(next_token: str, package: str, entry_prefix: str) -> Dict:
+        """
+        Decode a next_token back into an ExclusiveStartKey. DynamoDB rejects a
+        key of the wrong shape or outside the query's key condition, so those
+        are caught here and reported as ValueError.
+        """
+        key = json.loads(base64.urlsafe_b64decode(next_token.encode('ascii')))
+        if not isinstance(key, dict) or set(key) != {'package', 'entry'} or \
+                not all(isinstance(value, str) for value in key.values()):
+            raise ValueError("next_token is not a component index key")
+        if key['package'] != package or not key['entry'].startswith(entry_prefix):
+            raise ValueError("next_token belongs to a different query")
+        return key
+
+    def find_product(self, product: str) -> List[Dict]:
+        """Every indexed component whose product name is product, across all SBOMs."""
+        items = []
+        query = {'IndexName': PRODUCT_INDEX_NAME, 'KeyConditionExpression': '#product = :product',
+                 'ExpressionAttributeNames': {'#product': 'product'},
+                 'ExpressionAttributeValues': {':product': product.lower()}}
+        while True:
+            response = self.table.query(**query)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
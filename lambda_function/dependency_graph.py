@@ -0,0 +1,419 @@
+"""
+Dependency graph analysis for CycloneDX SBOMs.
+
+Components become integer-indexed nodes keyed by bom-ref (falling back to purl,
+then name). Edges come from the top-level dependencies[] array (ref -> dependsOn),
+from the legacy per-component "dependencies" list and from nesting: a component
+(a ComponentRecord with a parent) is a dependency of the component containing it. Depth, cycle detection,
+longest-path analysis and risk propagation all run in a constant number of
+passes over the graph.
+"""
+import gc
+import itertools
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAX_REPORTED_CYCLES = 10
+MAX_REPORTED_RISKY_ROOTS = 50
+_NO_RISK = (-1.0, -1)
+
+try:
+    _popcount = int.bit_count  # Python 3.10+
+except AttributeError:  # The Lambda runtime is Python 3.9
+    def _popcount(value: int) -> int:
+        return bin(value).count('1')
+
+def component_ref(component: Dict) -> str:
+    """Identifier used for a component in dependency references."""
+    return component.get('bom-ref') or component.get('purl') or component.get('name', '')
+
+@contextmanager
+def paused_gc():
+    """
+    Suspend the cyclic garbage collector while building large acyclic structures.
+    Every new list or dict would otherwise count towards a collection pass that
+    rescans the whole SBOM and frees nothing.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+class DependencyGraph:
+    """
+    Adjacency-list graph over SBOM components. children[i] lists the node
+    indices that node i depends on; references to unknown components are
+    counted in dangling_references and otherwise ignored.
+    """
+
+    def __init__(self, components: List[Dict], dependencies: Optional[Iterable[Dict]] = None):
+        self.components = []
+        self.refs = []
+        self.index = {}
+        self.duplicate_refs = 0
+        self.dangling_references = 0
+
+        for component in components:
+            ref = component_ref(component)
+            if ref in self.index:
+                self.duplicate_refs += 1
+                continue
+            self.index[ref] = len(self.refs)
+            self.refs.append(ref)
+            self.components.append(component)
+        # Legacy SBOMs reference dependencies by purl even when a bom-ref is set
+        for node, component in enumerate(self.components):
+            purl = component.get('purl')
+            if purl and purl not in self.index:
+                self.index[purl] = node
+
+        index = self.index
+        children = [[] for _ in self.refs]
+        legacy_nodes = []
+        for node, component in enumerate(self.components):
+            legacy = component.get('dependencies')
+            if legacy:
+                children[node].extend(self._resolve([dep.get('ref', '') if isinstance(dep, dict) else dep
+                                                     for dep in legacy]))
+                legacy_nodes.append(node)
+            parent = component.get('parent')
+            if parent is not None and parent.ref in index:
+                children[index[parent.ref]].append(node)
+        for node in legacy_nodes:
+            # A legacy list may also name the components nested in its owner
+            children[node] = list(dict.fromkeys(children[node]))
+        for entry in dependencies or []:
+            node = index.get(entry.get('ref', ''))
+            if node is None:
+                # e.g. metadata.component, the application the SBOM describes
+                self.dangling_references += 1
+                continue
+            depends_on = entry.get('dependsOn') or ()
+            targets = [index[ref] for ref in depends_on if ref in index]
+            if len(targets) != len(depends_on):
+                self.dangling_references += len(depends_on) - len(targets)
+            if children[node]:
+                # The same edge may be declared by both sources
+                children[node] = list(dict.fromkeys(children[node] + targets))
+            else:
+                children[node] = targets
+        self.children = children
+        self.edge_count = sum(map(len, children))
+        # (in_degrees, topological order, residual components, group) from the last analyze()
+        self._condensation = None
+
+    def _resolve(self, refs) -> List[int]:
+        """Map references to node indices, counting the ones that match no component."""
+        index = self.index
+        targets = [index[ref] for ref in refs if ref in index]
+        self.dangling_references += len(refs) - len(targets)
+        return targets
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def in_degrees(self) -> List[int]:
+        degrees = [0] * len(self.refs)
+        for target, count in Counter(itertools.chain.from_iterable(self.children)).items():
+            degrees[target] = count
+        return degrees
+
+    def topological_order(self, in_degrees: List[int], chain: List[int], predecessor: List[int]) -> List[int]:
+        """
+        Kahn's algorithm. Nodes on or downstream of a cycle are left out. Along
+        the way chain[i] becomes the longest path (in edges) ending at node i,
+        with predecessor[i] the previous node on it.
+        """
+        children = self.children
+        remaining = list(in_degrees)
+        queue = deque(node for node, degree in enumerate(remaining) if degree == 0)
+        popleft, push = queue.popleft, queue.append
+        order = []
+        while queue:
+            node = popleft()
+            order.append(node)
+            length = chain[node] + 1
+            for target in children[node]:
+                if length > chain[target]:
+                    chain[target] = length
+                    predecessor[target] = node
+                remaining[target] -= 1
+                if not remaining[target]:
+                    push(target)
+        return order
+
+    def strongly_connected_components(self, nodes: List[int]) -> List[List[int]]:
+        """
+        Iterative Tarjan over the subgraph induced by nodes. Components are
+        returned in reverse topological order.
+        """
+        in_subgraph = [False] * len(self.refs)
+        for node in nodes:
+            in_subgraph[node] = True
+        order = [-1] * len(self.refs)
+        low = [0] * len(self.refs)
+        on_stack = [False] * len(self.refs)
+        stack = []
+        components = []
+        counter = 0
+
+        for start in nodes:
+            if order[start] != -1:
+                continue
+            order[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack[start] = True
+            work = [(start, 0)]
+            while work:
+                node, position = work[-1]
+                targets = self.children[node]
+                descended = False
+                while position < len(targets):
+                    target = targets[position]
+                    position += 1
+                    if not in_subgraph[target]:
+                        continue
+                    if order[target] == -1:
+                        work[-1] = (node, position)
+                        order[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = True
+                        work.append((target, 0))
+                        descended = True
+                        break
+                    if on_stack[target] and order[target] < low[node]:
+                        low[node] = order[target]
+                if descended:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def analyze(self) -> Dict:
+        """
+        Depth of every node (BFS distance from the nearest root), cycles, and
+        the longest dependency chain. Roots are nodes nothing depends on; a
+        cycle that nothing outside it depends on is rooted at its first member.
+        Along the longest path a cycle counts as a single hop.
+        """
+        children = self.children
+        node_count = len(children)
+        in_degrees = self.in_degrees()
+        roots = [node for node, degree in enumerate(in_degrees) if degree == 0]
+        # chain[i] is the longest path (in edges) ending at i, found while ordering the DAG part
+        chain = [0] * node_count
+        predecessor = [-1] * node_count
+        topo_order = self.topological_order(in_degrees, chain, predecessor)
+
+        cycles, components, group = [], [], None
+        if len(topo_order) < node_count:
+            cycles, components, group = self._condense(topo_order, in_degrees, roots, chain, predecessor)
+        self._condensation = (in_degrees, topo_order, components, group)
+
+        # Multi-source BFS for depth
+        depths = [-1] * node_count
+        for root in roots:
+            depths[root] = 0
+        queue = deque(roots)
+        popleft, push = queue.popleft, queue.append
+        while queue:
+            node = popleft()
+            next_depth = depths[node] + 1
+            for target in children[node]:
+                if depths[target] == -1:
+                    depths[target] = next_depth
+                    push(target)
+
+        longest_path = []
+        if node_count:
+            end = max(range(node_count), key=chain.__getitem__)
+            while end != -1:
+                longest_path.append(end)
+                end = predecessor[end]
+            longest_path.reverse()
+
+        return {
+            'node_count': node_count,
+            'edge_count': self.edge_count,
+            'roots': roots,
+            'depths': depths,
+            'max_depth': max(depths, default=0),
+            'depth_distribution': dict(Counter(depths)),
+            'cycles': cycles,
+            'longest_path': longest_path
+        }
+
+    def _condense(self, topo_order: List[int], in_degrees: List[int], roots: List[int], chain: List[int],
+                  predecessor: List[int]) -> Tuple[List[List[int]], List[List[int]], List[int]]:
+        """
+        Handle the nodes Kahn's algorithm could not order: collapse them into
+        strongly connected components, add roots for unreachable cycles and
+        extend the longest-path values through the condensed graph. Returns the
+        cycles (each a sorted list of node indices), all residual components in
+        reverse topological order, and the group representative of every node.
+        """
+        children = self.children
+        node_count = len(children)
+        ordered = [False] * node_count
+        for node in topo_order:
+            ordered[node] = True
+        residual = [node for node in range(node_count) if not ordered[node]]
+        components = self.strongly_connected_components(residual)
+
+        group = list(range(node_count))
+        cycles = []
+        for component in components:
+            component.sort()
+            representative = component[0]
+            for member in component:
+                group[member] = representative
+            if len(component) > 1 or representative in children[representative]:
+                cycles.append(component)
+
+        # A component with no incoming edges from outside itself is unreachable from the roots
+        internal_edges = [0] * node_count
+        for node in residual:
+            for target in children[node]:
+                if group[target] == group[node]:
+                    internal_edges[group[node]] += 1
+        roots.extend(component[0] for component in components
+                     if sum(in_degrees[member] for member in component) == internal_edges[component[0]])
+        roots.sort()
+
+        # Components come out of Tarjan in reverse topological order, and nothing
+        # in them points back into topo_order, so this finishes the longest-path pass
+        for component in reversed(components):
+            representative = component[0]
+            entry = max(component, key=chain.__getitem__)
+            if entry != representative:
+                chain[representative] = chain[entry]
+                predecessor[representative] = predecessor[entry]
+            for member in component[1:]:
+                chain[member] = 0
+                predecessor[member] = -1
+            length = chain[representative] + 1
+            for member in component:
+                for target in children[member]:
+                    target_group = group[target]
+                    if target_group != representative and length > chain[target_group]:
+                        chain[target_group] = length
+                        predecessor[target_group] = representative
+        return cycles, components, group
+
+    def propagate_risk(self, risk_scores: Dict[int, float], roots: Iterable[int],
+                       categories: Optional[Dict[str, Iterable[int]]] = None) -> Dict[int, Dict]:
+        """
+        Aggregate risk below each of roots in one reverse-topological pass.
+
+        The risky nodes a node can reach are kept as an int bitset (one bit per
+        entry in risk_scores) and merged from its children, so shared subgraphs
+        are visited once and never double-counted. A cycle shares one bitset
+        through its strongly connected component. A child's bitset is dropped
+        once all of its parents have merged it, so only the frontier is held.
+
+        Returns, per root: risky_descendants (the root itself excluded),
+        worst_score and worst_node over the root and everything below it
+        (None and -1 if nothing is risky), and a descendant count for each of
+        categories.
+        """
+        if self._condensation is None:
+            self.analyze()
+        in_degrees, topo_order, components, group = self._condensation
+        children = self.children
+        node_count = len(children)
+        if group is None:
+            group = range(node_count)
+        # Low bits go to the most downstream nodes, so the sets merged near the leaves stay narrow
+        downstream_first = itertools.chain(itertools.chain.from_iterable(components), reversed(topo_order))
+        bits = {node: 1 << position
+                for position, node in enumerate(node for node in downstream_first if node in risk_scores)}
+        masks = {}
+        for name, nodes in (categories or {}).items():
+            mask = 0
+            for node in nodes:
+                mask |= bits.get(node, 0)
+            masks[name] = mask
+
+        roots = list(roots)
+        keep = [False] * node_count
+        for root in roots:
+            keep[group[root]] = True
+        pending = list(in_degrees)
+        reach = [0] * node_count
+        # (score, node) of the worst risk at or below each group; (-1.0, -1) if none
+        worst = [_NO_RISK] * node_count
+
+        def merge(target: int, reachable: int, best: Tuple[float, int]) -> Tuple[int, Tuple[float, int]]:
+            target_group = group[target]
+            reachable |= reach[target_group]
+            if worst[target_group] > best:
+                best = worst[target_group]
+            pending[target] -= 1
+            if not pending[target] and target_group == target and not keep[target]:
+                reach[target] = 0
+            return reachable, best
+
+        # Residual components are downstream of every ordered node and come out
+        # of Tarjan in reverse topological order, so they are merged first
+        for component in components:
+            representative = component[0]
+            reachable, best = 0, _NO_RISK
+            for member in component:
+                if member in bits:
+                    reachable |= bits[member]
+                    best = max(best, (risk_scores[member], member))
+                for target in children[member]:
+                    if group[target] != representative:
+                        reachable, best = merge(target, reachable, best)
+            reach[representative] = reachable
+            worst[representative] = best
+
+        # The hot loop over the acyclic part, with merge() inlined
+        for node in reversed(topo_order):
+            reachable = bits.get(node, 0)
+            best = (risk_scores[node], node) if reachable else _NO_RISK
+            for target in children[node]:
+                target_group = group[target]
+                below = reach[target_group]
+                if below:
+                    reachable |= below
+                    if worst[target_group] > best:
+                        best = worst[target_group]
+                pending[target] -= 1
+                if not pending[target] and target_group == target and not keep[target]:
+                    reach[target] = 0
+            reach[node] = reachable
+            worst[node] = best
+
+        summaries = {}
+        for root in roots:
+            root_group = group[root]
+            below = reach[root_group] & ~bits.get(root, 0)
+            summary = {
+                'risky_descendants': _popcount(below),
+                'worst_score': worst[root_group][0] if worst[root_group][1] != -1 else None,
+                'worst_node': worst[root_group][1]
+            }
+            for name, mask in masks.items():
+                summary[name] = _popcount(below & mask)
+            summaries[root] = summary
+        return summaries
@@ -0,0 +1,135 @@
+"""
+Incremental re-analysis of SBOMs that are uploaded again under the same name.
+
+Each analysis can persist an AnalysisSnapshot next to its report: the packages
+the SBOM contained and the CVE lookup result for each of them. When the next
+version of the SBOM arrives, lookups for packages that did not change are
+served from the snapshot, so only added or re-versioned packages reach the
+CVE cache or NVD. diff_snapshots() describes what changed between the two.
+
+Every lookup keeps the time it was fetched, which carries over when it is
+reused. A package that never changes is therefore still looked up again once
+its lookup is old enough, however often the SBOM is re-uploaded.
+"""
+import gzip
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+SNAPSHOT_FORMAT_VERSION = 2  # 2 added per-lookup fetch times; version 1 snapshots are still read
+MAX_REPORTED_CHANGES = 100
+
+PackageKey = Tuple[str, str, str]  # (name, version, ecosystem)
+
+class AnalysisSnapshot:
+    """Packages and successful CVE lookups of one analysis."""
+
+    def __init__(self, analysis_timestamp: Optional[str] = None, source_key: Optional[str] = None,
+                 output_key: Optional[str] = None):
+        self.analysis_timestamp = analysis_timestamp
+        self.source_key = source_key
+        self.output_key = output_key
+        self.packages: Set[PackageKey] = set()
+        self.cves: Dict[PackageKey, List[Dict]] = {}
+        self.lookup_times: Dict[PackageKey, str] = {}  # When each entry of cves was fetched (ISO 8601, UTC)
+        self.reused_lookups = 0
+        self.performed_lookups = 0
+
+    def to_bytes(self) -> bytes:
+        document = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'analysis_timestamp': self.analysis_timestamp,
+            'source_key': self.source_key,
+            'output_key': self.output_key,
+            'packages': sorted(self.packages),
+            'cves': [[name, version, ecosystem, cves, self.fetched_at((name, version, ecosystem))]
+                     for (name, version, ecosystem), cves in self.cves.items()]
+        }
+        return gzip.compress(json.dumps(document, separators=(',', ':'), default=str).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'AnalysisSnapshot':
+        document = json.loads(gzip.decompress(data).decode('utf-8'))
+        if document.get('format_version') not in (1, SNAPSHOT_FORMAT_VERSION):
+            raise ValueError(f"Unsupported snapshot format: {document.get('format_version')!r}")
+        snapshot = cls(document.get('analysis_timestamp'), document.get('source_key'), document.get('output_key'))
+        snapshot.packages = {tuple(package) for package in document['packages']}
+        for name, version, ecosystem, cves, *fetched_at in document['cves']:
+            snapshot.cves[(name, version, ecosystem)] = cves
+            if fetched_at:
+                snapshot.lookup_times[(name, version, ecosystem)] = fetched_at[0]
+        return snapshot
+
+    def fetched_at(self, key: PackageKey) -> Optional[str]:
+        """When the CVE lookup for key was fetched; the analysis time for snapshots that predate lookup times."""
+        return self.lookup_times.get(key, self.analysis_timestamp)
+
+    def age_seconds(self, now: Optional[datetime] = None) -> float:
+        """Seconds since the snapshot's analysis ran (infinite if unknown)."""
+        return _age_seconds(self.analysis_timestamp, now)
+
+    def lookup_age_seconds(self, key: PackageKey, now: Optional[datetime] = None) -> float:
+        """Seconds since the CVE lookup for key was fetched (infinite if unknown)."""
+        return _age_seconds(self.fetched_at(key), now)
+
+def _age_seconds(timestamp: Optional[str], now: Optional[datetime] = None) -> float:
+    try:
+        taken = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return float('inf')
+    return ((now or datetime.utcnow()) - taken).total_seconds()
+
+def _cve_ids(snapshot: AnalysisSnapshot) -> Dict[str, Tuple[str, str]]:
+    """CVE id -> (severity, component) over every package in the snapshot."""
+    ids = {}
+    for (name, _, _), cves in snapshot.cves.items():
+        for cve in cves:
+            ids.setdefault(cve.get('cve_id', ''), (cve.get('severity', ''), name))
+    return ids
+
+def diff_snapshots(previous: AnalysisSnapshot, current: AnalysisSnapshot) -> Dict:
+    """
+    Added, removed and re-versioned packages (matched by name and ecosystem),
+    and CVEs that appeared or disappeared, between two analyses.
+    """
+    previous_versions, current_versions = {}, {}
+    for versions, snapshot in ((previous_versions, previous), (current_versions, current)):
+        for name, version, ecosystem in snapshot.packages:
+            versions.setdefault((name, ecosystem), set()).add(version)
+
+    added, removed, changed = [], [], []
+    for (name, ecosystem), versions in sorted(current_versions.items()):
+        before = previous_versions.get((name, ecosystem))
+        if before is None:
+            added.extend({'name': name, 'version': version, 'ecosystem': ecosystem} for version in sorted(versions))
+        elif before != versions:
+            changed.append({'name': name, 'ecosystem': ecosystem,
+                            'previous_versions': sorted(before), 'versions': sorted(versions)})
+    for (name, ecosystem), versions in sorted(previous_versions.items()):
+        if (name, ecosystem) not in current_versions:
+            removed.extend({'name': name, 'version': version, 'ecosystem': ecosystem} for version in sorted(versions))
+
+    previous_cves, current_cves = _cve_ids(previous), _cve_ids(current)
+    new_cves = [{'cve_id': cve_id, 'severity': severity, 'component': component}
+                for cve_id, (severity, component) in sorted(current_cves.items()) if cve_id not in previous_cves]
+    resolved_cves = [{'cve_id': cve_id, 'severity': severity, 'component': component}
+                     for cve_id, (severity, component) in sorted(previous_cves.items()) if cve_id not in current_cves]
+
+    return {
+        'base_analysis_timestamp': previous.analysis_timestamp,
+        'base_source_key': previous.source_key,
+        'base_output_key': previous.output_key,
+        'added_count': len(added),
+        'removed_count': len(removed),
+        'changed_count': len(changed),
+        'unchanged_count': len(current.packages & previous.packages),
+        'added': added[:MAX_REPORTED_CHANGES],
+        'removed': removed[:MAX_REPORTED_CHANGES],
+        'changed': changed[:MAX_REPORTED_CHANGES],
+        'new_cves_count': len(new_cves),
+        'resolved_cves_count': len(resolved_cves),
+        'new_cves': new_cves[:MAX_REPORTED_CHANGES],
+        'resolved_cves': resolved_cves[:MAX_REPORTED_CHANGES],
+        'cve_lookups_reused': current.reused_lookups,
+        'cve_lookups_performed': current.performed_lookups
+    }
@@ -0,0 +1,84 @@
+"""
+Multi-pattern keyword matching for OFAC screening.
+
+KeywordMatcher compiles a keyword list into an Aho-Corasick automaton once, so
+scanning a domain or name costs time proportional to its length (plus the
+number of matches) however many keywords are configured.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# (start, end, keyword, value): text[start:end] == keyword
+KeywordMatch = Tuple[int, int, str, object]
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a set of keywords. Built from a dict, each
+    keyword carries its value (e.g. the sanctioned country it indicates);
+    built from an iterable, the value is the keyword itself. Matching is
+    case-sensitive, so keywords and text should be normalized the same way.
+    """
+
+    def __init__(self, keywords: Union[Dict[str, object], Iterable[str]]):
+        if not isinstance(keywords, dict):
+            keywords = {keyword: keyword for keyword in keywords}
+        self.keywords = [keyword for keyword in keywords if keyword]
+        self.values = [keywords[keyword] for keyword in self.keywords]
+
+        # Trie: transitions[state] maps a character to the next state
+        transitions = [{}]
+        outputs = [[]]
+        for position, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(transitions)
+                    transitions[state][char] = next_state
+                    transitions.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(position)
+
+        # Failure links in BFS order; each state also reports the keywords of its failure state
+        fail = [0] * len(transitions)
+        queue = deque(transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in transitions[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in transitions[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = transitions[fallback].get(char, 0)
+                if outputs[fail[next_state]]:
+                    outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+
+        self._transitions = transitions
+        self._fail = fail
+        self._outputs = outputs
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """Every keyword occurrence in text, overlapping ones included, ordered by end position."""
+        transitions, fail, outputs = self._transitions, self._fail, self._outputs
+        keywords, values = self.keywords, self.values
+        matches = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            for position in outputs[state]:
+                keyword = keywords[position]
+                matches.append((end - len(keyword), end, keyword, values[position]))
+        return matches
+
+    def search(self, text: str) -> Optional[KeywordMatch]:
+        """The leftmost match in text, preferring the longest keyword at that position."""
+        matches = self.find_all(text)
+        if not matches:
+            return None
+        return min(matches, key=lambda match: (match[0], -match[1]))
@@ -1,28 +1,83 @@
 import json
-import boto3
 import urllib.parse
 import logging
 import re
-import requests
-from datetime import datetime
-from typing import Dict, List, Tuple, Optional
-from packaging import version
+import time
+import random
+import functools
+import hashlib
+import heapq
+import threading
+import itertools
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Optional
+from vuln_db import (ANY_ECOSYSTEM, VulnerabilityDatabase, iter_feed_records, nvd_affected_ranges,
+                     package_lookup_name, parse_nvd_vulnerability, parse_osv_record)
+from sbom_formats import (ComponentRecord, SBOMFormatError, load_document, normalize_components, normalize_document,
+                          open_sbom_reader)
+from result_writer import upload_analysis
+from keyword_matcher import KeywordMatch
+from sanctions_rules import RuleSetLoader, SanctionsRuleSet
+from incremental import AnalysisSnapshot, diff_snapshots
+from component_index import ComponentIndex, split_purl
+from ranking import TopK, aggregate_component_cves, vulnerability_rank
+from metrics import Metrics
+from lazy_import import LazyModule
+from aws_clients import DynamoDBTable, batch_get_item, get_client
+from dependency_graph import (MAX_REPORTED_CYCLES, MAX_REPORTED_RISKY_ROOTS, DependencyGraph, component_ref,
+                              paused_gc)
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+# Deferred until first use to keep cold starts short; AWS clients come from aws_clients.get_client()
+requests = LazyModule('requests')
+version = LazyModule('packaging.version')
 
 # Environment variables
 import os
 DDB_TABLE_NAME = os.environ.get('DDB_TABLE_NAME', 'ErasmusSBOMAnalysisCache')
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', '')
 NVD_API_KEY = os.environ.get('NVD_API_KEY', '')  # Optional: for higher rate limits
+NVD_API_URL = os.environ.get('NVD_API_URL', 'https://services.nvd.nist.gov/rest/json/cves/2.0')
+NVD_MAX_RETRIES = int(os.environ.get('NVD_MAX_RETRIES', '3'))
+NVD_BACKOFF_BASE_SECONDS = float(os.environ.get('NVD_BACKOFF_BASE_SECONDS', '1.0'))
+NVD_BACKOFF_MAX_SECONDS = float(os.environ.get('NVD_BACKOFF_MAX_SECONDS', '30.0'))
+NVD_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('NVD_RATE_LIMIT_MAX_WAIT_SECONDS', '30.0'))
+CVE_SOURCE = os.environ.get('CVE_SOURCE', 'online').lower()  # online, offline or hybrid
+VULN_DB_PATH = os.environ.get('VULN_DB_PATH', '')  # Offline index built with vuln_db.py
+VULN_DB_MAX_AGE_HOURS = float(os.environ.get('VULN_DB_MAX_AGE_HOURS', '48'))  # Hybrid mode staleness limit
+CVE_PREFETCH_BATCH_SIZE = int(os.environ.get('CVE_PREFETCH_BATCH_SIZE', '500'))  # Components per prefetch window
+MAX_SBOM_SIZE_BYTES = int(os.environ.get('MAX_SBOM_SIZE_BYTES', str(2 * 1024 ** 3)))
+SBOM_STREAMING_THRESHOLD_BYTES = int(os.environ.get('SBOM_STREAMING_THRESHOLD_BYTES', str(10 * 1024 * 1024)))
+SBOM_FILE_EXTENSIONS = ('.json', '.xml', '.spdx')  # Keys under sboms/ that are analyzed; the format is detected from content
+ANALYSIS_OUTPUT_FORMAT = os.environ.get('ANALYSIS_OUTPUT_FORMAT', 'json').lower()  # json or ndjson
+ANALYSIS_OUTPUT_PRETTY = os.environ.get('ANALYSIS_OUTPUT_PRETTY', 'true').lower() == 'true'
+ANALYSIS_OUTPUT_ENCODING = os.environ.get('ANALYSIS_OUTPUT_ENCODING', 'none').lower()  # none, gzip or zstd
+CVE_LOOKUP_CONCURRENCY = int(os.environ.get('CVE_LOOKUP_CONCURRENCY', '8'))  # Parallel NVD lookups per analysis
+RECORD_CONCURRENCY = int(os.environ.get('RECORD_CONCURRENCY', '4'))  # SBOMs analyzed in parallel per event batch
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', str(7 * 24 * 3600)))  # Lifetime of async job status rows
+JOB_INLINE_RESULT_MAX_BYTES = int(os.environ.get('JOB_INLINE_RESULT_MAX_BYTES', str(5 * 1024 * 1024)))  # Larger results are returned as a presigned URL
+CVE_CACHE_TTL_SECONDS = int(os.environ.get('CVE_CACHE_TTL_SECONDS', '86400'))  # 0 disables the DynamoDB CVE cache
+MEMO_CACHE_SIZE = int(os.environ.get('MEMO_CACHE_SIZE', '5000'))  # Entries per in-process cache, 0 disables
+MEMO_CACHE_TTL_SECONDS = int(os.environ.get('MEMO_CACHE_TTL_SECONDS', '3600'))  # In-process cache entry lifetime
+INCREMENTAL_ANALYSIS = os.environ.get('INCREMENTAL_ANALYSIS', 'false').lower() == 'true'  # Reuse the previous analysis of the same SBOM
+INCREMENTAL_MAX_BASE_AGE_HOURS = float(os.environ.get('INCREMENTAL_MAX_BASE_AGE_HOURS', '24'))  # Older previous analyses trigger a full run; older reused lookups are refetched
+DEDUP_FRESHNESS_SECONDS = int(os.environ.get('DEDUP_FRESHNESS_SECONDS', '3600'))  # Reuse analyses of identical SBOMs this recent, 0 disables
+COMPONENT_INDEX_TABLE = os.environ.get('COMPONENT_INDEX_TABLE', '')  # purl -> SBOM index table; indexing is off when empty
+CVE_RESCAN_FEED_PATH = os.environ.get('CVE_RESCAN_FEED_PATH', '')  # NVD/OSV delta feed read by re-scans instead of the NVD API
+CVE_RESCAN_LOOKBACK_HOURS = float(os.environ.get('CVE_RESCAN_LOOKBACK_HOURS', '24'))  # Window of the first re-scan
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'  # Emit EMF metric log lines per invocation
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ErasmusSBOMAnalyzer')  # CloudWatch namespace of the EMF metrics
+SANCTIONS_RULES_LOCATION = os.environ.get('SANCTIONS_RULES_LOCATION', '')  # s3://bucket/key or file path; built-in rules when empty
+SANCTIONS_RULES_REFRESH_SECONDS = float(os.environ.get('SANCTIONS_RULES_REFRESH_SECONDS', '60'))  # Minimum interval between ETag checks
 
-# OFAC mappings - Enhanced with more comprehensive coverage
+# Built-in OFAC mappings, used unless SANCTIONS_RULES_LOCATION points at a rule bundle
 OFAC_COUNTRIES = {
     'cuba': 'Cuba', 'iran': 'Iran', 'tehran': 'Iran', 'north korea': 'North Korea', 'dprk': 'North Korea',
     'syria': 'Syria', 'venezuela': 'Venezuela', 'russia': 'Russia', 'belarus': 'Belarus',
@@ -39,6 +94,8 @@ DOMAIN_COUNTRY_MAPPING = {
     'sd': 'Sudan', 'ye': 'Yemen', 'zw': 'Zimbabwe'
 }
 
+DOMAIN_PATTERN = re.compile(r'^[a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?)*$')
+
 # Risk scoring weights
 RISK_WEIGHTS = {
     'domain_match': 0.8,
@@ -50,6 +107,21 @@ RISK_WEIGHTS = {
     'high_cve': 0.8
 }
 
+# Compiled once per container: keyword scans cost O(len(text)) regardless of keyword count
+BUILTIN_SANCTIONS_RULES = SanctionsRuleSet('builtin', OFAC_COUNTRIES, DOMAIN_COUNTRY_MAPPING, RISK_WEIGHTS)
+
+# NVD rate limits per rolling 30 second window
+NVD_RATE_LIMIT_WINDOW_SECONDS = 30
+NVD_PUBLIC_REQUESTS_PER_WINDOW = 5
+NVD_API_KEY_REQUESTS_PER_WINDOW = 50
+NVD_MAX_DATE_RANGE_DAYS = 120  # Longest lastModStartDate/lastModEndDate window the API accepts
+NVD_RESULTS_PER_PAGE = 2000
+
+# Report sizes: CVEs kept per component lookup, most vulnerable components listed, dependency tree entries
+MAX_CVES_PER_COMPONENT = 10
+MAX_REPORTED_VULNERABLE_COMPONENTS = 20
+MAX_REPORTED_TREE_NODES = 1000
+
 # CVE Severity mappings
 CVE_SEVERITY_SCORES = {
     'CRITICAL': 1.0,
@@ -59,89 +131,717 @@ CVE_SEVERITY_SCORES = {
     'NONE': 0.0
 }
 
-def get_cve_data_for_package(package_name: str, package_version: str, ecosystem: str) -> List[Dict]:
+class TTLLRUCache:
     """
-    Fetch CVE data for a specific package from NVD API.
-    Returns list of critical and high severity CVEs.
+    Thread-safe LRU cache with per-entry TTL.
+    Instances are held at module level so they survive warm Lambda invocations.
     """
-    try:
-        # Construct CPE name based on ecosystem
-        cpe_vendor = {
-            'pypi': 'python',
-            'npm': 'nodejs', 
-            'maven': 'apache',
-            'nuget': 'microsoft'
-        }.get(ecosystem, ecosystem)
-        
-        # Use NVD REST API v2
-        base_url = "https://services.nvd.nist.gov/rest/json/cves/2.0"
-        headers = {
-            'User-Agent': 'Erasmus-SBOM-Analyzer/1.0'
-        }
-        
-        if NVD_API_KEY:
-            headers['apiKey'] = NVD_API_KEY
-            
-        # Search for CVEs related to the package
-        params = {
-            'keywordSearch': f"{package_name}",
-            'resultsPerPage': 50,
-            'cvssV3Severity': 'HIGH,CRITICAL'  # Only get critical/high CVEs
-        }
-        
-        response = requests.get(base_url, headers=headers, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            cves = []
-            
-            for vulnerability in data.get('vulnerabilities', []):
-                cve = vulnerability.get('cve', {})
-                cve_id = cve.get('id', '')
-                
-                # Get CVSS scores
-                metrics = cve.get('metrics', {})
-                cvss_score = 0.0
-                severity = 'UNKNOWN'
-                
-                # Try CVSS v3.1 first, then v3.0, then v2
-                for cvss_version in ['cvssMetricV31', 'cvssMetricV30', 'cvssMetricV2']:
-                    if cvss_version in metrics and metrics[cvss_version]:
-                        metric = metrics[cvss_version][0]
-                        if 'cvssData' in metric:
-                            cvss_score = metric['cvssData'].get('baseScore', 0.0)
-                            severity = metric['cvssData'].get('baseSeverity', 'UNKNOWN')
-                            break
-                
-                # Only include CRITICAL and HIGH severity CVEs
-                if severity in ['CRITICAL', 'HIGH']:
-                    description = ''
-                    descriptions = cve.get('descriptions', [])
-                    for desc in descriptions:
-                        if desc.get('lang') == 'en':
-                            description = desc.get('value', '')
-                            break
-                    
-                    cves.append({
-                        'cve_id': cve_id,
-                        'cvss_score': cvss_score,
-                        'severity': severity,
-                        'description': description[:200] + '...' if len(description) > 200 else description,
-                        'published_date': cve.get('published', ''),
-                        'last_modified': cve.get('lastModified', '')
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __contains__(self, key) -> bool:
+        """Check for a live entry without touching counters or recency."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+_MISSING = object()
+
+def memoized(cache: TTLLRUCache):
+    """Memoize a function of hashable positional arguments in the given cache."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            value = cache.get(args, _MISSING)
+            if value is _MISSING:
+                value = func(*args)
+                cache.put(args, value)
+            return value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+# In-process caches, reused across warm invocations of the same container
+_cve_lookup_memo = TTLLRUCache(MEMO_CACHE_SIZE, MEMO_CACHE_TTL_SECONDS)
+_email_domain_memo = TTLLRUCache(MEMO_CACHE_SIZE, MEMO_CACHE_TTL_SECONDS)
+_domain_risk_memo = TTLLRUCache(MEMO_CACHE_SIZE, MEMO_CACHE_TTL_SECONDS)
+_range_index_memo = TTLLRUCache(MEMO_CACHE_SIZE, MEMO_CACHE_TTL_SECONDS)
+
+def memo_cache_stats() -> Dict:
+    """Container-lifetime statistics for the in-process caches."""
+    return {
+        'cve_lookup': _cve_lookup_memo.stats(),
+        'email_domain': _email_domain_memo.stats(),
+        'domain_risk': _domain_risk_memo.stats(),
+        'range_index': _range_index_memo.stats()
+    }
+
+def clear_memo_caches() -> None:
+    """Drop all in-process cache entries and counters."""
+    for cache in (_cve_lookup_memo, _email_domain_memo, _domain_risk_memo, _range_index_memo):
+        cache.clear()
+
+# Stage timings and counters of the current invocation, published as one EMF log line when it ends
+invocation_metrics = Metrics()
+
+# Domain verdicts depend on the rules, so a new bundle invalidates them
+sanctions_rule_loader = RuleSetLoader(SANCTIONS_RULES_LOCATION, BUILTIN_SANCTIONS_RULES,
+                                      s3_client_factory=lambda: get_client('s3'),
+                                      refresh_seconds=SANCTIONS_RULES_REFRESH_SECONDS,
+                                      on_reload=lambda rules: _domain_risk_memo.clear())
+
+def get_sanctions_rules() -> SanctionsRuleSet:
+    """The active sanctions rule set, refreshed from SANCTIONS_RULES_LOCATION when its bundle changes."""
+    return sanctions_rule_loader.get()
+
+class CVELookupError(Exception):
+    """Raised when CVE data could not be retrieved for a package."""
+
+class NVDRateLimitError(CVELookupError):
+    """Raised when NVD throttling prevented a lookup from completing."""
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    Tokens are reserved in arrival order, so concurrent callers queue fairly.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, waiting for it if needed. Returns False if the wait would exceed timeout."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+            self._updated_at = now
+
+            wait_seconds = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate_per_second
+            if timeout is not None and wait_seconds > timeout:
+                return False
+            self._tokens -= 1
+
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return True
+
+def _build_nvd_rate_limiter() -> TokenBucket:
+    """Size the limiter to the NVD public or API-key quota."""
+    requests_per_window = NVD_API_KEY_REQUESTS_PER_WINDOW if NVD_API_KEY else NVD_PUBLIC_REQUESTS_PER_WINDOW
+    return TokenBucket(requests_per_window / NVD_RATE_LIMIT_WINDOW_SECONDS, requests_per_window)
+
+_nvd_rate_limiter = _build_nvd_rate_limiter()
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session() -> 'requests.Session':
+    """Return the shared keep-alive session, sized for CVE lookups across concurrently analyzed records."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                # Retries are handled in request_nvd_cves so they respect the rate limiter
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=max(CVE_LOOKUP_CONCURRENCY * RECORD_CONCURRENCY, 10),
+                    max_retries=0
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['User-Agent'] = 'Erasmus-SBOM-Analyzer/1.0'
+                if NVD_API_KEY:
+                    session.headers['apiKey'] = NVD_API_KEY
+                _http_session = session
+    return _http_session
+
+def _backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, never shorter than a server-provided Retry-After."""
+    delay = random.uniform(0, min(NVD_BACKOFF_MAX_SECONDS, NVD_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, NVD_BACKOFF_MAX_SECONDS))
+    return delay
+
+def request_nvd_cves(params: Dict) -> Dict:
+    """
+    Query the NVD CVE API through the shared session and rate limiter.
+    Throttled (403/429), server-error and connection failures are retried with backoff;
+    raises NVDRateLimitError or CVELookupError once retries are exhausted.
+    """
+    session = get_http_session()
+    last_error = None
+
+    for attempt in range(NVD_MAX_RETRIES + 1):
+        if not _nvd_rate_limiter.acquire(timeout=NVD_RATE_LIMIT_MAX_WAIT_SECONDS):
+            raise NVDRateLimitError("NVD request budget exhausted, rate limiter wait exceeded")
+
+        retry_after = None
+        invocation_metrics.count('NVDRequests')
+        request_start = time.perf_counter()
+        try:
+            response = session.get(NVD_API_URL, params=params, timeout=10)
+        except requests.RequestException as e:
+            last_error = CVELookupError(f"NVD request failed: {str(e)}")
+        else:
+            invocation_metrics.sample('NVDRequestLatency', (time.perf_counter() - request_start) * 1000, 'Milliseconds')
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code in (403, 429):
+                invocation_metrics.count('NVDThrottled')
+                last_error = NVDRateLimitError(f"NVD API returned HTTP {response.status_code}")
+                try:
+                    retry_after = float(response.headers.get('Retry-After', ''))
+                except ValueError:
+                    retry_after = None
+            elif response.status_code >= 500:
+                last_error = CVELookupError(f"NVD API returned HTTP {response.status_code}")
+            else:
+                invocation_metrics.count('NVDErrors')
+                raise CVELookupError(f"NVD API returned HTTP {response.status_code}")
+
+        invocation_metrics.count('NVDErrors')
+        if attempt < NVD_MAX_RETRIES:
+            time.sleep(_backoff_delay(attempt, retry_after))
+
+    raise last_error
+
+class DynamoDBCVECache:
+    """
+    Read-through/write-through CVE cache stored in the analysis DynamoDB table.
+    Entries are keyed by ecosystem/package/version and expire after ttl_seconds.
+    """
+
+    KEY_PREFIX = 'cve#'
+    BATCH_GET_LIMIT = 100  # DynamoDB BatchGetItem maximum
+    MAX_BATCH_ATTEMPTS = 3
+
+    def __init__(self, table_name: Optional[str] = None, ttl_seconds: Optional[int] = None):
+        self.table_name = table_name or DDB_TABLE_NAME
+        self.ttl_seconds = CVE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.errors = 0
+        self._lock = threading.Lock()  # One cache is shared by every record in a batch
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    @classmethod
+    def cache_key(cls, package_name: str, package_version: str, ecosystem: str) -> str:
+        return f"{cls.KEY_PREFIX}{ecosystem}#{package_name}#{package_version}"
+
+    def get_many(self, lookup_keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], List[Dict]]:
+        """Batch-read cached CVE lists, skipping entries past their expiry."""
+        if not self.enabled or not lookup_keys:
+            return {}
+
+        key_map = {self.cache_key(*lookup_key): lookup_key for lookup_key in lookup_keys}
+        cache_keys = list(key_map)
+        found = {}
+        now = int(time.time())
+
+        for start in range(0, len(cache_keys), self.BATCH_GET_LIMIT):
+            request = {
+                self.table_name: {
+                    'Keys': [{'sbom_id': cache_key} for cache_key in cache_keys[start:start + self.BATCH_GET_LIMIT]]
+                }
+            }
+            attempt = 0
+            while request and attempt < self.MAX_BATCH_ATTEMPTS:
+                if attempt:
+                    time.sleep(0.05 * (2 ** attempt))  # Back off before retrying unprocessed keys
+                try:
+                    response = batch_get_item(RequestItems=request)
+                except Exception as e:
+                    logger.warning(f"CVE cache read failed: {str(e)}")
+                    self._count(errors=1)
+                    break
+
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    # DynamoDB TTL deletion is lazy, so expiry is enforced on read as well
+                    if int(item.get('expires_at', 0)) <= now:
+                        self._count(expired=1)
+                        continue
+                    found[key_map[item['sbom_id']]] = json.loads(item.get('cves', '[]'))
+
+                request = response.get('UnprocessedKeys') or None
+                attempt += 1
+
+        self._count(hits=len(found), misses=len(key_map) - len(found))
+        invocation_metrics.count('CVECacheHits', len(found))
+        invocation_metrics.count('CVECacheMisses', len(key_map) - len(found))
+        return found
+
+    def put_many(self, entries: Dict[Tuple[str, str, str], List[Dict]]) -> None:
+        """Write fetched CVE lists back to the cache with a TTL."""
+        if not self.enabled or not entries:
+            return
+
+        cached_at = datetime.utcnow().isoformat()
+        expires_at = int(time.time()) + self.ttl_seconds
+        try:
+            table = DynamoDBTable(self.table_name)
+            with table.batch_writer(overwrite_by_pkeys=['sbom_id']) as batch:
+                for lookup_key, cves in entries.items():
+                    batch.put_item(Item={
+                        'sbom_id': self.cache_key(*lookup_key),
+                        'record_type': 'cve_cache',
+                        'cves': json.dumps(cves, default=str),
+                        'cached_at': cached_at,
+                        'expires_at': expires_at
                     })
-            
-            return sorted(cves, key=lambda x: x['cvss_score'], reverse=True)[:10]  # Top 10 highest scoring CVEs
-            
+            self._count(writes=len(entries))
+        except Exception as e:
+            logger.warning(f"CVE cache write failed: {str(e)}")
+            self._count(errors=1)
+
+    def invalidate(self, lookup_keys: Iterable[Tuple[str, str, str]]) -> int:
+        """Delete cached CVE lists, e.g. after new CVEs were published for these packages."""
+        cache_keys = {self.cache_key(*lookup_key) for lookup_key in lookup_keys}
+        if not self.enabled or not cache_keys:
+            return 0
+        table = DynamoDBTable(self.table_name)
+        with table.batch_writer(overwrite_by_pkeys=['sbom_id']) as batch:
+            for cache_key in cache_keys:
+                batch.delete_item(Key={'sbom_id': cache_key})
+        return len(cache_keys)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'writes': self.writes,
+            'errors': self.errors,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+_offline_vuln_db = None
+_offline_vuln_db_lock = threading.Lock()
+
+def get_offline_vuln_db() -> Optional[VulnerabilityDatabase]:
+    """
+    Return the offline vulnerability index when CVE_SOURCE selects it.
+    In hybrid mode a missing or stale index returns None so lookups fall back to NVD.
+    """
+    global _offline_vuln_db
+    if CVE_SOURCE not in ('offline', 'hybrid'):
+        return None
+
+    if _offline_vuln_db is None:
+        with _offline_vuln_db_lock:
+            if _offline_vuln_db is None:
+                if not VULN_DB_PATH or not os.path.exists(VULN_DB_PATH):
+                    if CVE_SOURCE == 'offline':
+                        raise CVELookupError(f"Offline vulnerability database not found: {VULN_DB_PATH!r}")
+                    return None
+                _offline_vuln_db = VulnerabilityDatabase(VULN_DB_PATH)
+
+    if CVE_SOURCE == 'hybrid':
+        last_synced = _offline_vuln_db.last_synced()
+        if not last_synced or (datetime.utcnow() - last_synced).total_seconds() > VULN_DB_MAX_AGE_HOURS * 3600:
+            return None
+    return _offline_vuln_db
+
+def cve_source_info() -> Dict:
+    """Describe which CVE source is serving lookups, for analysis metadata."""
+    try:
+        offline_db = get_offline_vuln_db()
+    except CVELookupError as e:
+        return {'mode': CVE_SOURCE, 'active_source': 'unavailable', 'error': str(e)}
+    info = {'mode': CVE_SOURCE, 'active_source': 'offline' if offline_db else 'online'}
+    if offline_db:
+        last_synced = offline_db.last_synced()
+        info['offline_db_last_synced'] = last_synced.isoformat() if last_synced else None
+    return info
+
+class VersionRangeIndex:
+    """
+    Affected-version intervals for one package's candidate CVEs, parsed once with packaging.version.
+    Matching a batch of versions sorts them once and selects each interval's slice with bisect,
+    instead of comparing every version against every CVE.
+    """
+
+    def __init__(self, candidate_cves: List[Dict]):
+        self.cves = [{key: value for key, value in cve.items() if key != 'affected'} for cve in candidate_cves]
+        self.intervals = []  # (start, start_inclusive, end, end_inclusive, cve_index)
+        self.unconstrained = set()  # CVEs without usable range data apply to every version
+
+        for cve_index, cve in enumerate(candidate_cves):
+            ranges = cve.get('affected') or []
+            try:
+                parsed = [(
+                    version.Version(r['start']) if r.get('start') else None,
+                    r.get('start_inclusive', True),
+                    version.Version(r['end']) if r.get('end') else None,
+                    r.get('end_inclusive', False),
+                    cve_index
+                ) for r in ranges]
+            except version.InvalidVersion:
+                parsed = []
+            if parsed:
+                self.intervals.extend(parsed)
+            else:
+                self.unconstrained.add(cve_index)
+
+    def match(self, package_versions: List[str]) -> Dict[str, List[Dict]]:
+        """Map each version to the CVEs whose affected ranges contain it."""
+        matches = {v: set(self.unconstrained) for v in package_versions}
+        parsed_versions = []
+        for raw_version in matches:
+            try:
+                parsed_versions.append((version.Version(raw_version), raw_version))
+            except version.InvalidVersion:
+                # Unparseable versions cannot be ruled out, so every candidate applies
+                matches[raw_version] = set(range(len(self.cves)))
+        parsed_versions.sort(key=lambda item: item[0])
+        sorted_keys = [parsed for parsed, _ in parsed_versions]
+
+        for start, start_inclusive, end, end_inclusive, cve_index in self.intervals:
+            lo = 0 if start is None else (bisect_left if start_inclusive else bisect_right)(sorted_keys, start)
+            hi = len(sorted_keys) if end is None else (bisect_right if end_inclusive else bisect_left)(sorted_keys, end)
+            for _, raw_version in parsed_versions[lo:hi]:
+                matches[raw_version].add(cve_index)
+
+        return {v: [self.cves[i] for i in sorted(matches[v])] for v in package_versions}
+
+def _package_ranges(affected: Dict[Tuple[str, str], List[Dict]], package_name: str, ecosystem: str) -> List[Dict]:
+    """Affected ranges that refer to this package, from CPE data keyed by (ecosystem, product)."""
+    product = package_name.lower().split('/')[-1].rpartition(':')[2]
+    return [
+        version_range
+        for (range_ecosystem, range_package), ranges in affected.items()
+        if range_package == product and range_ecosystem in (ecosystem, ANY_ECOSYSTEM)
+        for version_range in ranges
+    ]
+
+def fetch_cve_candidates(package_name: str, ecosystem: str) -> List[Dict]:
+    """
+    Fetch every critical/high CVE recorded for a package, with its affected version ranges,
+    from the offline index or the NVD API. Raises CVELookupError on failure.
+    """
+    offline_db = get_offline_vuln_db()
+    if offline_db:
+        return offline_db.lookup(ecosystem, package_name)
+
+    # Construct CPE name based on ecosystem
+    cpe_vendor = {
+        'pypi': 'python',
+        'npm': 'nodejs',
+        'maven': 'apache',
+        'nuget': 'microsoft'
+    }.get(ecosystem, ecosystem)
+
+    # Search for CVEs related to the package; NVD knows a Maven group:artifact by its artifactId
+    params = {
+        'keywordSearch': f"{package_name.rpartition(':')[2] if ecosystem == 'maven' else package_name}",
+        'resultsPerPage': 50,
+        'cvssV3Severity': 'HIGH,CRITICAL'  # Only get critical/high CVEs
+    }
+
+    data = request_nvd_cves(params)
+    cves = []
+
+    for vulnerability in data.get('vulnerabilities', []):
+        cve = vulnerability.get('cve', {})
+        cve_id = cve.get('id', '')
+
+        # Get CVSS scores
+        metrics = cve.get('metrics', {})
+        cvss_score = 0.0
+        severity = 'UNKNOWN'
+
+        # Try CVSS v3.1 first, then v3.0, then v2
+        for cvss_version in ['cvssMetricV31', 'cvssMetricV30', 'cvssMetricV2']:
+            if cvss_version in metrics and metrics[cvss_version]:
+                metric = metrics[cvss_version][0]
+                if 'cvssData' in metric:
+                    cvss_score = metric['cvssData'].get('baseScore', 0.0)
+                    severity = metric['cvssData'].get('baseSeverity', 'UNKNOWN')
+                    break
+
+        # keywordSearch also returns CVEs about other products; CPE data that never names this
+        # package rules the CVE out. Only CVEs without any CPE data are kept unconstrained.
+        affected = nvd_affected_ranges(cve)
+        package_ranges = _package_ranges(affected, package_name, ecosystem)
+        if affected and not package_ranges:
+            continue
+
+        # Only include CRITICAL and HIGH severity CVEs
+        if severity in ['CRITICAL', 'HIGH']:
+            description = ''
+            descriptions = cve.get('descriptions', [])
+            for desc in descriptions:
+                if desc.get('lang') == 'en':
+                    description = desc.get('value', '')
+                    break
+
+            cves.append({
+                'cve_id': cve_id,
+                'cvss_score': cvss_score,
+                'severity': severity,
+                'description': description[:200] + '...' if len(description) > 200 else description,
+                'published_date': cve.get('published', ''),
+                'last_modified': cve.get('lastModified', ''),
+                'affected': package_ranges
+            })
+
+    return cves
+
+def get_cve_data_for_versions(package_name: str, package_versions: List[str], ecosystem: str,
+                              raise_errors: bool = False) -> Dict[str, List[Dict]]:
+    """
+    Resolve CVEs for several versions of one package with a single candidate fetch.
+    Candidates are compiled once into a VersionRangeIndex, cached in-process, and only
+    CVEs whose affected ranges contain a version are returned for it (top 10 by CVSS).
+    """
+    if not package_name:
+        return {package_version: [] for package_version in package_versions}
+
+    try:
+        range_index = _range_index_memo.get((ecosystem, package_name))
+        if range_index is None:
+            range_index = VersionRangeIndex(fetch_cve_candidates(package_name, ecosystem))
+            _range_index_memo.put((ecosystem, package_name), range_index)
+        matched = range_index.match(package_versions)
     except Exception as e:
         logger.warning(f"Failed to fetch CVE data for {package_name}: {str(e)}")
+        if raise_errors:
+            if isinstance(e, CVELookupError):
+                raise
+            raise CVELookupError(str(e)) from e
+        return {package_version: [] for package_version in package_versions}
+
+    results = {}
+    for package_version, cves in matched.items():
+        top_cves = heapq.nlargest(MAX_CVES_PER_COMPONENT, cves, key=lambda x: x['cvss_score'])
+        _cve_lookup_memo.put((package_name, package_version, ecosystem), top_cves)
+        results[package_version] = top_cves
+    return results
+
+def get_cve_data_for_package(package_name: str, package_version: str, ecosystem: str,
+                             raise_errors: bool = False) -> List[Dict]:
+    """
+    Fetch CVE data for a specific package version from NVD API, or from the offline index per CVE_SOURCE.
+    Returns list of critical and high severity CVEs affecting that version.
+    With raise_errors, failed lookups raise CVELookupError instead of returning [].
+    """
+    if not package_name:
         return []
-    
-    return []
 
-def calculate_dependency_depth(components: List[Dict]) -> Dict:
+    cached_cves = _cve_lookup_memo.get((package_name, package_version, ecosystem), _MISSING)
+    if cached_cves is not _MISSING:
+        return cached_cves
+
+    return get_cve_data_for_versions(package_name, [package_version], ecosystem, raise_errors)[package_version]
+
+def _fetch_package_cve_data(package_key: Tuple[str, str],
+                            package_versions: List[str]) -> Dict[str, Tuple[List[Dict], Optional[str]]]:
+    """Fetch CVE data for all versions of one package, with the failure reason if it did not complete."""
+    package_name, ecosystem = package_key
+    try:
+        matched = get_cve_data_for_versions(package_name, package_versions, ecosystem, raise_errors=True)
+        return {package_version: (matched[package_version], None) for package_version in package_versions}
+    except NVDRateLimitError:
+        reason = 'rate_limited'
+    except CVELookupError:
+        reason = 'error'
+    return {package_version: ([], reason) for package_version in package_versions}
+
+def prefetch_cve_data(lookup_keys: List[Tuple[str, str, str]],
+                      max_workers: Optional[int] = None,
+                      cve_cache: Optional[DynamoDBCVECache] = None,
+                      failures: Optional[Dict] = None) -> Dict[Tuple[str, str, str], List[Dict]]:
+    """
+    Fetch CVE data for every unique (name, version, ecosystem) tuple with bounded concurrency.
+    Results are keyed by lookup tuple so callers can consume them in SBOM order.
+    When a cve_cache is given, cached entries are batch-read first and fresh results written back.
+    Misses are grouped per package, so each package is fetched once for all of its versions.
+    Lookups that did not complete are recorded in failures as {lookup_tuple: reason}.
+    """
+    unique_keys = list(dict.fromkeys(lookup_keys))
+    if not unique_keys:
+        return {}
+
+    # Keys already held in the in-process cache resolve without touching DynamoDB or NVD
+    resolved = {}
+    remaining_keys = []
+    for key in unique_keys:
+        cves = _cve_lookup_memo.get(key, _MISSING)
+        if cves is _MISSING:
+            remaining_keys.append(key)
+        else:
+            resolved[key] = cves
+
+    cached = cve_cache.get_many(remaining_keys) if cve_cache else {}
+    for key, cves in cached.items():
+        _cve_lookup_memo.put(key, cves)
+    resolved.update(cached)
+
+    packages = {}
+    for name, package_version, ecosystem in remaining_keys:
+        if (name, package_version, ecosystem) not in cached:
+            packages.setdefault((name, ecosystem), []).append(package_version)
+
+    fetched = {}
+    if packages:
+        workers = max(1, min(max_workers or CVE_LOOKUP_CONCURRENCY, len(packages)))
+        if workers == 1:
+            package_results = [_fetch_package_cve_data(*item) for item in packages.items()]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map() yields in submission order, keeping the output independent of completion order
+                package_results = list(executor.map(lambda item: _fetch_package_cve_data(*item), packages.items()))
+        for (name, ecosystem), version_results in zip(packages, package_results):
+            for package_version, result in version_results.items():
+                fetched[(name, package_version, ecosystem)] = result
+
+    if cve_cache:
+        # Only successful lookups are cached so transient NVD failures are retried next time
+        cve_cache.put_many({key: cves for key, (cves, reason) in fetched.items() if reason is None})
+    if failures is not None:
+        failures.update({key: reason for key, (cves, reason) in fetched.items() if reason is not None})
+
+    resolved.update({key: cves for key, (cves, reason) in fetched.items()})
+    return {key: resolved[key] for key in unique_keys}
+
+def default_cve_cache() -> Optional[DynamoDBCVECache]:
+    """DynamoDB cache for NVD lookups; not needed while the offline index serves them."""
+    try:
+        if get_offline_vuln_db():
+            return None
+    except CVELookupError:
+        pass
+    return DynamoDBCVECache()
+
+def get_component_ecosystem(purl: str) -> str:
+    """Determine the package ecosystem from a component purl."""
+    for ecosystem in ('pypi', 'npm', 'maven', 'nuget'):
+        if purl.startswith(f'pkg:{ecosystem}/'):
+            return ecosystem
+    return 'other'
+
+def summarize_transitive_risk(graph: DependencyGraph, roots: List[int], component_risks: Dict[str, Dict]) -> Dict:
+    """
+    Worst risk and risky transitive descendants under each direct dependency,
+    from a single propagation pass over the dependency graph.
+    """
+    risk_scores = {}
+    categories = {'sanctioned_origin': [], 'critical_cve': []}
+    for ref, risk_entry in component_risks.items():
+        node = graph.index.get(ref)
+        if node is None:
+            continue
+        risk_scores[node] = risk_entry.get('risk_score', 0.0)
+        risk_factors = risk_entry.get('risk_factors', {})
+        if any(factor.endswith('_country') for factor in risk_factors):
+            categories['sanctioned_origin'].append(node)
+        if risk_factors.get('cve_risk') == 'CRITICAL':
+            categories['critical_cve'].append(node)
+
+    at_risk = []
+    if risk_scores:
+        at_risk = [(root, propagated)
+                   for root, propagated in graph.propagate_risk(risk_scores, roots, categories).items()
+                   if propagated['worst_node'] != -1]
+    # Only the reported roots get an entry built
+    reported = heapq.nsmallest(MAX_REPORTED_RISKY_ROOTS, at_risk, key=lambda item: (
+        -item[1]['worst_score'], -item[1]['risky_descendants'], graph.refs[item[0]]))
+    direct_dependencies = []
+    for root, propagated in reported:
+        component = graph.components[root]
+        direct_dependencies.append({
+            'name': component.get('name', 'unknown'),
+            'purl': component.get('purl', ''),
+            'ref': graph.refs[root],
+            'risk_score': risk_scores.get(root),
+            'worst_risk_score': propagated['worst_score'],
+            'worst_risk_component': graph.refs[propagated['worst_node']],
+            'risky_descendants': propagated['risky_descendants'],
+            'sanctioned_origin_descendants': propagated['sanctioned_origin'],
+            'critical_cve_descendants': propagated['critical_cve']
+        })
+
+    return {
+        'risky_components': len(risk_scores),
+        'direct_dependencies_at_risk': len(at_risk),
+        'direct_dependencies': direct_dependencies
+    }
+
+def calculate_dependency_depth(components: List[Dict], dependencies: Optional[List[Dict]] = None,
+                               component_risks: Optional[Dict[str, Dict]] = None) -> Dict:
     """
     Calculate dependency depth and hierarchy information from SBOM components.
+    Edges come from the CycloneDX top-level dependencies array (bom-ref based) and
+    legacy per-component dependency lists. component_risks maps component refs to
+    their ofac_risks entries and is propagated to the direct dependencies.
+    The dependency_tree lists the MAX_REPORTED_TREE_NODES shallowest components;
+    depth_distribution still counts every one.
     """
     depth_info = {
         'max_depth': 0,
@@ -149,93 +849,51 @@ def calculate_dependency_depth(components: List[Dict]) -> Dict:
         'total_dependencies': len(components),
         'direct_dependencies': 0,
         'transitive_dependencies': 0,
-        'dependency_tree': {}
+        'dependency_tree': {},
+        'dependency_tree_truncated': False
     }
     
     try:
-        # Build dependency relationships
-        component_map = {}
-        dependency_graph = {}
-        
-        for component in components:
-            purl = component.get('purl', '')
-            name = component.get('name', '')
-            component_map[purl] = component
-            dependency_graph[purl] = {
-                'component': component,
-                'dependencies': [],
-                'dependents': [],
-                'depth': 0
+        with paused_gc():
+            graph = DependencyGraph(components, dependencies)
+            analysis = graph.analyze()
+
+            depth_info['max_depth'] = analysis['max_depth']
+            depth_info['depth_distribution'] = {
+                str(depth): count for depth, count in sorted(analysis['depth_distribution'].items())
             }
-        
-        # Analyze dependency relationships if present
-        for component in components:
-            purl = component.get('purl', '')
-            dependencies = component.get('dependencies', [])
-            
-            for dep in dependencies:
-                dep_ref = dep.get('ref', '')
-                if dep_ref in dependency_graph:
-                    dependency_graph[purl]['dependencies'].append(dep_ref)
-                    dependency_graph[dep_ref]['dependents'].append(purl)
-        
-        # Calculate depths using BFS from root components (those with no dependents)
-        root_components = [purl for purl, info in dependency_graph.items() 
-                          if not info['dependents']]
-        
-        if not root_components:
-            # If no clear hierarchy, treat first level as direct dependencies
-            depth_info['direct_dependencies'] = min(len(components), 20)
-            depth_info['transitive_dependencies'] = max(0, len(components) - 20)
-            depth_info['max_depth'] = 1 if components else 0
-            depth_info['depth_distribution'] = {'1': len(components)} if components else {}
-        else:
-            # Calculate actual depths
-            visited = set()
-            queue = [(purl, 0) for purl in root_components]
-            
-            while queue:
-                current_purl, depth = queue.pop(0)
-                if current_purl in visited:
-                    continue
-                    
-                visited.add(current_purl)
-                dependency_graph[current_purl]['depth'] = depth
-                depth_info['max_depth'] = max(depth_info['max_depth'], depth)
-                
-                # Count by depth
-                depth_str = str(depth)
-                depth_info['depth_distribution'][depth_str] = depth_info['depth_distribution'].get(depth_str, 0) + 1
-                
-                # Add dependencies to queue
-                for dep_purl in dependency_graph[current_purl]['dependencies']:
-                    if dep_purl not in visited:
-                        queue.append((dep_purl, depth + 1))
-            
-            # Count direct vs transitive
-            depth_info['direct_dependencies'] = depth_info['depth_distribution'].get('0', 0)
+            depth_info['direct_dependencies'] = analysis['depth_distribution'].get(0, 0)
             depth_info['transitive_dependencies'] = len(components) - depth_info['direct_dependencies']
-        
-        # Create simplified dependency tree for visualization
-        depth_info['dependency_tree'] = {
-            str(i): [] for i in range(depth_info['max_depth'] + 1)
-        }
-        
-        for purl, info in dependency_graph.items():
-            depth_str = str(info['depth'])
-            component_name = info['component'].get('name', 'unknown')
-            if depth_str in depth_info['dependency_tree']:
-                depth_info['dependency_tree'][depth_str].append({
-                    'name': component_name,
-                    'purl': purl,
-                    'dependencies_count': len(info['dependencies'])
+            depth_info['dependency_edges'] = analysis['edge_count']
+            depth_info['cycles_detected'] = len(analysis['cycles'])
+            depth_info['cycles'] = [[graph.refs[node] for node in cycle]
+                                    for cycle in analysis['cycles'][:MAX_REPORTED_CYCLES]]
+            depth_info['longest_path_length'] = max(len(analysis['longest_path']) - 1, 0)
+            depth_info['longest_path'] = [graph.refs[node] for node in analysis['longest_path']]
+            depth_info['dangling_references'] = graph.dangling_references
+
+            # Create simplified dependency tree for visualization, shallowest levels first
+            dependency_tree = {str(i): [] for i in range(depth_info['max_depth'] + 1)}
+            levels = list(dependency_tree.values())
+            depths = analysis['depths']
+            reported = sorted(range(len(depths)), key=depths.__getitem__)[:MAX_REPORTED_TREE_NODES]
+            for node in sorted(reported):
+                component = graph.components[node]
+                levels[depths[node]].append({
+                    'name': component.get('name', 'unknown'),
+                    'purl': component.get('purl', ''),
+                    'dependencies_count': len(graph.children[node])
                 })
+            depth_info['dependency_tree'] = dependency_tree
+            depth_info['dependency_tree_truncated'] = len(depths) > MAX_REPORTED_TREE_NODES
+            depth_info['transitive_risk'] = summarize_transitive_risk(graph, analysis['roots'], component_risks or {})
         
     except Exception as e:
         logger.warning(f"Failed to calculate dependency depth: {str(e)}")
     
     return depth_info
 
+@memoized(_email_domain_memo)
 def extract_domain_from_email(email: str) -> Optional[str]:
     """Extract domain from email address with validation."""
     if not email or '@' not in email:
@@ -246,30 +904,38 @@ def extract_domain_from_email(email: str) -> Optional[str]:
             return None
         domain = parts[1].lower().strip()
         # Basic domain validation
-        if re.match(r'^[a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?)*$', domain):
+        if DOMAIN_PATTERN.match(domain):
             return domain
         return None
     except (IndexError, AttributeError):
         return None
 
+@memoized(_domain_risk_memo)
 def check_domain_for_ofac_risk(domain: str) -> Tuple[Optional[str], float]:
     """Enhanced domain risk checking with better scoring."""
     if not domain:
         return None, 0.0
     
+    rules = get_sanctions_rules()
+
     # Check TLD mapping first (highest confidence)
     tld = domain.split('.')[-1].lower()
-    if tld in DOMAIN_COUNTRY_MAPPING:
-        return DOMAIN_COUNTRY_MAPPING[tld], RISK_WEIGHTS['domain_match']
+    if tld in rules.domain_countries:
+        return rules.domain_countries[tld], rules.risk_weights['domain_match']
     
     # Check for keyword matches in domain
-    domain_lower = domain.lower()
-    for keyword, country in OFAC_COUNTRIES.items():
-        if keyword in domain_lower:
-            return country, RISK_WEIGHTS['keyword_match']
+    match = rules.matcher.search(domain.lower())
+    if match:
+        return match[3], rules.risk_weights['keyword_match']
     
     return None, 0.0
 
+def find_ofac_keywords(text: str) -> List[KeywordMatch]:
+    """All OFAC keyword occurrences in text as (start, end, keyword, country) tuples."""
+    if not text:
+        return []
+    return get_sanctions_rules().matcher.find_all(text.lower())
+
 def calculate_component_risk_score(risk_factors: Dict) -> float:
     """Calculate overall risk score for a component."""
     total_score = 0.0
@@ -283,8 +949,36 @@ def calculate_component_risk_score(risk_factors: Dict) -> float:
     
     return min(total_score, max_possible)
 
-def analyze_ofac(sbom_data: Dict) -> Dict:
-    """Enhanced OFAC analysis with CVE data and dependency depth analysis."""
+def _batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def analyze_ofac(sbom_data: Dict, max_workers: Optional[int] = None,
+                 cve_cache: Optional[DynamoDBCVECache] = None,
+                 components: Optional[Iterable[Dict]] = None,
+                 previous: Optional[AnalysisSnapshot] = None,
+                 snapshot: Optional[AnalysisSnapshot] = None,
+                 metrics: Optional[Metrics] = None) -> Dict:
+    """
+    Enhanced OFAC analysis with CVE data and dependency depth analysis.
+    Components are consumed in batches of CVE_PREFETCH_BATCH_SIZE, so a streamed
+    iterable (e.g. a reader from sbom_formats.open_sbom_reader()) can replace
+    sbom_data['components']. CycloneDX component dicts are normalized into
+    ComponentRecords first, nested components included; once a batch is scored,
+    dependency analysis keeps only compact copies of its records, not the dicts.
+    Risks of nested components list their parents.
+    CVE data for packages found in a previous snapshot is reused instead of looked
+    up again; snapshot, if given, is filled in for the next incremental run.
+    Stage timings are recorded in metrics (the invocation's by default) and reported
+    in metadata.stages.
+    """
+    own_metrics = metrics is None
+    if own_metrics:
+        metrics = Metrics()
     results = {
         "analysis_timestamp": datetime.utcnow().isoformat(),
         "components_analyzed": 0,
@@ -301,127 +995,150 @@ def analyze_ofac(sbom_data: Dict) -> Dict:
             "components_with_cves": 0
         },
         "dependency_analysis": {},
-        "executive_summary": {}
+        "executive_summary": {},
+        "metadata": {}
     }
 
-    components = sbom_data.get('components', [])
-    results["components_analyzed"] = len(components)
-
-    # Calculate dependency depth
-    results["dependency_analysis"] = calculate_dependency_depth(components)
+    if components is None:
+        components = sbom_data.get('components', [])
 
-    # Track components with vulnerabilities
-    vulnerable_components = []
+    # Track components with vulnerabilities; only the most vulnerable are kept for the report
+    vulnerable_components = TopK(MAX_REPORTED_VULNERABLE_COMPONENTS, vulnerability_rank)
     total_cves = 0
+    lookup_failures = {}
+    records = []
+    component_risks = {}
+    sanctions_rules = get_sanctions_rules()
+    risk_weights = sanctions_rules.risk_weights
 
-    for component in components:
-        name = component.get('name', '')
-        version = component.get('version', '')
-        purl = component.get('purl', '')
-
-        # Determine ecosystem
-        ecosystem = 'unknown'
-        if purl.startswith('pkg:pypi/'):
-            ecosystem = 'pypi'
-            results["pypi_components"] += 1
-        elif purl.startswith('pkg:npm/'):
-            ecosystem = 'npm'
-            results["npm_components"] += 1
-        elif purl.startswith('pkg:maven/'):
-            ecosystem = 'maven'
-            results["maven_components"] += 1
-        elif purl.startswith('pkg:nuget/'):
-            ecosystem = 'nuget'
-            results["nuget_components"] += 1
-        else:
-            ecosystem = 'other'
-            results["other_components"] += 1
-
-        # OFAC Risk Analysis (existing logic)
-        author_email = maintainer_email = None
-        risk_info = {}
-        properties = component.get('properties', [])
-
-        for prop in properties:
-            if prop.get('name') == 'author_email':
-                author_email = prop.get('value')
-            elif prop.get('name') == 'maintainer_email':
-                maintainer_email = prop.get('value')
-            elif prop.get('name') == 'origin' and prop.get('value') in OFAC_COUNTRIES.values():
-                risk_info["origin_country"] = prop.get('value')
-                risk_info["origin_confidence"] = RISK_WEIGHTS['origin_explicit']
-
-        for label, email in [('author_email', author_email), ('maintainer_email', maintainer_email)]:
-            domain = extract_domain_from_email(email)
-            country, confidence = check_domain_for_ofac_risk(domain)
-            if country:
-                risk_info[f"{label}_domain"] = domain
-                risk_info[f"{label}_country"] = country
-                risk_info[f"{label}_confidence"] = confidence
-
-        # CVE Analysis for each component
-        component_cves = []
-        if ecosystem in ['pypi', 'npm', 'maven', 'nuget'] and name and version:
-            component_cves = get_cve_data_for_package(name, version, ecosystem)
+    # Reading (and, for streamed SBOMs, parsing) and normalizing a batch is charged to component_read
+    for batch in metrics.timed_iter(_batched(normalize_components(components), CVE_PREFETCH_BATCH_SIZE),
+                                    'component_read'):
+        # Dependency analysis runs once every batch is in; it only needs each record's refs
+        records.extend(record.compact() for record in batch)
+
+        # Prefetch CVE data for the batch's unique packages before the risk loop
+        cve_lookup_keys = []
+        for component in batch:
+            name = component.name
+            version = component.version
+            ecosystem = get_component_ecosystem(component.purl)
+            if ecosystem != 'other' and name and version:
+                cve_lookup_keys.append((package_lookup_name(ecosystem, component.purl, name), version, ecosystem))
+        reused = {}
+        if previous is not None:
+            # Lookups keep their original fetch time, so unchanged packages are still refreshed once it expires
+            max_lookup_age = INCREMENTAL_MAX_BASE_AGE_HOURS * 3600
+            reused = {key: previous.cves[key] for key in cve_lookup_keys
+                      if key in previous.cves and previous.lookup_age_seconds(key) <= max_lookup_age}
+            cve_lookup_keys = [key for key in cve_lookup_keys if key not in reused]
+        with metrics.stage('cve_lookup'):
+            cve_data = prefetch_cve_data(cve_lookup_keys, max_workers=max_workers, cve_cache=cve_cache,
+                                         failures=lookup_failures)
+        cve_data.update(reused)
+        if snapshot is not None:
+            snapshot.reused_lookups += len(reused)
+            snapshot.performed_lookups += len(cve_data) - len(reused)
+            fetched_at = datetime.utcnow().isoformat()
+            for key, cves in cve_data.items():
+                # Failed lookups are left out so the next run retries them
+                if key not in lookup_failures:
+                    snapshot.cves[key] = cves
+                    snapshot.lookup_times[key] = previous.fetched_at(key) if key in reused else fetched_at
+
+        scoring_start = time.perf_counter()
+        for component in batch:
+            name = component.name
+            version = component.version
+            purl = component.purl
+
+            # Determine ecosystem
+            ecosystem = get_component_ecosystem(purl)
+            results[f"{ecosystem}_components"] += 1
+            if snapshot is not None and name:
+                snapshot.packages.add((name, version, ecosystem))
+
+            # OFAC Risk Analysis (existing logic)
+            risk_info = {}
+            for origin in component.origins:
+                if origin in sanctions_rules.country_names:
+                    risk_info["origin_country"] = origin
+                    risk_info["origin_confidence"] = risk_weights['origin_explicit']
+
+            for label, email in [('author_email', component.author_email),
+                                 ('maintainer_email', component.maintainer_email)]:
+                domain = extract_domain_from_email(email)
+                country, confidence = check_domain_for_ofac_risk(domain)
+                if country:
+                    risk_info[f"{label}_domain"] = domain
+                    risk_info[f"{label}_country"] = country
+                    risk_info[f"{label}_confidence"] = confidence
+
+            # CVE Analysis for each component
+            component_cves = []
+            if ecosystem != 'other' and name and version:
+                component_cves = cve_data.get((package_lookup_name(ecosystem, purl, name), version, ecosystem), [])
             
-            if component_cves:
-                vulnerable_components.append({
-                    'name': name,
-                    'version': version,
-                    'ecosystem': ecosystem,
-                    'cve_count': len(component_cves),
-                    'highest_cvss': max([cve['cvss_score'] for cve in component_cves], default=0.0),
-                    'critical_count': len([cve for cve in component_cves if cve['severity'] == 'CRITICAL']),
-                    'high_count': len([cve for cve in component_cves if cve['severity'] == 'HIGH'])
-                })
-                
-                total_cves += len(component_cves)
-                
-                # Add CVE risk to component risk assessment
-                max_cve_score = max([cve['cvss_score'] for cve in component_cves], default=0.0)
-                if max_cve_score >= 9.0:  # Critical
-                    risk_info["cve_risk"] = "CRITICAL"
-                    risk_info["cve_confidence"] = RISK_WEIGHTS['critical_cve']
-                elif max_cve_score >= 7.0:  # High
-                    risk_info["cve_risk"] = "HIGH"
-                    risk_info["cve_confidence"] = RISK_WEIGHTS['high_cve']
-                
-                # Categorize CVEs
-                for cve in component_cves:
-                    cve_entry = {
-                        "component": name,
-                        "version": version,
-                        "ecosystem": ecosystem,
-                        **cve
-                    }
-                    if cve['severity'] == 'CRITICAL':
-                        results["cve_analysis"]["critical_cves"].append(cve_entry)
-                    elif cve['severity'] == 'HIGH':
-                        results["cve_analysis"]["high_cves"].append(cve_entry)
-
-        # Calculate overall component risk score
-        component_risk_score = calculate_component_risk_score(risk_info)
-
-        # Add to OFAC risks if any risk factors found
-        if risk_info:
-            risk_entry = {
-                "name": name,
-                "version": version,
-                "purl": purl,
-                "ecosystem": ecosystem,
-                "risk_factors": risk_info,
-                "risk_score": component_risk_score,
-                "cves": component_cves[:5]  # Top 5 CVEs for this component
-            }
-            results["ofac_risks"].append(risk_entry)
+                if component_cves:
+                    # One pass categorizes the CVEs and counts them per severity
+                    vulnerable = aggregate_component_cves(name, version, ecosystem, component_cves,
+                                                          results["cve_analysis"]["critical_cves"],
+                                                          results["cve_analysis"]["high_cves"])
+                    vulnerable_components.push(vulnerable)
+                    total_cves += len(component_cves)
+
+                    # Add CVE risk to component risk assessment
+                    if vulnerable['highest_cvss'] >= 9.0:  # Critical
+                        risk_info["cve_risk"] = "CRITICAL"
+                        risk_info["cve_confidence"] = risk_weights['critical_cve']
+                    elif vulnerable['highest_cvss'] >= 7.0:  # High
+                        risk_info["cve_risk"] = "HIGH"
+                        risk_info["cve_confidence"] = risk_weights['high_cve']
+
+            # Calculate overall component risk score
+            component_risk_score = calculate_component_risk_score(risk_info)
+
+            # Add to OFAC risks if any risk factors found
+            if risk_info:
+                risk_entry = {
+                    "name": name,
+                    "version": version,
+                    "purl": purl,
+                    "ecosystem": ecosystem,
+                    "risk_factors": risk_info,
+                    "risk_score": component_risk_score,
+                    "cves": component_cves[:5]  # Top 5 CVEs for this component
+                }
+                if component.parent is not None:
+                    risk_entry["parents"] = component.parent.refs()
+                results["ofac_risks"].append(risk_entry)
+                component_risks.setdefault(component_ref(component), risk_entry)
+        metrics.add_stage('risk_scoring', time.perf_counter() - scoring_start)
+
+    # Calculate dependency depth
+    results["components_analyzed"] = len(records)
+    with metrics.stage('dependency_analysis'):
+        results["dependency_analysis"] = calculate_dependency_depth(records, sbom_data.get('dependencies'),
+                                                                    component_risks)
 
     # Update CVE analysis summary
     results["cve_analysis"]["total_cves_found"] = total_cves
-    results["cve_analysis"]["components_with_cves"] = len(vulnerable_components)
-    results["cve_analysis"]["vulnerable_components"] = vulnerable_components[:20]  # Top 20 most vulnerable
+    results["cve_analysis"]["components_with_cves"] = vulnerable_components.seen
+    results["cve_analysis"]["vulnerable_components"] = vulnerable_components.items()
+
+    # Report lookups that did not complete rather than treating them as "no CVEs"
+    results["cve_analysis"]["lookup_failures"] = [
+        {"component": name, "version": version, "ecosystem": ecosystem, "reason": reason}
+        for (name, version, ecosystem), reason in lookup_failures.items()
+    ]
+    results["cve_analysis"]["rate_limited_lookups"] = sum(
+        1 for reason in lookup_failures.values() if reason == 'rate_limited'
+    )
+    results["cve_analysis"]["lookup_complete"] = not lookup_failures
 
     # Generate Executive Summary
-    results["executive_summary"] = generate_executive_summary(results)
+    with metrics.stage('executive_summary'):
+        results["executive_summary"] = generate_executive_summary(results)
 
     # Generate overall risk assessment
     critical_issues = len(results["cve_analysis"]["critical_cves"])
@@ -445,10 +1162,21 @@ def analyze_ofac(sbom_data: Dict) -> Dict:
         "critical_cves": len(results["cve_analysis"]["critical_cves"]),
         "high_cves": len(results["cve_analysis"]["high_cves"]),
         "max_dependency_depth": results["dependency_analysis"]["max_depth"],
+        "cve_lookup_failures": len(lookup_failures),
         "overall_risk_level": overall_risk,
         "risk_level": overall_risk  # Add this for consistency
     }
 
+    if cve_cache:
+        results["metadata"]["cve_cache"] = cve_cache.stats()
+    results["metadata"]["memo_cache"] = memo_cache_stats()
+    results["metadata"]["cve_source"] = cve_source_info()
+    results["metadata"]["sanctions_rules"] = sanctions_rules.describe()
+    results["metadata"]["stages"] = metrics.breakdown()
+    metrics.count('ComponentsAnalyzed', results["components_analyzed"])
+    if own_metrics:
+        invocation_metrics.merge(metrics)
+
     return results
 
 def generate_executive_summary(analysis_results: Dict) -> Dict:
@@ -489,6 +1217,11 @@ def generate_executive_summary(analysis_results: Dict) -> Dict:
         recommendation = "Plan remediation activities and monitor for updates."
         risk_level = "MEDIUM"
     
+    # Flag incomplete CVE coverage so a throttled scan is not mistaken for a clean one
+    lookup_failures = cve_analysis.get("lookup_failures", [])
+    if lookup_failures:
+        recommendation += f" CVE data incomplete for {len(lookup_failures)} components; re-run analysis to confirm."
+
     # Key metrics for executives
     total_components = summary.get("total_components", 0)
     vulnerable_percentage = (cve_analysis.get("components_with_cves", 0) / max(total_components, 1)) * 100
@@ -496,8 +1229,8 @@ def generate_executive_summary(analysis_results: Dict) -> Dict:
     # Top risks for executive attention
     top_risks = []
     
-    # Add critical CVEs
-    for cve in critical_cves[:3]:  # Top 3 critical
+    # Add critical CVEs, highest CVSS first
+    for cve in heapq.nlargest(3, critical_cves, key=lambda cve: cve.get('cvss_score', 0.0)):  # Top 3 critical
         top_risks.append({
             "type": "Critical Vulnerability",
             "component": cve.get("component", "Unknown"),
@@ -505,8 +1238,8 @@ def generate_executive_summary(analysis_results: Dict) -> Dict:
             "impact": "System compromise, data breach risk"
         })
     
-    # Add OFAC risks
-    for risk in ofac_risks[:2]:  # Top 2 OFAC risks
+    # Add OFAC risks, highest risk score first
+    for risk in heapq.nlargest(2, ofac_risks, key=lambda risk: risk.get('risk_score', 0.0)):  # Top 2 OFAC risks
         risk_factors = risk.get("risk_factors", {})
         country = risk_factors.get("origin_country") or risk_factors.get("author_email_country", "Unknown")
         top_risks.append({
@@ -529,13 +1262,931 @@ def generate_executive_summary(analysis_results: Dict) -> Dict:
             "ofac_risks": len(ofac_risks),
             "dependency_depth": dependency_analysis.get("max_depth", 0),
             "direct_dependencies": dependency_analysis.get("direct_dependencies", 0),
-            "transitive_dependencies": dependency_analysis.get("transitive_dependencies", 0)
+            "transitive_dependencies": dependency_analysis.get("transitive_dependencies", 0),
+            "direct_dependencies_at_risk": dependency_analysis.get("transitive_risk", {}).get("direct_dependencies_at_risk", 0),
+            "cve_lookup_failures": len(lookup_failures)
         },
         "top_risks": top_risks[:5],  # Top 5 risks for executive attention
         "analysis_timestamp": analysis_results.get("analysis_timestamp", ""),
         "action_required": len(critical_cves) > 0 or len(ofac_risks) > 0
     }
 
+API_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+}
+
+def api_response(status_code: int, body: Dict) -> Dict:
+    return {'statusCode': status_code, 'headers': API_CORS_HEADERS, 'body': json.dumps(body, default=str)}
+
+def is_async_request(event: Dict, body: Dict) -> bool:
+    """Async mode is requested with POST /jobs, ?mode=async or {"mode": "async"} in the body."""
+    path = event.get('path') or event.get('rawPath') or ''
+    query = event.get('queryStringParameters') or {}
+    return path.rstrip('/').endswith('/jobs') or query.get('mode') == 'async' or body.get('mode') == 'async'
+
+def load_request_sbom(sbom) -> Dict:
+    """
+    The sbom member of an API request as a document analyze_ofac accepts: a JSON
+    object (CycloneDX or SPDX), or the text of any supported format (e.g. CycloneDX XML).
+    """
+    if isinstance(sbom, str):
+        return load_document(sbom.encode('utf-8'))[1]
+    return normalize_document(sbom)
+
+def job_item_key(job_id: str) -> Dict:
+    return {'sbom_id': f"job#{job_id}"}
+
+def update_job(job_id: str, **attributes) -> None:
+    attributes['updated_at'] = datetime.utcnow().isoformat()
+    names = {f"#{name}": name for name in attributes}
+    values = {f":{name}": value for name, value in attributes.items()}
+    DynamoDBTable(DDB_TABLE_NAME).update_item(
+        Key=job_item_key(job_id),
+        UpdateExpression='SET ' + ', '.join(f"#{name} = :{name}" for name in attributes),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+def submit_analysis_job(sbom_data: Dict, context) -> Dict:
+    """Store the SBOM, record a QUEUED job and start the analysis as an asynchronous self-invocation."""
+    job_id = uuid.uuid4().hex
+    input_key = f"jobs/{job_id}/sbom.json"
+    submitted_at = datetime.utcnow().isoformat()
+
+    get_client('s3').put_object(Bucket=S3_BUCKET_NAME, Key=input_key, Body=json.dumps(sbom_data),
+                                ContentType='application/json')
+    DynamoDBTable(DDB_TABLE_NAME).put_item(Item={
+        **job_item_key(job_id),
+        'record_type': 'analysis_job',
+        'job_id': job_id,
+        'status': 'QUEUED',
+        'timestamp': submitted_at,
+        'submitted_at': submitted_at,
+        'updated_at': submitted_at,
+        'input_key': input_key,
+        'expires_at': int(time.time()) + JOB_TTL_SECONDS
+    })
+
+    try:
+        function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME') or context.function_name
+        get_client('lambda').invoke(FunctionName=function_name, InvocationType='Event',
+                                    Payload=json.dumps({'analysis_job': job_id}).encode('utf-8'))
+    except Exception as e:
+        logger.error(f"Failed to start analysis job {job_id}: {str(e)}")
+        update_job(job_id, status='FAILED', error=f"Failed to start analysis: {str(e)}")
+        return api_response(500, {'error': 'Failed to start analysis job', 'job_id': job_id})
+
+    logger.info(f"Queued analysis job {job_id}")
+    return api_response(202, {'job_id': job_id, 'status': 'QUEUED', 'submitted_at': submitted_at})
+
+def run_analysis_job(job_id: str, context) -> Dict:
+    """Background half of async mode: analyze the stored SBOM and record the outcome on the job row."""
+    start_time = datetime.utcnow()
+    job = DynamoDBTable(DDB_TABLE_NAME).get_item(Key=job_item_key(job_id), ConsistentRead=True).get('Item')
+    if not job:
+        logger.error(f"Unknown analysis job {job_id}")
+        return {'statusCode': 404, 'body': json.dumps(f'Unknown job {job_id}')}
+    if job['status'] == 'COMPLETE':
+        # Async invocations can be delivered more than once
+        logger.info(f"Analysis job {job_id} already complete")
+        return {'statusCode': 200, 'body': json.dumps({'job_id': job_id, 'status': 'COMPLETE'})}
+
+    update_job(job_id, status='RUNNING')
+    try:
+        response = get_client('s3').get_object(Bucket=S3_BUCKET_NAME, Key=job['input_key'])
+        sbom_data = load_request_sbom(json.loads(response['Body'].read().decode('utf-8')))
+        analysis_results = analyze_ofac(sbom_data, cve_cache=default_cve_cache())
+        analysis_results["metadata"] = {
+            "source": "api-gateway-async",
+            "job_id": job_id,
+            "analysis_time_utc": datetime.utcnow().isoformat(),
+            "processing_time_seconds": (datetime.utcnow() - start_time).total_seconds(),
+            "lambda_version": "v2.0.0",
+            "lambda_request_id": context.aws_request_id if context else "unknown",
+            **analysis_results.get("metadata", {})
+        }
+        result_key = f"jobs/{job_id}/result.json"
+        upload_analysis(get_client('s3'), S3_BUCKET_NAME, result_key, analysis_results, pretty=False,
+                        metadata={'analysis-version': 'v2.0.0', 'job-id': job_id,
+                                  'risk-level': analysis_results["summary"]["risk_level"]})
+    except Exception as e:
+        logger.error(f"Analysis job {job_id} failed: {str(e)}")
+        update_job(job_id, status='FAILED', error=str(e))
+        return {'statusCode': 500, 'body': json.dumps({'job_id': job_id, 'status': 'FAILED', 'error': str(e)})}
+
+    update_job(job_id, status='COMPLETE', result_key=result_key,
+               summary=json.dumps(analysis_results["summary"], default=str),
+               processing_time_seconds=str(analysis_results["metadata"]["processing_time_seconds"]))
+    logger.info(f"Analysis job {job_id} complete")
+    return {'statusCode': 200, 'body': json.dumps({'job_id': job_id, 'status': 'COMPLETE', 'result_key': result_key})}
+
+def get_analysis_job(job_id: str) -> Dict:
+    """Return job status; completed jobs include the result inline, or a presigned URL when it is large."""
+    job = DynamoDBTable(DDB_TABLE_NAME).get_item(Key=job_item_key(job_id), ConsistentRead=True).get('Item')
+    if not job or job.get('record_type') != 'analysis_job':
+        return api_response(404, {'error': f'Job not found: {job_id}'})
+
+    body = {key: job[key] for key in ('job_id', 'status', 'submitted_at', 'updated_at', 'error') if key in job}
+    if job['status'] == 'COMPLETE':
+        body['summary'] = json.loads(job['summary'])
+        body['result_key'] = job['result_key']
+        result = get_client('s3').get_object(Bucket=S3_BUCKET_NAME, Key=job['result_key'])
+        if result['ContentLength'] <= JOB_INLINE_RESULT_MAX_BYTES:
+            body['result'] = json.loads(result['Body'].read())
+        else:
+            result['Body'].close()
+            body['result_url'] = get_client('s3').generate_presigned_url(
+                'get_object', Params={'Bucket': S3_BUCKET_NAME, 'Key': job['result_key']}, ExpiresIn=3600)
+    return api_response(200, body)
+
+class ContentDigest:
+    """
+    sbom_content_digest() computed as components go by: add() each normalized
+    component in document order, then hexdigest() with the dependencies, which
+    a streamed document only has at the end.
+    """
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+
+    def add(self, component: ComponentRecord) -> None:
+        self._sha256.update(json.dumps(component.to_dict(), sort_keys=True, separators=(',', ':')).encode('utf-8'))
+        self._sha256.update(b'\n')
+
+    def hexdigest(self, dependencies=None) -> str:
+        self._sha256.update(b'\x00')
+        self._sha256.update(json.dumps(dependencies or [], sort_keys=True, separators=(',', ':')).encode('utf-8'))
+        return self._sha256.hexdigest()
+
+def sbom_content_digest(components: Iterable[Dict], dependencies=None) -> str:
+    """
+    SHA-256 over canonical JSON of the normalized components and the dependencies,
+    the only parts of an SBOM that analysis reads. Reformatting, key order, the
+    source format and changes to other metadata (timestamps, serial numbers) do
+    not change the digest.
+    """
+    digest = ContentDigest()
+    for component in normalize_components(components):
+        digest.add(component)
+    return digest.hexdigest(dependencies)
+
+def dedup_item_key(digest: str) -> Dict:
+    return {'sbom_id': f"sha256#{digest}"}
+
+def object_item_key(etag: str, size: int) -> Dict:
+    """Dedup key of a byte-identical S3 object, which streamed uploads can look up before reading it."""
+    etag = etag.strip('"')
+    return {'sbom_id': f"etag#{etag}#{size}"}
+
+def find_cached_analysis(item_key: Dict) -> Optional[Dict]:
+    """
+    The stored analysis of identical SBOM content (item_key from dedup_item_key()
+    or object_item_key()), if it is fresher than DEDUP_FRESHNESS_SECONDS and was
+    produced with the current sanctions rules and output settings.
+    """
+    try:
+        item = DynamoDBTable(DDB_TABLE_NAME).get_item(Key=item_key).get('Item')
+    except Exception as e:
+        logger.warning(f"Dedup lookup failed: {str(e)}")
+        return None
+    if not item:
+        return None
+    try:
+        age = (datetime.utcnow() - datetime.fromisoformat(item['analysis_timestamp'])).total_seconds()
+    except (KeyError, ValueError):
+        return None
+    if (age > DEDUP_FRESHNESS_SECONDS
+            or item.get('sanctions_rules_version') != get_sanctions_rules().version
+            or item.get('output_format') != ANALYSIS_OUTPUT_FORMAT
+            or item.get('content_encoding') != ANALYSIS_OUTPUT_ENCODING):
+        return None
+    return {**item, 'summary': json.loads(item['summary']), 'age_seconds': age}
+
+def record_analysis_digest(digest: str, bucket: str, output_key: str, analysis_results: Dict,
+                           saved_snapshot_key: Optional[str], object_key: Optional[Dict] = None) -> None:
+    """
+    Remember where the analysis of this content is stored, for later identical
+    uploads: under its digest and, if given, under the object's ETag and size.
+    """
+    item = {
+        **dedup_item_key(digest),
+        'record_type': 'analysis_digest',
+        'content_sha256': digest,
+        'timestamp': datetime.utcnow().isoformat(),
+        'analysis_timestamp': analysis_results["analysis_timestamp"],
+        'bucket': bucket,
+        'output_key': output_key,
+        'source_key': analysis_results["metadata"]["source_file"],
+        # Stored as JSON so numbers come back as ints rather than Decimals
+        'summary': json.dumps(analysis_results["summary"]),
+        'sanctions_rules_version': analysis_results["metadata"]["sanctions_rules"]["version"],
+        'output_format': ANALYSIS_OUTPUT_FORMAT,
+        'content_encoding': ANALYSIS_OUTPUT_ENCODING,
+        'expires_at': int(time.time()) + DEDUP_FRESHNESS_SECONDS
+    }
+    if saved_snapshot_key:
+        item['snapshot_key'] = saved_snapshot_key
+    try:
+        table = DynamoDBTable(DDB_TABLE_NAME)
+        table.put_item(Item=item)
+        if object_key:
+            table.put_item(Item={**item, **object_key})
+    except Exception as e:
+        logger.warning(f"Failed to record analysis digest: {str(e)}")
+
+def sbom_stem(file_name: str) -> str:
+    """File name without its SBOM extension."""
+    for extension in SBOM_FILE_EXTENSIONS:
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+def analysis_output_key(file_name: str, extension: str) -> str:
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    return f"analysis/{sbom_stem(file_name)}_analysis_{timestamp}{extension}"
+
+def serve_cached_analysis(bucket: str, key: str, cached: Dict, digest: str, start_time: datetime,
+                          context) -> Optional[Dict]:
+    """
+    Copy a stored analysis of identical content to a new output key instead of
+    re-analyzing. Returns None if the stored result could not be copied.
+    """
+    file_name = key.split('/')[-1]
+    extension = '.ndjson' if cached['output_key'].endswith('.ndjson') else '.json'
+    output_key = analysis_output_key(file_name, extension)
+    cache_info = {
+        'hit': True,
+        'content_sha256': digest,
+        'original_output_key': cached['output_key'],
+        'original_source_key': cached.get('source_key'),
+        'age_seconds': round(cached['age_seconds'], 3)
+    }
+    try:
+        # A repeat within the same second maps to the original object itself
+        if (cached.get('bucket', bucket), cached['output_key']) != (bucket, output_key):
+            get_client('s3').copy_object(
+                Bucket=bucket,
+                Key=output_key,
+                CopySource={'Bucket': cached.get('bucket', bucket), 'Key': cached['output_key']},
+                MetadataDirective='REPLACE',
+                ContentType='application/x-ndjson' if extension == '.ndjson' else 'application/json',
+                **({'ContentEncoding': cached['content_encoding']} if cached['content_encoding'] != 'none' else {}),
+                Metadata={
+                    'analysis-version': 'v2.0.0',
+                    'source-file': file_name,
+                    'risk-level': cached['summary']['risk_level'],
+                    'served-from-cache': 'true',
+                    'original-output-key': cached['output_key']
+                }
+            )
+    except Exception as e:
+        logger.warning(f"Could not reuse cached analysis {cached['output_key']}, re-analyzing: {str(e)}")
+        return None
+
+    try:
+        audit_item = {
+            'sbom_id': str(file_name),
+            'timestamp': datetime.utcnow().isoformat(),
+            'bucket': bucket,
+            'source_key': key,
+            'output_key': output_key,
+            'summary': cached['summary'],
+            'served_from_cache': True,
+            'content_sha256': digest,
+            'lambda_request_id': context.aws_request_id if context else "unknown"
+        }
+        # Keep the incremental-analysis chain intact for this SBOM name
+        if cached.get('snapshot_key') and cached.get('source_key', '').split('/')[-1] == file_name:
+            audit_item['snapshot_key'] = cached['snapshot_key']
+        DynamoDBTable(DDB_TABLE_NAME).put_item(Item=audit_item)
+    except Exception as ddb_err:
+        logger.warning(f"DynamoDB insert failed: {str(ddb_err)}")
+
+    total_processing_time = (datetime.utcnow() - start_time).total_seconds()
+    logger.info(f"Identical SBOM analyzed {cached['age_seconds']:.0f}s ago; copied {cached['output_key']} to {output_key}")
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'SBOM analysis served from cache',
+            'bucket': bucket,
+            'input_key': key,
+            'output_key': output_key,
+            'processing_time_seconds': total_processing_time,
+            'summary': cached['summary'],
+            'cache': cache_info
+        }, default=str)
+    }
+
+def _index_entries(components: Iterable[Dict]) -> List[Tuple[str, str]]:
+    return [(component.purl, component.name) for component in normalize_components(components) if component.purl]
+
+def _collect_index_entries(components: Iterable[Dict], entries: List[Tuple[str, str]],
+                           digest: Optional[ContentDigest] = None) -> Iterator[ComponentRecord]:
+    """
+    Pass components through as records (nested ones included), recording their
+    (purl, name) for the index and, if given, adding them to digest.
+    """
+    for component in normalize_components(components):
+        if component.purl:
+            entries.append((component.purl, component.name))
+        if digest is not None:
+            digest.add(component)
+        yield component
+
+def index_sbom_components(sbom_id: str, entries: List[Tuple[str, str]], source_key: str) -> Optional[Dict]:
+    """Replace sbom_id's entries in the component index. Failures only cost index freshness."""
+    if not COMPONENT_INDEX_TABLE:
+        return None
+    try:
+        stats = ComponentIndex(DynamoDBTable(COMPONENT_INDEX_TABLE)).update(sbom_id, entries, source_key=source_key)
+    except Exception as e:
+        logger.warning(f"Component index update failed for {sbom_id}: {str(e)}")
+        return None
+    logger.info(f"Indexed {stats['entries']} components of {sbom_id} ({stats['removed']} stale entries removed)")
+    return stats
+
+def query_component_index(event: Dict) -> Dict:
+    """
+    GET /components?purl=pkg:maven/org.apache.logging.log4j/log4j-core@2.14
+    or ?package=...&version=2.14[&exact=true]: SBOMs containing a component,
+    matching versions by prefix unless exact is set.
+    """
+    if not COMPONENT_INDEX_TABLE:
+        return api_response(404, {'error': 'Component index is not enabled'})
+    query = event.get('queryStringParameters') or {}
+    package, version = query.get('package'), query.get('version')
+    if query.get('purl'):
+        parts = split_purl(query['purl'])
+        if not parts:
+            return api_response(400, {'error': f"Invalid purl: {query['purl']}"})
+        package, version = parts[0], version or parts[1]
+    if not package:
+        return api_response(400, {'error': 'Missing purl or package query parameter'})
+    try:
+        limit = int(query.get('limit', '1000'))
+    except ValueError:
+        return api_response(400, {'error': 'limit must be an integer'})
+    try:
+        result = ComponentIndex(DynamoDBTable(COMPONENT_INDEX_TABLE)).query(
+            package, version or None, exact=query.get('exact', '').lower() == 'true',
+            limit=limit, next_token=query.get('next_token'))
+    except ValueError:
+        return api_response(400, {'error': 'Invalid next_token'})
+    return api_response(200, result)
+
+def snapshot_key(sbom_id: str) -> str:
+    """S3 key of the incremental-analysis snapshot kept for an SBOM."""
+    return f"analysis/snapshots/{sbom_stem(sbom_id)}.snapshot.json.gz"
+
+def load_previous_snapshot(bucket: str, sbom_id: str) -> Optional[AnalysisSnapshot]:
+    """
+    Snapshot of the last analysis of sbom_id, located through its DynamoDB audit row.
+    Returns None (meaning a full analysis) when there is none or it is too old to reuse.
+    """
+    try:
+        item = DynamoDBTable(DDB_TABLE_NAME).get_item(Key={'sbom_id': sbom_id}).get('Item')
+        if not item or not item.get('snapshot_key'):
+            return None
+        response = get_client('s3').get_object(Bucket=bucket, Key=item['snapshot_key'])
+        previous = AnalysisSnapshot.from_bytes(response['Body'].read())
+    except Exception as e:
+        logger.warning(f"Could not load previous analysis of {sbom_id}, running a full analysis: {str(e)}")
+        return None
+    if previous.age_seconds() > INCREMENTAL_MAX_BASE_AGE_HOURS * 3600:
+        logger.info(f"Previous analysis of {sbom_id} is older than {INCREMENTAL_MAX_BASE_AGE_HOURS}h; running a full analysis")
+        return None
+    return previous
+
+def process_sbom_object(bucket: str, key: str, context, cve_cache: Optional[DynamoDBCVECache] = None,
+                        rescan: Optional[Dict] = None) -> Dict:
+    """
+    Analyze one SBOM stored in S3 and write the results back. Returns a Lambda-style response.
+    A CVE re-scan passes rescan, which forces a fresh analysis (no stored or incremental reuse).
+    Per-stage timings are reported in the response metadata and the invocation's metrics.
+    """
+    metrics = Metrics()
+    try:
+        return _process_sbom_object(bucket, key, context, cve_cache, rescan, metrics)
+    finally:
+        invocation_metrics.merge(metrics)
+
+def _process_sbom_object(bucket: str, key: str, context, cve_cache: Optional[DynamoDBCVECache],
+                         rescan: Optional[Dict], metrics: Metrics) -> Dict:
+    start_time = datetime.utcnow()
+
+    # Validate inputs
+    if not bucket or not key:
+        logger.error("Missing bucket or key in event")
+        return {'statusCode': 400, 'body': json.dumps('Missing bucket or key')}
+
+    # Validate file format
+    if not key.startswith('sboms/') or not key.endswith(SBOM_FILE_EXTENSIONS):
+        logger.info(f"Skipping non-SBOM file: {key}")
+        return {'statusCode': 200, 'body': json.dumps('Not a SBOM file, skipping')}
+
+    logger.info(f"Processing SBOM from s3://{bucket}/{key}")
+    file_name = key.split('/')[-1]
+
+    # Enhanced S3 object retrieval with validation
+    try:
+        with metrics.stage('s3_read'):
+            response = get_client('s3').get_object(Bucket=bucket, Key=key)
+            content_length = response.get('ContentLength', 0)
+        
+        # Check file size against the configured ceiling
+        if content_length > MAX_SBOM_SIZE_BYTES:
+            logger.error(f"File too large: {content_length} bytes")
+            return {'statusCode': 413, 'body': json.dumps('File too large')}
+        
+        # Large SBOMs are parsed incrementally from the response body during analysis
+        streaming = content_length > SBOM_STREAMING_THRESHOLD_BYTES
+        if not streaming:
+            with metrics.stage('s3_read'):
+                sbom_content = response['Body'].read()
+            with metrics.stage('json_parse'):
+                sbom_format, sbom_data = load_document(sbom_content)
+        
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON format: {str(e)}")
+        return {'statusCode': 400, 'body': json.dumps(f'Invalid JSON: {str(e)}')}
+    except SBOMFormatError as e:
+        logger.error(f"Invalid SBOM: {str(e)}")
+        return {'statusCode': 400, 'body': json.dumps(f'Invalid SBOM: {str(e)}')}
+    except Exception as e:
+        logger.error(f"Error reading S3 object: {str(e)}")
+        return {'statusCode': 500, 'body': json.dumps(f'S3 read error: {str(e)}')}
+
+    # Validate SBOM format before its content is hashed, so a missing 'components' never matches an empty list
+    if not streaming and 'components' not in sbom_data:
+        logger.error("Invalid SBOM format: missing 'components' field")
+        return {'statusCode': 400, 'body': json.dumps('Invalid SBOM format')}
+
+    # Identical content analyzed recently is served from the stored result
+    digest = object_key = content_digest = cached = None
+    if DEDUP_FRESHNESS_SECONDS > 0:
+        if streaming:
+            # Byte-identical objects are found by ETag and size without reading them; otherwise the
+            # digest is computed during the single analysis pass and recorded after it
+            if response.get('ETag'):
+                object_key = object_item_key(response['ETag'], content_length)
+                with metrics.stage('dedup_lookup'):
+                    cached = find_cached_analysis(object_key) if rescan is None else None
+            content_digest = ContentDigest()
+        else:
+            with metrics.stage('content_digest'):
+                digest = sbom_content_digest(sbom_data['components'], sbom_data.get('dependencies'))
+            with metrics.stage('dedup_lookup'):
+                cached = find_cached_analysis(dedup_item_key(digest)) if rescan is None else None
+    if cached:
+        with metrics.stage('output_write'):
+            cached_response = serve_cached_analysis(bucket, key, cached, cached.get('content_sha256', digest),
+                                                    start_time, context)
+        if cached_response:
+            with metrics.stage('component_index'):
+                if streaming:
+                    # The bytes match an analyzed upload, so they parse; only the index entries are read
+                    index_entries = _index_entries(open_sbom_reader(response['Body'])[1].components())
+                else:
+                    index_entries = _index_entries(sbom_data['components'])
+                index_sbom_components(file_name, index_entries, key)
+            metrics.count('SBOMsServedFromCache')
+            return cached_response
+
+    previous = snapshot = None
+    if INCREMENTAL_ANALYSIS:
+        with metrics.stage('snapshot_load'):
+            previous = load_previous_snapshot(bucket, file_name) if rescan is None else None
+        snapshot = AnalysisSnapshot(source_key=key)
+
+    if streaming:
+        logger.info(f"Starting streaming OFAC analysis ({content_length} bytes)...")
+        index_entries = []
+        try:
+            sbom_format, reader = open_sbom_reader(response['Body'])
+            analysis_results = analyze_ofac(reader.document, cve_cache=cve_cache,
+                                            components=_collect_index_entries(reader.components(), index_entries,
+                                                                              content_digest),
+                                            previous=previous, snapshot=snapshot, metrics=metrics)
+            # A JSON head that named neither format is settled by the arrays read
+            sbom_format = getattr(reader, 'sbom_format', sbom_format)
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON format: {str(e)}")
+            return {'statusCode': 400, 'body': json.dumps(f'Invalid JSON: {str(e)}')}
+        except SBOMFormatError as e:
+            logger.error(f"Invalid SBOM: {str(e)}")
+            return {'statusCode': 400, 'body': json.dumps(f'Invalid SBOM: {str(e)}')}
+
+        if not reader.has_components:
+            logger.error("Invalid SBOM format: missing 'components' field")
+            return {'statusCode': 400, 'body': json.dumps('Invalid SBOM format')}
+        if content_digest is not None:
+            digest = content_digest.hexdigest(reader.document.get('dependencies'))
+    else:
+        # Perform analysis
+        logger.info("Starting OFAC analysis...")
+        analysis_results = analyze_ofac(sbom_data, cve_cache=cve_cache, previous=previous, snapshot=snapshot,
+                                        metrics=metrics)
+        index_entries = _index_entries(sbom_data['components'])
+
+    if previous is not None:
+        analysis_results["changes"] = diff_snapshots(previous, snapshot)
+        logger.info(f"Incremental analysis: {analysis_results['changes']['cve_lookups_reused']} CVE lookups reused, "
+                    f"{analysis_results['changes']['cve_lookups_performed']} performed")
+
+    # Enhanced metadata
+    analysis_results["metadata"] = {
+        "source_file": key,
+        "source_bucket": bucket,
+        "file_size_bytes": content_length,
+        "sbom_format": sbom_format,
+        "ingestion": "streaming" if streaming else "buffered",
+        "analysis_mode": "incremental" if previous is not None else "full",
+        "cache": {"hit": False, "content_sha256": digest},
+        **({"rescan": rescan} if rescan else {}),
+        "analysis_time_utc": datetime.utcnow().isoformat(),
+        "processing_time_seconds": (datetime.utcnow() - start_time).total_seconds(),
+        "lambda_version": "v2.0.0",
+        "lambda_request_id": context.aws_request_id if context else "unknown",
+        **analysis_results.get("metadata", {})
+    }
+
+    # Save results to S3 with enhanced naming
+    output_key = analysis_output_key(file_name, '.ndjson' if ANALYSIS_OUTPUT_FORMAT == 'ndjson' else '.json')
+    
+    try:
+        output_write_start = time.perf_counter()
+        output_stats = upload_analysis(
+            get_client('s3'),
+            bucket,
+            output_key,
+            analysis_results,
+            output_format=ANALYSIS_OUTPUT_FORMAT,
+            pretty=ANALYSIS_OUTPUT_PRETTY,
+            content_encoding=ANALYSIS_OUTPUT_ENCODING,
+            metadata={
+                'analysis-version': 'v2.0.0',
+                'source-file': file_name,
+                'risk-level': analysis_results["summary"]["risk_level"]
+            }
+        )
+        logger.info(f"Wrote {output_stats['bytes_uploaded']} bytes ({output_stats['content_encoding']}) "
+                    f"in {max(output_stats['parts'], 1)} part(s)")
+    except Exception as e:
+        logger.error(f"Error saving analysis to S3: {str(e)}")
+        return {'statusCode': 500, 'body': json.dumps(f'S3 write error: {str(e)}')}
+    finally:
+        metrics.add_stage('output_write', time.perf_counter() - output_write_start)
+
+    # Keep this run's packages and CVE lookups for the next upload of the same SBOM
+    saved_snapshot_key = None
+    if snapshot is not None:
+        snapshot.analysis_timestamp = analysis_results["analysis_timestamp"]
+        snapshot.output_key = output_key
+        try:
+            with metrics.stage('snapshot_write'):
+                get_client('s3').put_object(Bucket=bucket, Key=snapshot_key(file_name), Body=snapshot.to_bytes(),
+                                            ContentType='application/json', ContentEncoding='gzip')
+            saved_snapshot_key = snapshot_key(file_name)
+        except Exception as e:
+            logger.warning(f"Failed to save analysis snapshot: {str(e)}")
+
+    # Enhanced DynamoDB logging with error handling
+    try:
+        table = DynamoDBTable(DDB_TABLE_NAME)
+        ddb_item = {
+            'sbom_id': str(file_name),
+            'timestamp': datetime.utcnow().isoformat(),
+            'bucket': bucket,
+            'source_key': key,
+            'output_key': output_key,
+            'summary': analysis_results["summary"],
+            # DynamoDB rejects floats
+            'processing_time_seconds': str(analysis_results["metadata"]["processing_time_seconds"]),
+            'lambda_request_id': analysis_results["metadata"]["lambda_request_id"]
+        }
+        if saved_snapshot_key:
+            ddb_item['snapshot_key'] = saved_snapshot_key
+        with metrics.stage('audit_write'):
+            table.put_item(Item=ddb_item)
+        logger.info("Successfully logged to DynamoDB")
+    except Exception as ddb_err:
+        logger.warning(f"DynamoDB insert failed: {str(ddb_err)}")
+        # Don't fail the entire process for DynamoDB issues
+
+    if digest:
+        with metrics.stage('audit_write'):
+            record_analysis_digest(digest, bucket, output_key, analysis_results, saved_snapshot_key, object_key)
+    with metrics.stage('component_index'):
+        index_sbom_components(file_name, index_entries, key)
+
+    total_processing_time = (datetime.utcnow() - start_time).total_seconds()
+    logger.info(f"Analysis complete in {total_processing_time:.2f}s. Saved to {output_key}")
+    metrics.count('SBOMsAnalyzed')
+    if total_processing_time > 0:
+        metrics.sample('ComponentsPerSecond', analysis_results["components_analyzed"] / total_processing_time,
+                       'Count/Second')
+    # The stored report carries the stages up to the analysis; the response includes the writes too
+    analysis_results["metadata"]["stages"] = metrics.breakdown()
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'SBOM analysis complete',
+            'bucket': bucket,
+            'input_key': key,
+            'output_key': output_key,
+            'output': output_stats,
+            'processing_time_seconds': total_processing_time,
+            'summary': analysis_results["summary"],
+            'cache': analysis_results["metadata"]["cache"],
+            'metadata': analysis_results["metadata"]
+        }, default=str)
+    }
+
+def extract_s3_targets(record: Dict) -> List[Tuple[str, str]]:
+    """Return the (bucket, key) pairs referenced by an S3 event record or an SQS message wrapping S3 events."""
+    if 's3' in record:
+        return [(record['s3']['bucket']['name'], urllib.parse.unquote_plus(record['s3']['object']['key']))]
+    if record.get('eventSource') == 'aws:sqs':
+        message = json.loads(record.get('body') or '{}')
+        # S3 -> SNS -> SQS deliveries wrap the notification in an SNS envelope
+        if isinstance(message.get('Message'), str):
+            message = json.loads(message['Message'])
+        # s3:TestEvent messages carry no records and are acknowledged as-is
+        return [target for inner in message.get('Records', []) for target in extract_s3_targets(inner)]
+    raise ValueError("S3 record format not recognized")
+
+def process_records(records: List[Dict], context) -> Dict:
+    """
+    Process every record of an S3 or SQS event batch, sharing one CVE cache and HTTP pool.
+    Records that fail with a retryable (5xx) error are listed in batchItemFailures so that
+    only they are redelivered; malformed records and non-SBOM objects are not retried.
+    """
+    cve_cache = default_cve_cache()
+    results = []
+    batch_item_failures = []
+    work_items = []
+
+    for index, record in enumerate(records):
+        item_identifier = record.get('messageId') or str(index)
+        try:
+            targets = extract_s3_targets(record)
+        except (ValueError, KeyError, TypeError, json.JSONDecodeError) as e:
+            logger.error(f"Skipping malformed record {item_identifier}: {str(e)}")
+            results.append({'itemIdentifier': item_identifier, 'statusCode': 400, 'error': str(e)})
+            continue
+        work_items.extend((item_identifier, bucket, key) for bucket, key in targets)
+
+    def process_target(target: Tuple[str, str]) -> Dict:
+        bucket, key = target
+        try:
+            return process_sbom_object(bucket, key, context, cve_cache=cve_cache)
+        except Exception as e:
+            logger.error(f"Error processing s3://{bucket}/{key}: {str(e)}")
+            return {'statusCode': 500, 'body': json.dumps({'error': str(e)})}
+
+    # Duplicate deliveries of the same object within a batch are analyzed once; run concurrently,
+    # their analyses would race on the same output key and DynamoDB row
+    targets = list(dict.fromkeys((bucket, key) for _, bucket, key in work_items))
+    workers = max(1, min(RECORD_CONCURRENCY, len(targets)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        target_responses = dict(zip(targets, executor.map(process_target, targets)))
+
+    for item_identifier, bucket, key in work_items:
+        response = target_responses[(bucket, key)]
+        results.append({
+            'itemIdentifier': item_identifier,
+            'bucket': bucket,
+            'key': key,
+            'statusCode': response['statusCode'],
+            'body': json.loads(response['body'])
+        })
+        if response['statusCode'] >= 500 and {'itemIdentifier': item_identifier} not in batch_item_failures:
+            batch_item_failures.append({'itemIdentifier': item_identifier})
+
+    logger.info(f"Processed {len(work_items)} SBOM(s) from {len(records)} record(s); "
+                f"{len(batch_item_failures)} record(s) failed")
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Batch processing complete',
+            'records': len(records),
+            'failed_records': len(batch_item_failures),
+            'results': results
+        }, default=str),
+        'batchItemFailures': batch_item_failures
+    }
+
+RESCAN_STATE_KEY = {'sbom_id': 'sync#cve-rescan'}
+
+def _nvd_timestamp(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def _parse_utc_timestamp(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp into naive UTC; one without an offset is taken as UTC."""
+    if not isinstance(value, str):
+        raise TypeError(f"Expected a string, got {type(value).__name__}")
+    moment = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith(('Z', 'z')) else value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def fetch_cve_deltas(start: datetime, end: datetime, feed_path: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Yield vulnerability rows (one per CVE and affected package, as stored in the
+    offline index) for CVEs modified between start and end. Reads a local NVD/OSV
+    feed when feed_path is set, otherwise pages through the NVD API's lastModified window.
+    """
+    if feed_path:
+        since = start.isoformat()[:19]
+        for source, record in iter_feed_records(feed_path):
+            parse = parse_nvd_vulnerability if source == 'nvd' else parse_osv_record
+            cve_id, last_modified, rows = parse(record)
+            if not last_modified or last_modified[:19] >= since:
+                yield from rows
+        return
+
+    params = {
+        'lastModStartDate': _nvd_timestamp(start),
+        'lastModEndDate': _nvd_timestamp(end),
+        'resultsPerPage': NVD_RESULTS_PER_PAGE,
+        'startIndex': 0
+    }
+    while True:
+        data = request_nvd_cves(params)
+        vulnerabilities = data.get('vulnerabilities', [])
+        for vulnerability in vulnerabilities:
+            yield from parse_nvd_vulnerability(vulnerability)[2]
+        params['startIndex'] += len(vulnerabilities)
+        if not vulnerabilities or params['startIndex'] >= data.get('totalResults', 0):
+            return
+
+def find_rescan_targets(rows: Iterable[Dict]) -> Tuple[Dict[str, Dict], Set[Tuple[str, str, str]]]:
+    """
+    Map CVE rows to indexed SBOMs through the component index. Returns
+    {sbom_id: {'source_key', 'cve_ids'}} for SBOMs with a component version inside
+    an affected range, and the (name, version, ecosystem) CVE lookups those components use.
+    """
+    rows_by_product = {}
+    for row in rows:
+        rows_by_product.setdefault(row['package'], []).append(row)
+
+    index = ComponentIndex(DynamoDBTable(COMPONENT_INDEX_TABLE))
+    targets, lookup_keys = {}, set()
+    for product, product_rows in rows_by_product.items():
+        items_by_ecosystem = {}
+        for item in index.find_product(product):
+            if item.get('version'):
+                items_by_ecosystem.setdefault(get_component_ecosystem(item.get('purl', '')), []).append(item)
+
+        for ecosystem, items in items_by_ecosystem.items():
+            candidates = [row for row in product_rows if row['ecosystem'] in (ecosystem, ANY_ECOSYSTEM)]
+            if ecosystem == 'other' or not candidates:
+                continue
+            # One range index per package matches every indexed version in a single pass
+            matched = VersionRangeIndex(candidates).match(sorted({item['version'] for item in items}))
+            for item in items:
+                cves = matched[item['version']]
+                if not cves:
+                    continue
+                target = targets.setdefault(item['sbom_id'], {'source_key': item.get('source_key', ''), 'cve_ids': set()})
+                target['cve_ids'].update(cve['cve_id'] for cve in cves)
+                name = package_lookup_name(ecosystem, item.get('purl', ''), item.get('name') or product)
+                lookup_keys.add((name, item['version'], ecosystem))
+    return targets, lookup_keys
+
+def run_cve_rescan(event: Dict, context) -> Dict:
+    """
+    Scheduled re-scan: fetch CVEs modified since the last run, find the SBOMs whose
+    indexed components they affect and re-analyze only those, writing fresh reports
+    and summaries. The sync watermark advances only when every re-analysis succeeded,
+    so failed SBOMs are picked up again by the next run.
+    """
+    request = event.get('cve_rescan') or {}
+    if not COMPONENT_INDEX_TABLE:
+        logger.error("CVE re-scan needs the component index (COMPONENT_INDEX_TABLE)")
+        return {'statusCode': 400, 'body': json.dumps('Component index is not enabled')}
+
+    window_end = datetime.utcnow()
+    window_start = None
+    if request.get('since'):
+        try:
+            window_start = _parse_utc_timestamp(request['since'])
+        except (TypeError, ValueError):
+            return {'statusCode': 400, 'body': json.dumps({
+                'error': f"Invalid 'since' {request['since']!r}: expected an ISO 8601 timestamp "
+                         f"such as 2024-01-31T00:00:00Z"})}
+        if window_start > window_end:
+            return {'statusCode': 400, 'body': json.dumps({'error': f"'since' {request['since']} is in the future"})}
+
+    table = DynamoDBTable(DDB_TABLE_NAME)
+    state = table.get_item(Key=RESCAN_STATE_KEY).get('Item') or {}
+    if window_start is None and state.get('window_end'):
+        window_start = datetime.fromisoformat(state['window_end'])
+    elif window_start is None:
+        window_start = window_end - timedelta(hours=CVE_RESCAN_LOOKBACK_HOURS)
+    feed_path = request.get('feed') or CVE_RESCAN_FEED_PATH
+    if not feed_path:
+        # Longer gaps are caught up over successive runs
+        window_end = min(window_end, window_start + timedelta(days=NVD_MAX_DATE_RANGE_DAYS))
+
+    try:
+        rows = list(fetch_cve_deltas(window_start, window_end, feed_path))
+    except (CVELookupError, OSError, ValueError) as e:
+        logger.error(f"Failed to fetch CVE changes since {window_start.isoformat()}: {str(e)}")
+        return {'statusCode': 502, 'body': json.dumps({'error': f'CVE delta fetch failed: {str(e)}'})}
+    targets, lookup_keys = find_rescan_targets(rows)
+    logger.info(f"{len({row['cve_id'] for row in rows})} CVEs modified since {window_start.isoformat()} "
+                f"affect {len(targets)} indexed SBOM(s)")
+
+    # Cached lookups of the affected packages predate the new CVEs
+    cve_cache = default_cve_cache()
+    if cve_cache:
+        try:
+            cve_cache.invalidate(lookup_keys)
+        except Exception as e:
+            # The stale entries still expire with their TTL; until then this run must not read them
+            logger.warning(f"CVE cache invalidation failed, re-scanning without the cache: {str(e)}")
+            cve_cache = None
+    clear_memo_caches()
+
+    def rescore(item: Tuple[str, Dict]) -> Dict:
+        sbom_id, target = item
+        rescan = {
+            'window_start': window_start.isoformat(),
+            'window_end': window_end.isoformat(),
+            'cve_ids': sorted(target['cve_ids'])
+        }
+        try:
+            response = process_sbom_object(S3_BUCKET_NAME, target['source_key'], context,
+                                           cve_cache=cve_cache, rescan=rescan)
+        except Exception as e:
+            logger.error(f"Re-scan of {sbom_id} failed: {str(e)}")
+            response = {'statusCode': 500, 'body': json.dumps({'error': str(e)})}
+        body = json.loads(response['body'])
+        return {
+            'sbom_id': sbom_id,
+            'source_key': target['source_key'],
+            'cve_ids': rescan['cve_ids'],
+            'statusCode': response['statusCode'],
+            'output_key': body.get('output_key') if isinstance(body, dict) else None,
+            'summary': body.get('summary') if isinstance(body, dict) else None
+        }
+
+    work_items = sorted(targets.items())
+    workers = max(1, min(RECORD_CONCURRENCY, len(work_items)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(rescore, work_items))
+    failed = [result['sbom_id'] for result in results if result['statusCode'] >= 500]
+
+    if not failed:
+        table.put_item(Item={
+            **RESCAN_STATE_KEY,
+            'record_type': 'sync_state',
+            'timestamp': datetime.utcnow().isoformat(),
+            'window_start': window_start.isoformat(),
+            'window_end': window_end.isoformat(),
+            'sboms_rescanned': len(results)
+        })
+
+    logger.info(f"Re-scanned {len(results)} SBOM(s); {len(failed)} failed")
+    return {
+        'statusCode': 500 if failed else 200,
+        'body': json.dumps({
+            'message': 'CVE re-scan complete',
+            'window_start': window_start.isoformat(),
+            'window_end': window_end.isoformat(),
+            'source': feed_path or 'nvd',
+            'cves_modified': len({row['cve_id'] for row in rows}),
+            'affected_packages': len(lookup_keys),
+            'sboms_rescanned': len(results),
+            'failed': failed,
+            'results': results
+        }, default=str)
+    }
+
+def emit_invocation_metrics() -> Optional[Dict]:
+    """
+    Print the invocation's metrics as one CloudWatch Embedded Metric Format log line
+    and start over. Returns the EMF document, or None if disabled or nothing was recorded.
+    """
+    try:
+        if not METRICS_ENABLED or invocation_metrics.is_empty():
+            return None
+        derived = {
+            'CVECacheHitRate': (invocation_metrics.ratio('CVECacheHits', 'CVECacheHits', 'CVECacheMisses'), 'Percent'),
+            'NVDErrorRate': (invocation_metrics.ratio('NVDErrors', 'NVDRequests'), 'Percent')
+        }
+        dimensions = {'FunctionName': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')}
+        document = invocation_metrics.to_emf(METRICS_NAMESPACE, dimensions, derived)
+        # EMF has to be the entire log line, so it bypasses the logger's prefix
+        print(json.dumps(document, default=str), flush=True)
+        return document
+    finally:
+        invocation_metrics.reset()
+
 def lambda_handler(event, context):
     """Enhanced Lambda handler with better error handling and validation."""
     start_time = datetime.utcnow()
@@ -550,6 +2201,15 @@ def lambda_handler(event, context):
         if 'httpMethod' in event or ('requestContext' in event and 'http' in event['requestContext']):
             is_api_gateway_request = True
             logger.info("Processing API Gateway request")
+
+            http_method = event.get('httpMethod') or event.get('requestContext', {}).get('http', {}).get('method')
+            if http_method == 'GET':
+                path = event.get('path') or event.get('rawPath') or ''
+                if path.rstrip('/').endswith('/components'):
+                    return query_component_index(event)
+                # Poll an async analysis job: GET /jobs/{job_id}
+                job_id = (event.get('pathParameters') or {}).get('job_id') or path.rstrip('/').split('/')[-1]
+                return get_analysis_job(job_id)
             
             # Parse request body
             try:
@@ -588,15 +2248,26 @@ def lambda_handler(event, context):
                     'body': json.dumps({'error': f'Invalid JSON in request body: {str(e)}'})
                 }
         
+        elif 'analysis_job' in event:
+            # Asynchronous self-invocation started by submit_analysis_job
+            return run_analysis_job(event['analysis_job'], context)
         elif 'Records' in event and len(event['Records']) > 0:
-            # S3 event trigger
-            record = event['Records'][0]
+            records = event['Records']
+            if len(records) > 1 or records[0].get('eventSource') == 'aws:sqs':
+                # S3/SQS batch: process every record and report partial failures
+                return process_records(records, context)
+
+            # Single S3 event trigger
+            record = records[0]
             if 's3' in record:
                 bucket = record['s3']['bucket']['name']
                 key = urllib.parse.unquote_plus(record['s3']['object']['key'])
             else:
                 logger.error("S3 record format not recognized")
                 return {'statusCode': 400, 'body': json.dumps('Invalid S3 event format')}
+        elif 'cve_rescan' in event or event.get('detail-type') == 'Scheduled Event':
+            # Scheduled re-evaluation of indexed SBOMs against newly modified CVEs
+            return run_cve_rescan(event, context)
         elif 'detail' in event:
             # EventBridge trigger
             if 'bucket' in event['detail'] and 'object' in event['detail']:
@@ -616,7 +2287,19 @@ def lambda_handler(event, context):
         # Handle API Gateway request (direct SBOM analysis)
         if is_api_gateway_request:
             # Validate SBOM format
-            if 'components' not in sbom_data:
+            try:
+                sbom_document = load_request_sbom(sbom_data)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Headers': 'Content-Type',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS'
+                    },
+                    'body': json.dumps({'error': f'Invalid SBOM: {str(e)}'})
+                }
+            if not isinstance(sbom_document, dict) or 'components' not in sbom_document:
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -627,9 +2310,12 @@ def lambda_handler(event, context):
                     'body': json.dumps({'error': 'Invalid SBOM format: missing components field'})
                 }
 
+            if is_async_request(event, body):
+                return submit_analysis_job(sbom_data, context)
+
             # Perform analysis
             logger.info("Starting OFAC analysis via API Gateway...")
-            analysis_results = analyze_ofac(sbom_data)
+            analysis_results = analyze_ofac(sbom_document, cve_cache=default_cve_cache())
 
             # Enhanced metadata for API Gateway requests
             analysis_results["metadata"] = {
@@ -637,7 +2323,8 @@ def lambda_handler(event, context):
                 "analysis_time_utc": datetime.utcnow().isoformat(),
                 "processing_time_seconds": (datetime.utcnow() - start_time).total_seconds(),
                 "lambda_version": "v2.0.0",
-                "lambda_request_id": context.aws_request_id if context else "unknown"
+                "lambda_request_id": context.aws_request_id if context else "unknown",
+                **analysis_results.get("metadata", {})
             }
 
             # Return results directly for API Gateway
@@ -655,113 +2342,7 @@ def lambda_handler(event, context):
             }
 
         # Handle S3-based processing
-        # Validate inputs
-        if not bucket or not key:
-            logger.error("Missing bucket or key in event")
-            return {'statusCode': 400, 'body': json.dumps('Missing bucket or key')}
-
-        # Validate file format
-        if not key.startswith('sboms/') or not key.endswith('.json'):
-            logger.info(f"Skipping non-SBOM file: {key}")
-            return {'statusCode': 200, 'body': json.dumps('Not a SBOM file, skipping')}
-
-        logger.info(f"Processing SBOM from s3://{bucket}/{key}")
-
-        # Enhanced S3 object retrieval with validation
-        try:
-            response = s3_client.get_object(Bucket=bucket, Key=key)
-            content_length = response.get('ContentLength', 0)
-            
-            # Check file size (max 10MB for Lambda)
-            if content_length > 10 * 1024 * 1024:
-                logger.error(f"File too large: {content_length} bytes")
-                return {'statusCode': 413, 'body': json.dumps('File too large')}
-            
-            sbom_content = response['Body'].read().decode('utf-8')
-            sbom_data = json.loads(sbom_content)
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON format: {str(e)}")
-            return {'statusCode': 400, 'body': json.dumps(f'Invalid JSON: {str(e)}')}
-        except Exception as e:
-            logger.error(f"Error reading S3 object: {str(e)}")
-            return {'statusCode': 500, 'body': json.dumps(f'S3 read error: {str(e)}')}
-
-        # Validate SBOM format
-        if 'components' not in sbom_data:
-            logger.error("Invalid SBOM format: missing 'components' field")
-            return {'statusCode': 400, 'body': json.dumps('Invalid SBOM format')}
-
-        # Perform analysis
-        logger.info("Starting OFAC analysis...")
-        analysis_results = analyze_ofac(sbom_data)
-
-        # Enhanced metadata
-        file_name = key.split('/')[-1]
-        analysis_results["metadata"] = {
-            "source_file": key,
-            "source_bucket": bucket,
-            "file_size_bytes": content_length,
-            "analysis_time_utc": datetime.utcnow().isoformat(),
-            "processing_time_seconds": (datetime.utcnow() - start_time).total_seconds(),
-            "lambda_version": "v2.0.0",
-            "lambda_request_id": context.aws_request_id if context else "unknown"
-        }
-
-        # Save results to S3 with enhanced naming
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        output_key = f"analysis/{file_name.replace('.json', f'_analysis_{timestamp}.json')}"
-        
-        try:
-            s3_client.put_object(
-                Bucket=bucket,
-                Key=output_key,
-                Body=json.dumps(analysis_results, indent=2, default=str),
-                ContentType='application/json',
-                Metadata={
-                    'analysis-version': 'v2.0.0',
-                    'source-file': file_name,
-                    'risk-level': analysis_results["summary"]["risk_level"]
-                }
-            )
-        except Exception as e:
-            logger.error(f"Error saving analysis to S3: {str(e)}")
-            return {'statusCode': 500, 'body': json.dumps(f'S3 write error: {str(e)}')}
-
-        # Enhanced DynamoDB logging with error handling
-        try:
-            table = dynamodb.Table(DDB_TABLE_NAME)
-            ddb_item = {
-                'sbom_id': str(file_name),
-                'timestamp': datetime.utcnow().isoformat(),
-                'bucket': bucket,
-                'source_key': key,
-                'output_key': output_key,
-                'summary': analysis_results["summary"],
-                'processing_time_seconds': analysis_results["metadata"]["processing_time_seconds"],
-                'lambda_request_id': analysis_results["metadata"]["lambda_request_id"]
-            }
-            table.put_item(Item=ddb_item)
-            logger.info("Successfully logged to DynamoDB")
-        except Exception as ddb_err:
-            logger.warning(f"DynamoDB insert failed: {str(ddb_err)}")
-            # Don't fail the entire process for DynamoDB issues
-
-        total_processing_time = (datetime.utcnow() - start_time).total_seconds()
-        logger.info(f"Analysis complete in {total_processing_time:.2f}s. Saved to {output_key}")
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'SBOM analysis complete',
-                'bucket': bucket,
-                'input_key': key,
-                'output_key': output_key,
-                'processing_time_seconds': total_processing_time,
-                'summary': analysis_results["summary"],
-                'metadata': analysis_results["metadata"]
-            }, default=str)
-        }
+        return process_sbom_object(bucket, key, context, cve_cache=default_cve_cache())
 
     except Exception as e:
         total_processing_time = (datetime.utcnow() - start_time).total_seconds()
@@ -777,4 +2358,6 @@ def lambda_handler(event, context):
                 'processing_time_seconds': total_processing_time,
                 'request_id': context.aws_request_id if context else "unknown"
             })
-        }
\ No newline at end of file
+        }
+    finally:
+        emit_invocation_metrics()
\ No newline at end of file
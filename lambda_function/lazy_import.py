@@ -0,0 +1,40 @@
+"""
+Deferred module imports for a faster Lambda cold start.
+
+    requests = LazyModule('requests')
+
+binds a proxy at import time; the real module is imported on first attribute
+access. Code paths that never touch the module (e.g. API requests answered
+from DynamoDB) never pay for importing it. Unlike importlib.util.LazyLoader on
+Python 3.9, the first access is safe from concurrent threads.
+"""
+import importlib
+import threading
+from types import ModuleType
+
+class LazyModule:
+    """Proxy for a module that is imported when one of its attributes is first used."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attribute: str):
+        if attribute in ('_name', '_module', '_lock'):
+            raise AttributeError(attribute)  # Not yet initialized, e.g. while copying
+        return getattr(self.load(), attribute)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{' (loaded)' if self.loaded else ''}>"
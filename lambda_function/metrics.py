@@ -0,0 +1,130 @@
+"""
+Stage timers and counters, published as CloudWatch Embedded Metric Format.
+
+    metrics = Metrics()
+    with metrics.stage('s3_read'):
+        ...
+    metrics.count('NVDRequests')
+    metrics.sample('NVDRequestLatency', 182.0, 'Milliseconds')
+    print(json.dumps(metrics.to_emf('ErasmusSBOMAnalyzer', {'FunctionName': 'analyzer'})))
+
+A JSON log line in EMF is turned into CloudWatch metrics by the Lambda log
+pipeline, so publishing costs no PutMetricData calls. Stages become
+"Stage.<name>" metrics in milliseconds.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAX_EMF_METRICS = 100  # Metric definitions per EMF directive
+MAX_EMF_VALUES = 100  # Values per metric in one EMF document
+
+class Metrics:
+    """Thread-safe accumulator of stage durations, counters and sampled values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = {}  # name -> [total seconds, calls]
+        self.counters: Dict[str, float] = {}
+        self.samples: Dict[str, Tuple[str, List[float]]] = {}  # name -> (unit, values)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            totals = self.stages.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+
+    def timed_iter(self, items: Iterable, name: str) -> Iterator:
+        """Yield from items, charging the time spent producing each item to stage name."""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_stage(name, time.perf_counter() - start, 0)
+                return
+            self.add_stage(name, time.perf_counter() - start)
+            yield item
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def sample(self, name: str, value: float, unit: str) -> None:
+        with self._lock:
+            self.samples.setdefault(name, (unit, []))[1].append(value)
+
+    def merge(self, other: 'Metrics') -> None:
+        with other._lock:
+            stages = {name: list(totals) for name, totals in other.stages.items()}
+            counters = dict(other.counters)
+            samples = {name: (unit, list(values)) for name, (unit, values) in other.samples.items()}
+        for name, (seconds, calls) in stages.items():
+            self.add_stage(name, seconds, calls)
+        for name, value in counters.items():
+            self.count(name, value)
+        for name, (unit, values) in samples.items():
+            for value in values:
+                self.sample(name, value, unit)
+
+    def breakdown(self) -> Dict[str, Dict]:
+        """Per-stage totals for analysis metadata."""
+        with self._lock:
+            return {name: {'seconds': round(seconds, 6), 'calls': calls}
+                    for name, (seconds, calls) in self.stages.items()}
+
+    def ratio(self, numerator: str, *denominator: str) -> Optional[float]:
+        """Percentage of counter numerator over the sum of the denominator counters (None if zero)."""
+        with self._lock:
+            total = sum(self.counters.get(name, 0) for name in denominator)
+            return round(100.0 * self.counters.get(numerator, 0) / total, 2) if total else None
+
+    def to_emf(self, namespace: str, dimensions: Dict[str, str],
+               derived: Optional[Dict[str, Tuple[float, str]]] = None) -> Dict:
+        """One EMF document holding every stage, counter, sample and derived metric."""
+        values: Dict[str, Tuple[str, object]] = {}
+        with self._lock:
+            for name, (seconds, _) in self.stages.items():
+                values[f"Stage.{name}"] = ('Milliseconds', round(seconds * 1000, 3))
+            for name, value in self.counters.items():
+                values[name] = ('Count', value)
+            for name, (unit, samples) in self.samples.items():
+                values[name] = (unit, [round(value, 3) for value in samples[:MAX_EMF_VALUES]])
+        for name, (value, unit) in (derived or {}).items():
+            if value is not None:
+                values[name] = (unit, value)
+
+        names = list(values)[:MAX_EMF_METRICS]
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [list(dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': values[name][0]} for name in names]
+                }]
+            },
+            **dimensions
+        }
+        document.update((name, values[name][1]) for name in names)
+        return document
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return not (self.stages or self.counters or self.samples)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.samples.clear()
@@ -0,0 +1,76 @@
+"""
+Bounded top-K selection for analysis reports.
+
+Reports list the most severe CVEs, components and risks. TopK keeps only the k
+best items seen so far in a min-heap, so ranking n items costs O(n log k) time
+and O(k) memory instead of sorting (or holding) all of them.
+"""
+import heapq
+import itertools
+from typing import Callable, Dict, Generic, Iterable, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+class TopK(Generic[T]):
+    """The k items with the largest key; among equal keys the earliest pushed wins."""
+
+    def __init__(self, k: int, key: Callable[[T], object]):
+        self.k = k
+        self.key = key
+        self.seen = 0
+        self._heap = []
+        self._order = itertools.count()
+
+    def push(self, item: T) -> None:
+        self.seen += 1
+        if self.k <= 0:
+            return
+        # The negated sequence number makes earlier items rank higher on ties and keeps items uncompared
+        entry = (self.key(item), -next(self._order), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, items: Iterable[T]) -> None:
+        for item in items:
+            self.push(item)
+
+    def items(self) -> List[T]:
+        """Kept items, best first."""
+        return [entry[2] for entry in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+def vulnerability_rank(component: Dict) -> Tuple:
+    """Ranking key for vulnerable components: worst CVSS, then critical, high and total CVE counts."""
+    return (component['highest_cvss'], component['critical_count'], component['high_count'], component['cve_count'])
+
+def aggregate_component_cves(name: str, version: str, ecosystem: str, component_cves: List[Dict],
+                             critical_cves: List[Dict], high_cves: List[Dict]) -> Dict:
+    """
+    Single pass over one component's CVEs: append its critical and high report
+    entries and return its vulnerable-component record.
+    """
+    highest = component_cves[0]['cvss_score']
+    critical_count = high_count = 0
+    for cve in component_cves:
+        if cve['cvss_score'] > highest:
+            highest = cve['cvss_score']
+        severity = cve['severity']
+        if severity == 'CRITICAL':
+            critical_count += 1
+            critical_cves.append({"component": name, "version": version, "ecosystem": ecosystem, **cve})
+        elif severity == 'HIGH':
+            high_count += 1
+            high_cves.append({"component": name, "version": version, "ecosystem": ecosystem, **cve})
+    return {
+        'name': name,
+        'version': version,
+        'ecosystem': ecosystem,
+        'cve_count': len(component_cves),
+        'highest_cvss': highest,
+        'critical_count': critical_count,
+        'high_count': high_count
+    }
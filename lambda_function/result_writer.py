@@ -0,0 +1,211 @@
+"""
+Streaming writers for analysis results stored in S3.
+
+Results are serialized incrementally (JSON via JSONEncoder.iterencode, or one
+NDJSON line per record), optionally compressed, and uploaded with S3 multipart
+upload, so the full serialized report never exists as a single string.
+"""
+import json
+import logging
+import zlib
+from typing import Dict, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, only needed for zstd output
+    zstandard = None
+
+logger = logging.getLogger()
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part except the last
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+WRITE_BUFFER_SIZE = 256 * 1024  # Batch small encoder fragments before compressing
+CONTENT_ENCODINGS = ('none', 'gzip', 'zstd')
+
+# Large lists written one line each in NDJSON output
+NDJSON_RECORD_LISTS = (
+    ('ofac_risk', ('ofac_risks',)),
+    ('critical_cve', ('cve_analysis', 'critical_cves')),
+    ('high_cve', ('cve_analysis', 'high_cves')),
+)
+
+def resolve_content_encoding(encoding: Optional[str]) -> Optional[str]:
+    """Normalize a configured encoding name, falling back to gzip when zstandard is unavailable."""
+    encoding = (encoding or 'none').lower()
+    if encoding not in CONTENT_ENCODINGS:
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+    if encoding == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed; writing gzip output instead")
+        encoding = 'gzip'
+    return None if encoding == 'none' else encoding
+
+class S3MultipartWriter:
+    """
+    File-like writer that uploads to S3 in parts as data arrives. Objects that
+    fit in a single part are sent with one put_object call instead. Use as a
+    context manager: the upload is completed on exit, or aborted on error.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, content_type: str = 'application/json',
+                 content_encoding: Optional[str] = None, metadata: Optional[Dict[str, str]] = None,
+                 part_size: int = DEFAULT_PART_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.content_encoding = resolve_content_encoding(content_encoding)
+        self.object_args = {'ContentType': content_type, 'Metadata': metadata or {}}
+        if self.content_encoding:
+            self.object_args['ContentEncoding'] = self.content_encoding
+
+        if self.content_encoding == 'gzip':
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif self.content_encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor().compressobj()
+        else:
+            self._compressor = None
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.parts_uploaded = 0
+        self._pending = []
+        self._pending_size = 0
+        self._part = bytearray()
+        self._parts = []
+        self._upload_id = None
+        self._closed = False
+
+    def write(self, data) -> None:
+        """Queue text or bytes for upload."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._pending.append(data)
+        self._pending_size += len(data)
+        self.bytes_in += len(data)
+        if self._pending_size >= WRITE_BUFFER_SIZE:
+            self._drain()
+
+    def _drain(self, final: bool = False) -> None:
+        data = b''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        if self._compressor:
+            data = self._compressor.compress(data)
+            if final:
+                data += self._compressor.flush()
+        self._part += data
+        while len(self._part) >= self.part_size:
+            self._upload_part(bytes(self._part[:self.part_size]))
+            del self._part[:self.part_size]
+
+    def _upload_part(self, body: bytes) -> None:
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.object_args)
+            self._upload_id = response['UploadId']
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                              PartNumber=part_number, Body=body)
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self.parts_uploaded += 1
+        self.bytes_out += len(body)
+
+    def close(self) -> None:
+        """Flush remaining data and finish the upload."""
+        if self._closed:
+            return
+        self._closed = True
+        self._drain(final=True)
+        body = bytes(self._part)
+        self._part = bytearray()
+        if self._upload_id is None:
+            self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=body, **self.object_args)
+            self.bytes_out += len(body)
+            return
+        if body:
+            self._upload_part(body)
+        self.s3_client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                                 MultipartUpload={'Parts': self._parts})
+
+    def abort(self) -> None:
+        """Discard the upload so no incomplete parts are left behind."""
+        self._closed = True
+        if self._upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                logger.warning(f"Failed to abort multipart upload for {self.key}: {str(e)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return False
+        try:
+            self.close()
+        except Exception:
+            self.abort()
+            raise
+        return False
+
+def write_json(writer, results: Dict, pretty: bool = True) -> None:
+    """Serialize results as one JSON document without building the whole string."""
+    if pretty:
+        encoder = json.JSONEncoder(indent=2, default=str)
+    else:
+        encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+    for fragment in encoder.iterencode(results):
+        writer.write(fragment)
+
+def iter_ndjson_records(results: Dict) -> Iterable[Dict]:
+    """
+    Split results into NDJSON records: one "analysis" record with everything
+    except the large per-component lists, then one record per list entry.
+    """
+    header = dict(results)
+    if 'cve_analysis' in header:
+        header['cve_analysis'] = dict(header['cve_analysis'])
+    for _, path in NDJSON_RECORD_LISTS:
+        parent = header
+        for part in path[:-1]:
+            parent = parent.get(part, {})
+        parent.pop(path[-1], None)
+    yield {'record_type': 'analysis', **header}
+
+    for record_type, path in NDJSON_RECORD_LISTS:
+        entries = results
+        for part in path:
+            entries = entries.get(part, {})
+        for entry in entries or []:
+            yield {'record_type': record_type, **entry}
+
+def write_ndjson(writer, results: Dict) -> None:
+    """Serialize results as newline-delimited JSON records."""
+    encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+    for record in iter_ndjson_records(results):
+        writer.write(encoder.encode(record))
+        writer.write('\n')
+
+def upload_analysis(s3_client, bucket: str, key: str, results: Dict, output_format: str = 'json',
+                    pretty: bool = True, content_encoding: Optional[str] = None,
+                    metadata: Optional[Dict[str, str]] = None, part_size: int = DEFAULT_PART_SIZE) -> Dict:
+    """Stream analysis results to s3://bucket/key. Returns upload statistics."""
+    if output_format not in ('json', 'ndjson'):
+        raise ValueError(f"Unsupported output format: {output_format}")
+    content_type = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+
+    with S3MultipartWriter(s3_client, bucket, key, content_type=content_type, content_encoding=content_encoding,
+                           metadata=metadata, part_size=part_size) as writer:
+        if output_format == 'ndjson':
+            write_ndjson(writer, results)
+        else:
+            write_json(writer, results, pretty=pretty)
+
+    return {
+        'format': output_format,
+        'content_encoding': writer.content_encoding or 'identity',
+        'bytes_serialized': writer.bytes_in,
+        'bytes_uploaded': writer.bytes_out,
+        'parts': writer.parts_uploaded
+    }
@@ -0,0 +1,192 @@
+"""
+Versioned sanctions rule bundles for OFAC screening.
+
+A rule bundle is a JSON document kept in S3 (or a local file):
+
+    {
+      "version": "2024-06-01",
+      "keywords": {"tehran": "Iran", "dprk": "North Korea", ...},
+      "domain_countries": {"ir": "Iran", "kp": "North Korea", ...},
+      "risk_weights": {"domain_match": 0.8, "keyword_match": 0.6, ...}
+    }
+
+It is compiled into a SanctionsRuleSet (keyword automaton, TLD table, country
+set). RuleSetLoader keeps the compiled set across warm invocations and only
+re-reads the bundle when its ETag (or a local file's mtime and size) changes.
+Validate a bundle before uploading it:
+
+    python sanctions_rules.py validate rules.json
+"""
+import argparse
+import json
+import logging
+import numbers
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger()
+
+class RuleBundleError(ValueError):
+    """Raised when a rule bundle cannot be read or fails validation."""
+
+class SanctionsRuleSet:
+    """Compiled, immutable sanctions rules for one bundle version."""
+
+    def __init__(self, version: str, keywords: Dict[str, str], domain_countries: Dict[str, str],
+                 risk_weights: Dict[str, float], source: str = 'builtin', etag: Optional[str] = None):
+        self.version = version
+        self.source = source
+        self.etag = etag
+        self.keywords = {keyword.lower(): country for keyword, country in keywords.items()}
+        self.domain_countries = {tld.lower().lstrip('.'): country for tld, country in domain_countries.items()}
+        self.risk_weights = dict(risk_weights)
+        self.country_names = frozenset(self.keywords.values())
+        self.matcher = KeywordMatcher(self.keywords)
+        self.loaded_at = datetime.utcnow().isoformat()
+
+    @classmethod
+    def from_bundle(cls, bundle: Dict, source: str, etag: Optional[str] = None,
+                    defaults: Optional['SanctionsRuleSet'] = None) -> 'SanctionsRuleSet':
+        """Validate a decoded bundle. Risk weights it leaves out are taken from defaults."""
+        if not isinstance(bundle, dict):
+            raise RuleBundleError("Rule bundle must be a JSON object")
+        version = bundle.get('version')
+        if not isinstance(version, (str, int)) or isinstance(version, bool) or str(version) == '':
+            raise RuleBundleError("Rule bundle needs a non-empty 'version'")
+
+        tables = {}
+        for section in ('keywords', 'domain_countries'):
+            table = bundle.get(section)
+            if not isinstance(table, dict) or not table:
+                raise RuleBundleError(f"Rule bundle section '{section}' must be a non-empty object")
+            for pattern, country in table.items():
+                if not pattern or not isinstance(country, str) or not country:
+                    raise RuleBundleError(f"Invalid entry in '{section}': {pattern!r} -> {country!r}")
+            tables[section] = table
+
+        risk_weights = dict(defaults.risk_weights) if defaults else {}
+        overrides = bundle.get('risk_weights') or {}
+        if not isinstance(overrides, dict):
+            raise RuleBundleError("Rule bundle section 'risk_weights' must be an object")
+        for factor, weight in overrides.items():
+            if not isinstance(weight, numbers.Real) or isinstance(weight, bool) or not 0.0 <= weight <= 1.0:
+                raise RuleBundleError(f"Risk weight {factor!r} must be a number between 0 and 1")
+            risk_weights[factor] = float(weight)
+
+        return cls(str(version), tables['keywords'], tables['domain_countries'], risk_weights,
+                   source=source, etag=etag)
+
+    def describe(self) -> Dict:
+        """Rule set provenance for analysis metadata."""
+        return {
+            'version': self.version,
+            'source': self.source,
+            'etag': self.etag,
+            'loaded_at': self.loaded_at,
+            'keywords': len(self.keywords),
+            'domain_countries': len(self.domain_countries)
+        }
+
+class RuleSetLoader:
+    """
+    Serve the compiled rule set for location (s3://bucket/key or a file path),
+    checking for a new version at most every refresh_seconds. An S3 check is a
+    conditional GET on the cached ETag, so an unchanged bundle is neither
+    downloaded nor parsed again. If the bundle cannot be loaded, the last good
+    rule set stays in use, or fallback if none has loaded yet. The S3 client is
+    given directly or as s3_client_factory, called only when an S3 bundle is read.
+    """
+
+    def __init__(self, location: str, fallback: SanctionsRuleSet, s3_client=None, refresh_seconds: float = 60,
+                 on_reload: Optional[Callable[[SanctionsRuleSet], None]] = None,
+                 s3_client_factory: Optional[Callable[[], object]] = None):
+        self.location = location
+        self.fallback = fallback
+        self.s3_client = s3_client
+        self.s3_client_factory = s3_client_factory
+        self.refresh_seconds = refresh_seconds
+        self.on_reload = on_reload
+        self.reloads = 0
+        self._rules = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> SanctionsRuleSet:
+        if not self.location:
+            return self.fallback
+        if self._rules is not None and time.monotonic() < self._next_check:
+            return self._rules
+        with self._lock:
+            now = time.monotonic()
+            if self._rules is None or now >= self._next_check:
+                self._next_check = now + self.refresh_seconds
+                try:
+                    rules = self._load()
+                except Exception as e:
+                    current = self._rules or self.fallback
+                    logger.warning(f"Failed to load sanctions rules from {self.location}; "
+                                   f"keeping version {current.version}: {str(e)}")
+                    self._rules = current
+                else:
+                    if rules is not None:
+                        self._rules = rules
+                        self.reloads += 1
+                        logger.info(f"Loaded sanctions rules version {rules.version} from {self.location}")
+                        if self.on_reload:
+                            self.on_reload(rules)
+        return self._rules
+
+    def _load(self) -> Optional[SanctionsRuleSet]:
+        """Read and compile the bundle, or return None if it has not changed."""
+        current_etag = self._rules.etag if self._rules is not None else None
+        if self.location.startswith('s3://'):
+            bucket, _, key = self.location[len('s3://'):].partition('/')
+            conditions = {'IfNoneMatch': current_etag} if current_etag else {}
+            from botocore.exceptions import ClientError  # Deferred: only S3 bundles need botocore
+            if self.s3_client is None:
+                self.s3_client = self.s3_client_factory()
+            try:
+                response = self.s3_client.get_object(Bucket=bucket, Key=key, **conditions)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+                    return None
+                raise
+            etag = response['ETag']
+            body = response['Body'].read()
+        else:
+            stat = os.stat(self.location)
+            etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+            if etag == current_etag:
+                return None
+            with open(self.location, 'rb') as f:
+                body = f.read()
+
+        try:
+            bundle = json.loads(body)
+        except ValueError as e:
+            raise RuleBundleError(f"Rule bundle is not valid JSON: {str(e)}")
+        return SanctionsRuleSet.from_bundle(bundle, source=self.location, etag=etag, defaults=self.fallback)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Sanctions rule bundle tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    validate = subparsers.add_parser('validate', help='check a rule bundle file')
+    validate.add_argument('bundle')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.bundle, 'rb') as f:
+            rules = SanctionsRuleSet.from_bundle(json.loads(f.read()), source=args.bundle)
+    except (OSError, ValueError) as e:
+        print(f"Invalid rule bundle: {str(e)}")
+        return 1
+    print(json.dumps(rules.describe(), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
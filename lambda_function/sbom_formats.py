@@ -0,0 +1,556 @@
+"""
+SBOM format detection and normalization.
+
+CycloneDX JSON, CycloneDX XML, SPDX JSON and SPDX tag-value documents are
+turned into ComponentRecords, one compact slotted record per component holding
+only what the analysis reads, plus dependencies in the CycloneDX top-level
+form ({"ref": ..., "dependsOn": [...]}). analyze_ofac and the dependency graph
+therefore see a single representation whatever format was uploaded.
+
+Every format can be read incrementally from a byte stream: JSON through
+StreamingSBOMReader, XML through an expat pull parser that drops each component
+element once it has been converted, and tag-value line by line.
+
+CycloneDX components may nest (an image holding OS packages holding
+libraries). walk_components() flattens them iteratively, so nesting depth is
+not bounded by the recursion limit, and each record keeps its ancestry as a
+ParentPath.
+
+SPDX fields map as follows: name, versionInfo and the purl external reference
+as for CycloneDX; the originator's email is the author email and the
+supplier's email the maintainer email; DEPENDS_ON and *DEPENDENCY_OF
+relationships become dependencies. SPDX has no origin field, and SPDX RDF/XML
+is not supported.
+"""
+import codecs
+import io
+import json
+import re
+import xml.etree.ElementTree as ElementTree
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sbom_stream import DEFAULT_CHUNK_SIZE, StreamingSBOMReader
+
+CYCLONEDX_JSON = 'cyclonedx-json'
+CYCLONEDX_XML = 'cyclonedx-xml'
+SPDX_JSON = 'spdx-json'
+SPDX_TAG_VALUE = 'spdx-tag-value'
+
+SNIFF_BYTES = 64 * 1024  # Head of the document inspected by detect_format()
+MAX_REPORTED_PARENTS = 10  # Innermost ancestors listed by ParentPath.refs()
+SPDX_NO_VALUE = ('NOASSERTION', 'NONE')
+SPDX_DEPENDENCY_OF = {'DEPENDENCY_OF', 'BUILD_DEPENDENCY_OF', 'DEV_DEPENDENCY_OF', 'OPTIONAL_DEPENDENCY_OF',
+                      'PROVIDED_DEPENDENCY_OF', 'RUNTIME_DEPENDENCY_OF', 'TEST_DEPENDENCY_OF'}
+SPDX_SECTION_TAGS = ('FileName', 'SnippetSPDXID', 'LicenseID')  # Tags that end a tag-value package section
+
+_SPDX_EMAIL = re.compile(r'\(\s*([^()\s]+@[^()\s]+)\s*\)')
+_SPDX_TAG_VALUE_HEAD = re.compile(rb'^\s*SPDXVersion\s*:', re.MULTILINE)
+_RECORD_KEYS = {'bom-ref': 'bom_ref'}
+# Top-level keys only one of the JSON formats uses
+_SPDX_JSON_KEYS = (b'"SPDXID"', b'"creationInfo"', b'"documentNamespace"', b'"hasExtractedLicensingInfos"')
+_CYCLONEDX_JSON_KEYS = (b'"bomFormat"', b'"specVersion"', b'"components"', b'"serialNumber"')
+_END = object()
+
+class SBOMFormatError(ValueError):
+    """The document is not a supported SBOM or is malformed in a format-specific way."""
+
+class ParentPath:
+    """
+    Ancestry of a nested component as a linked list of refs, innermost first.
+    Siblings share one node, so a deep chain costs one node per level.
+    """
+
+    __slots__ = ('ref', 'parent', 'depth')
+
+    def __init__(self, ref: str, parent: Optional['ParentPath'] = None):
+        self.ref = ref
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 1
+
+    def refs(self, limit: Optional[int] = MAX_REPORTED_PARENTS) -> List[str]:
+        """Refs of the innermost limit ancestors (all if None), outermost first."""
+        refs = []
+        node = self
+        while node is not None and (limit is None or len(refs) < limit):
+            refs.append(node.ref)
+            node = node.parent
+        refs.reverse()
+        return refs
+
+    def __repr__(self) -> str:
+        return f"ParentPath({' > '.join(self.refs())})"
+
+class ComponentRecord:
+    """
+    One component, normalized. name, version and purl default to ''. origins
+    holds every origin property in document order; dependencies the refs of a
+    legacy per-component dependency list, or None; parent the ParentPath of a
+    nested component, or None at the top level.
+
+    get() answers the CycloneDX component keys ('bom-ref', 'purl', ...), so a
+    record can stand in for a component dict (component_ref, DependencyGraph).
+    """
+
+    __slots__ = ('name', 'version', 'purl', 'bom_ref', 'author_email', 'maintainer_email', 'origins',
+                 'dependencies', 'parent')
+
+    def __init__(self, name: str = '', version: str = '', purl: str = '', bom_ref: Optional[str] = None,
+                 author_email: Optional[str] = None, maintainer_email: Optional[str] = None,
+                 origins: Tuple[str, ...] = (), dependencies: Optional[Tuple[str, ...]] = None,
+                 parent: Optional[ParentPath] = None):
+        self.name = name
+        self.version = version
+        self.purl = purl
+        self.bom_ref = bom_ref
+        self.author_email = author_email
+        self.maintainer_email = maintainer_email
+        self.origins = origins
+        self.dependencies = dependencies
+        self.parent = parent
+
+    def get(self, key: str, default=None):
+        attribute = _RECORD_KEYS.get(key, key)
+        value = getattr(self, attribute) if attribute in self.__slots__ else None
+        return default if value is None or value == '' or value == () else value
+
+    def to_dict(self) -> Dict:
+        """Plain dict of the set fields, e.g. for hashing. A nested component carries its parent's ref."""
+        fields = {slot: getattr(self, slot) for slot in self.__slots__ if getattr(self, slot)}
+        if self.parent is not None:
+            fields['parent'] = self.parent.ref
+        return fields
+
+    def compact(self) -> 'ComponentRecord':
+        """
+        Copy with only what dependency analysis reads (name, purl, bom-ref, legacy
+        dependencies and parent), so a whole SBOM's worth can be held once scored.
+        """
+        return ComponentRecord(self.name, purl=self.purl, bom_ref=self.bom_ref, dependencies=self.dependencies,
+                               parent=self.parent)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ComponentRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"ComponentRecord({self.name!r}, {self.version!r}, {self.purl!r})"
+
+    @classmethod
+    def from_cyclonedx(cls, component: Dict, parent: Optional[ParentPath] = None) -> 'ComponentRecord':
+        author_email = maintainer_email = None
+        origins = ()
+        for prop in component.get('properties') or ():
+            prop_name = prop.get('name')
+            if prop_name == 'author_email':
+                author_email = prop.get('value')
+            elif prop_name == 'maintainer_email':
+                maintainer_email = prop.get('value')
+            elif prop_name == 'origin':
+                origins += (prop.get('value'),)
+        legacy = component.get('dependencies')
+        dependencies = None
+        if legacy:
+            dependencies = tuple(dep.get('ref', '') if isinstance(dep, dict) else dep for dep in legacy)
+        return cls(component.get('name', ''), component.get('version', ''), component.get('purl', ''),
+                   component.get('bom-ref'), author_email, maintainer_email, origins, dependencies, parent)
+
+    @classmethod
+    def from_spdx(cls, package: Dict) -> 'ComponentRecord':
+        purl = ''
+        for ref in package.get('externalRefs') or ():
+            if ref.get('referenceType') == 'purl':
+                purl = ref.get('referenceLocator', '')
+                break
+        version = package.get('versionInfo', '')
+        return cls(package.get('name', ''), '' if version in SPDX_NO_VALUE else version, purl, package.get('SPDXID'),
+                   spdx_email(package.get('originator')), spdx_email(package.get('supplier')))
+
+def walk_components(components: Iterable[Dict], seen: Optional[Dict[str, bool]] = None
+                    ) -> Iterator[Tuple[Dict, Optional[ParentPath]]]:
+    """
+    Yield (component, parent path) for every CycloneDX component and, depth
+    first, the components nested in it, using an explicit stack instead of
+    recursion. A nested component whose bom-ref or purl has already been seen
+    (reached through another parent, or listed at the top level earlier) is
+    skipped along with its subtree, and so is a top-level component already
+    seen nested. Top-level duplicates of each other are still yielded, as
+    before nesting was read. seen maps every bom-ref and purl met to whether it
+    was met nested, and may be shared across calls.
+    """
+    seen = {} if seen is None else seen
+    stack = [(iter(components), None)]
+    while stack:
+        iterator, parent = stack[-1]
+        component = next(iterator, _END)
+        if component is _END:
+            stack.pop()
+            continue
+        keys = [key for key in (component.get('bom-ref'), component.get('purl')) if key]
+        if any(seen.get(key) for key in keys) if parent is None else any(key in seen for key in keys):
+            continue
+        for key in keys:
+            seen.setdefault(key, parent is not None)
+        yield component, parent
+        nested = component.get('components')
+        if nested:
+            ref = component.get('bom-ref') or component.get('purl') or component.get('name', '')
+            stack.append((iter(nested), ParentPath(ref, parent)))
+
+def normalize_components(components: Iterable[Union[Dict, ComponentRecord]]) -> Iterator[ComponentRecord]:
+    """Records pass through; CycloneDX component dicts are converted, nested components included."""
+    seen = {}
+    for component in components:
+        if isinstance(component, ComponentRecord):
+            yield component
+        else:
+            for nested, parent in walk_components((component,), seen):
+                yield ComponentRecord.from_cyclonedx(nested, parent)
+
+def spdx_email(actor: Optional[str]) -> Optional[str]:
+    """Email of an SPDX actor such as 'Organization: Example (ops@example.com)'."""
+    if not actor:
+        return None
+    match = _SPDX_EMAIL.search(actor)
+    return match.group(1) if match else None
+
+def spdx_dependencies(relationships: Iterable[Dict]) -> List[Dict]:
+    """CycloneDX-style dependency entries from SPDX relationships."""
+    depends_on = {}
+    for relationship in relationships:
+        kind = relationship.get('relationshipType')
+        element, related = relationship.get('spdxElementId'), relationship.get('relatedSpdxElement')
+        if kind == 'DEPENDS_ON':
+            parent, child = element, related
+        elif kind in SPDX_DEPENDENCY_OF:
+            parent, child = related, element
+        else:
+            continue
+        if parent and child and child not in SPDX_NO_VALUE:
+            depends_on.setdefault(parent, []).append(child)
+    return [{'ref': ref, 'dependsOn': list(dict.fromkeys(children))} for ref, children in depends_on.items()]
+
+def _sniff_json(head: bytes) -> Optional[str]:
+    """JSON format named by the keys in head, or None if it holds neither format's keys."""
+    if b'"spdxVersion"' in head:
+        return SPDX_JSON
+    if any(key in head for key in _CYCLONEDX_JSON_KEYS):
+        return CYCLONEDX_JSON
+    if any(key in head for key in _SPDX_JSON_KEYS):
+        return SPDX_JSON
+    return None
+
+def detect_format(head: bytes) -> Optional[str]:
+    """
+    Format of a document from its first bytes (SNIFF_BYTES are enough), or
+    None. JSON without either format's keys in head is taken as CycloneDX.
+    """
+    text = (head[len(codecs.BOM_UTF8):] if head.startswith(codecs.BOM_UTF8) else head).lstrip()
+    if text.startswith(b'{'):
+        return _sniff_json(head) or CYCLONEDX_JSON
+    if text.startswith(b'<'):
+        if b'<bom' in head or b'cyclonedx' in head.lower():
+            return CYCLONEDX_XML
+        return None
+    if _SPDX_TAG_VALUE_HEAD.search(head):
+        return SPDX_TAG_VALUE
+    return None
+
+def normalize_document(document: Dict) -> Dict:
+    """A parsed JSON SBOM with SPDX packages/relationships converted; CycloneDX documents are returned as is."""
+    if not isinstance(document, dict) or 'spdxVersion' not in document:
+        return document
+    normalized = {key: value for key, value in document.items() if key not in ('packages', 'relationships')}
+    if 'packages' in document:
+        normalized['components'] = [ComponentRecord.from_spdx(package) for package in document['packages']]
+    normalized['dependencies'] = spdx_dependencies(document.get('relationships') or ())
+    return normalized
+
+def load_document(content: bytes) -> Tuple[str, Dict]:
+    """
+    Parse a whole document held in memory into (format, document). JSON is
+    decoded in one pass; other formats go through their stream reader and the
+    components are materialized as ComponentRecords.
+    """
+    sbom_format = detect_format(content[:SNIFF_BYTES])
+    if sbom_format in (CYCLONEDX_JSON, SPDX_JSON):
+        try:
+            document = json.loads(content.decode('utf-8-sig'))
+        except RecursionError:
+            raise SBOMFormatError("JSON document nested too deeply") from None
+        return SPDX_JSON if isinstance(document, dict) and 'spdxVersion' in document else CYCLONEDX_JSON, \
+            normalize_document(document)
+    reader = _reader_for(sbom_format, io.BytesIO(content), DEFAULT_CHUNK_SIZE)
+    components = list(normalize_components(reader.components()))
+    if reader.has_components:
+        return sbom_format, dict(reader.document, components=components)
+    return sbom_format, reader.document
+
+def open_sbom_reader(stream, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[str, object]:
+    """
+    Sniff the format at the head of stream and return (format, reader). Every
+    reader offers components(), document, has_components and components_read
+    like StreamingSBOMReader. CycloneDX readers yield top-level component dicts,
+    which normalize_components() flattens; SPDX readers yield ComponentRecords.
+
+    A JSON head with neither format's keys (e.g. one taken up by a long comment)
+    gets a JSONSBOMReader; its sbom_format replaces the returned format once
+    components() has been exhausted.
+    """
+    head = stream.read(SNIFF_BYTES)
+    sbom_format = detect_format(head)
+    stream = _PrefixedStream(head, stream)
+    if sbom_format == CYCLONEDX_JSON and _sniff_json(head) is None:
+        return sbom_format, JSONSBOMReader(stream, chunk_size)
+    return sbom_format, _reader_for(sbom_format, stream, chunk_size)
+
+def _reader_for(sbom_format: Optional[str], stream, chunk_size: int):
+    if sbom_format == CYCLONEDX_JSON:
+        return StreamingSBOMReader(stream, chunk_size)
+    if sbom_format == SPDX_JSON:
+        return SPDXJSONReader(stream, chunk_size)
+    if sbom_format == CYCLONEDX_XML:
+        return CycloneDXXMLReader(stream, chunk_size)
+    if sbom_format == SPDX_TAG_VALUE:
+        return SPDXTagValueReader(stream, chunk_size)
+    raise SBOMFormatError("Unrecognized SBOM format: expected CycloneDX JSON/XML or SPDX JSON/tag-value")
+
+class _PrefixedStream:
+    """A stream whose first bytes have already been read (for format sniffing)."""
+
+    def __init__(self, head: bytes, stream):
+        self._head = head
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if self._head:
+            if size is None or size < 0:
+                data, self._head = self._head + self._stream.read(), b''
+                return data
+            data, self._head = self._head[:size], self._head[size:]
+            return data
+        return self._stream.read(size)
+
+class SPDXJSONReader:
+    """Streams packages[] of an SPDX JSON document as ComponentRecords."""
+
+    array_key = 'packages'
+
+    def __init__(self, stream, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._reader = StreamingSBOMReader(stream, chunk_size, array_key=self.array_key)
+        self.document = self._reader.document
+
+    @property
+    def has_components(self) -> bool:
+        return self._reader.has_components
+
+    @property
+    def components_read(self) -> int:
+        return self._reader.components_read
+
+    def components(self) -> Iterator[ComponentRecord]:
+        for package in self._reader.components():
+            yield ComponentRecord.from_spdx(package)
+        # Relationships may precede or follow the packages, so dependencies are known only now
+        self.document['dependencies'] = spdx_dependencies(self.document.pop('relationships', None) or ())
+
+class JSONSBOMReader(SPDXJSONReader):
+    """
+    Streams a JSON document whose head did not tell CycloneDX from SPDX.
+    Whichever of components[] (CycloneDX, yielded as dicts) and packages[]
+    (SPDX, yielded as ComponentRecords) comes first is streamed; sbom_format
+    follows from it, or from spdxVersion if there is neither.
+    """
+
+    array_key = ('components', 'packages')
+
+    @property
+    def sbom_format(self) -> str:
+        if self._reader.streamed_key == 'packages' or 'spdxVersion' in self.document:
+            return SPDX_JSON
+        return CYCLONEDX_JSON
+
+    def components(self) -> Iterator[Union[Dict, ComponentRecord]]:
+        for item in self._reader.components():
+            yield ComponentRecord.from_spdx(item) if self._reader.streamed_key == 'packages' else item
+        if self.sbom_format == SPDX_JSON:
+            self.document['dependencies'] = spdx_dependencies(self.document.pop('relationships', None) or ())
+
+class CycloneDXXMLReader:
+    """
+    Streams /bom/components/component elements, converted to CycloneDX JSON
+    component dicts (nested components included), with an expat pull parser;
+    each element is dropped from the tree once converted, so memory stays flat.
+    /bom/dependencies is collected into document. Documents with a DTD are
+    rejected before it reaches the parser (entity expansion).
+    """
+
+    def __init__(self, stream, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.document: Dict = {}
+        self.has_components = False
+        self.components_read = 0
+        self._consumed = False
+
+    def _events(self) -> Iterator[Tuple[str, ElementTree.Element]]:
+        parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        prolog = b''
+        in_root = False
+        try:
+            while True:
+                chunk = self.stream.read(self.chunk_size)
+                if not in_root:
+                    prolog = prolog[-16:] + chunk
+                    if b'<!DOCTYPE' in prolog or b'<!ENTITY' in prolog:
+                        raise SBOMFormatError("XML SBOMs with a DTD are not accepted")
+                if not chunk:
+                    parser.close()
+                    yield from parser.read_events()
+                    return
+                parser.feed(chunk)
+                for event in parser.read_events():
+                    in_root = True
+                    yield event
+        except ElementTree.ParseError as e:
+            raise SBOMFormatError(f"Invalid XML: {e}") from e
+
+    def components(self) -> Iterator[Dict]:
+        if self._consumed:
+            raise RuntimeError("SBOM stream has already been consumed")
+        self._consumed = True
+
+        path: List[str] = []
+        elements: List[ElementTree.Element] = []
+        dependencies = []
+        for event, element in self._events():
+            tag = _local_name(element.tag)
+            if event == 'start':
+                path.append(tag)
+                elements.append(element)
+                if len(path) == 1 and tag != 'bom':
+                    raise SBOMFormatError(f"Expected a CycloneDX <bom> document, found <{tag}>")
+                if path == ['bom', 'components']:
+                    self.has_components = True
+                continue
+
+            if path == ['bom', 'components', 'component']:
+                self.components_read += 1
+                yield _xml_component(element)
+                elements[-2].remove(element)
+            elif path == ['bom', 'dependencies', 'dependency']:
+                dependencies.append({'ref': element.get('ref', ''),
+                                     'dependsOn': [child.get('ref', '') for child in element
+                                                   if _local_name(child.tag) == 'dependency']})
+                elements[-2].remove(element)
+            path.pop()
+            elements.pop()
+        self.document['dependencies'] = dependencies
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+def _xml_component(element: ElementTree.Element) -> Dict:
+    """
+    The parts of a CycloneDX XML component that ComponentRecord reads, and its
+    nested components, in JSON form. Iterative, like walk_components().
+    """
+    root = {}
+    stack = [(element, root)]
+    while stack:
+        element, component = stack.pop()
+        if element.get('bom-ref'):
+            component['bom-ref'] = element.get('bom-ref')
+        for child in element:
+            tag = _local_name(child.tag)
+            if tag in ('name', 'version', 'purl'):
+                component[tag] = (child.text or '').strip()
+            elif tag == 'properties':
+                component['properties'] = [{'name': prop.get('name'), 'value': (prop.text or '').strip()}
+                                           for prop in child if _local_name(prop.tag) == 'property']
+            elif tag == 'components':
+                nested = component['components'] = []
+                for grandchild in child:
+                    if _local_name(grandchild.tag) == 'component':
+                        nested.append({})
+                        stack.append((grandchild, nested[-1]))
+    return root
+
+class SPDXTagValueReader:
+    """Streams the packages of an SPDX tag-value document as ComponentRecords, line by line."""
+
+    def __init__(self, stream, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.document: Dict = {}
+        self.has_components = False
+        self.components_read = 0
+        self._consumed = False
+
+    def _lines(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        pending = ''
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            text = pending + decoder.decode(chunk, final=not chunk)
+            lines = text.split('\n')
+            pending = lines.pop()
+            yield from lines
+            if not chunk:
+                if pending:
+                    yield pending
+                return
+
+    def components(self) -> Iterator[ComponentRecord]:
+        if self._consumed:
+            raise RuntimeError("SBOM stream has already been consumed")
+        self._consumed = True
+
+        package = None
+        relationships = []
+        in_text = False
+        for line in self._lines():
+            # <text>...</text> values may span lines and contain anything
+            if in_text:
+                in_text = '</text>' not in line
+                continue
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            tag, separator, value = line.partition(':')
+            if not separator:
+                raise SBOMFormatError(f"Invalid SPDX tag-value line: {line[:80]!r}")
+            tag, value = tag.strip(), value.strip()
+            if value.startswith('<text>'):
+                in_text = '</text>' not in value
+                value = value[len('<text>'):].split('</text>', 1)[0]
+
+            if tag == 'PackageName' or tag in SPDX_SECTION_TAGS:
+                if package is not None:
+                    self.components_read += 1
+                    yield ComponentRecord.from_spdx(package)
+                package = {'name': value} if tag == 'PackageName' else None
+                self.has_components = self.has_components or package is not None
+            elif tag == 'Relationship':
+                parts = value.split()
+                if len(parts) == 3:
+                    relationships.append({'spdxElementId': parts[0], 'relationshipType': parts[1],
+                                          'relatedSpdxElement': parts[2]})
+            elif package is not None:
+                if tag == 'SPDXID':
+                    package['SPDXID'] = value
+                elif tag == 'PackageVersion':
+                    package['versionInfo'] = value
+                elif tag == 'PackageSupplier':
+                    package['supplier'] = value
+                elif tag == 'PackageOriginator':
+                    package['originator'] = value
+                elif tag == 'ExternalRef':
+                    parts = value.split()
+                    if len(parts) >= 3:
+                        package.setdefault('externalRefs', []).append(
+                            {'referenceCategory': parts[0], 'referenceType': parts[1], 'referenceLocator': parts[2]})
+            elif tag == 'SPDXVersion':
+                self.document['spdxVersion'] = value
+        if package is not None:
+            self.components_read += 1
+            yield ComponentRecord.from_spdx(package)
+        self.document['dependencies'] = spdx_dependencies(relationships)
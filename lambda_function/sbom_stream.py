@@ -0,0 +1,188 @@
+"""
+Incremental reader for large CycloneDX (and SPDX) JSON documents.
+
+Entries of the top-level components[] array (packages[] for SPDX) are decoded
+one at a time from a byte stream (such as an S3 StreamingBody), so the raw
+bytes, the decoded text and the full parsed document are never held in memory
+together.
+"""
+import codecs
+import json
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+DEFAULT_MAX_ELEMENT_SIZE = 256 * 1024 * 1024  # Characters; bounds the lookahead for one component or member
+WHITESPACE = ' \t\n\r'
+TRUNCATION_SLACK = 16  # A decode error this close to the buffer end may just be a value cut off by the chunking
+
+class StreamingSBOMReader:
+    """
+    Stream-parse a JSON SBOM object. components() yields each element of the
+    top-level array_key ("components") array as soon as it has been read; every
+    other top-level member is decoded whole into self.document. The document is
+    complete once components() has been exhausted.
+
+    array_key may also be a tuple of candidate keys, for documents whose format
+    is not known up front: the first of them to appear is streamed and recorded
+    in streamed_key, and the others are decoded like other members.
+
+    A single element (a component, or any other top-level member) may span at
+    most max_element_size characters; longer ones raise a JSONDecodeError
+    rather than pulling the rest of the document into memory.
+    """
+
+    def __init__(self, stream, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 array_key: Union[str, Tuple[str, ...]] = 'components',
+                 max_element_size: int = DEFAULT_MAX_ELEMENT_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.array_key = array_key
+        self.streamed_key: Optional[str] = None
+        self.max_element_size = max_element_size
+        self.document: Dict = {}
+        self.has_components = False
+        self.components_read = 0
+        self.bytes_read = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._consumed = False
+
+    def _fill(self, min_chars: int = 1) -> bool:
+        """
+        Append at least min_chars of input (or the rest of the stream) to the
+        buffer, in one concatenation. Returns False if nothing was left to read.
+        """
+        if self._eof:
+            return False
+        parts = [self._buffer[self._pos:]]
+        added = 0
+        while added < min_chars:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                self._eof = True
+                parts.append(self._decoder.decode(b'', final=True))
+                break
+            self.bytes_read += len(chunk)
+            parts.append(self._decoder.decode(chunk))
+            added += len(parts[-1])
+        # Drop consumed text before growing the buffer so it stays about one element long
+        self._buffer = ''.join(parts)
+        self._pos = 0
+        return added > 0
+
+    def _extend_element(self) -> bool:
+        """
+        Read more of an element that does not fit in the buffer yet. The pending
+        text is doubled at a time, so re-decoding it costs linear work overall.
+        Returns False at end of stream; raises once max_element_size is exceeded.
+        """
+        pending = len(self._buffer) - self._pos
+        if pending >= self.max_element_size:
+            raise self._error(f"Element exceeds {self.max_element_size} characters")
+        return self._fill(max(pending, self.chunk_size))
+
+    def _is_truncation(self, error: json.JSONDecodeError) -> bool:
+        """True if the error may only mean the value continues past the end of the buffer."""
+        return error.msg.startswith('Unterminated string') or len(self._buffer) - error.pos <= TRUNCATION_SLACK
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at end of stream)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, expected: str) -> None:
+        if self._peek() != expected:
+            raise self._error(f"Expecting '{expected}'")
+        self._pos += 1
+
+    def _decode_value(self):
+        """Decode one complete JSON value at the cursor, reading more input as needed."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                # Errors in the middle of the buffer are real; only a cut-off value is worth more input
+                if self._is_truncation(e) and self._extend_element():
+                    continue
+                raise
+            except RecursionError:
+                raise self._error("Document nested too deeply") from None
+            # A value that ends exactly at the buffer edge (e.g. a number) may continue in the next chunk
+            if end == len(self._buffer) and not self._eof:
+                if self._extend_element():
+                    continue
+            self._pos = end
+            return value
+
+    def _finish_member(self) -> bool:
+        """Consume the separator after a member. Returns True if another member follows."""
+        separator = self._peek()
+        if separator == ',':
+            self._pos += 1
+            return True
+        if separator == '}':
+            self._pos += 1
+            return False
+        raise self._error("Expecting ',' delimiter")
+
+    def _is_array_key(self, key: str) -> bool:
+        return key == self.array_key if isinstance(self.array_key, str) else key in self.array_key
+
+    def components(self) -> Iterator[Dict]:
+        """Yield top-level components one by one, collecting other members into self.document."""
+        if self._consumed:
+            raise RuntimeError("SBOM stream has already been consumed")
+        self._consumed = True
+
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            key = self._decode_value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name enclosed in double quotes")
+            self._expect(':')
+
+            if self._is_array_key(key) and self.streamed_key in (None, key) and self._peek() == '[':
+                self.has_components = True
+                self.streamed_key = key
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        component = self._decode_value()
+                        self.components_read += 1
+                        yield component
+                        separator = self._peek()
+                        self._pos += 1
+                        if separator == ']':
+                            break
+                        if separator != ',':
+                            self._pos -= 1
+                            raise self._error("Expecting ',' delimiter")
+            else:
+                self.document[key] = self._decode_value()
+
+            if not self._finish_member():
+                break
+
+        if self._peek():
+            raise self._error("Extra data")
+        # The text of the last members read can be as large as the biggest of them
+        self._buffer = ''
+        self._pos = 0
@@ -2,7 +2,14 @@ import pytest
 import json
 import os
 import sys
+import io
+import gzip
+import base64
+import random
+import subprocess
 import boto3
+from decimal import Decimal
+from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 from moto import mock_aws
 
@@ -25,9 +32,42 @@ from lambda_function import (
     lambda_handler,
     get_cve_data_for_package,
     calculate_dependency_depth,
-    generate_executive_summary
+    generate_executive_summary,
+    prefetch_cve_data,
+    CVELookupError,
+    DynamoDBCVECache,
+    TTLLRUCache,
+    TokenBucket,
+    VersionRangeIndex,
+    clear_memo_caches,
+    find_ofac_keywords
 )
 
+import lambda_function
+import vuln_db
+from sbom_stream import StreamingSBOMReader
+from sbom_formats import (CYCLONEDX_JSON, CYCLONEDX_XML, SNIFF_BYTES, SPDX_JSON, SPDX_TAG_VALUE, ComponentRecord,
+                          SBOMFormatError, detect_format, load_document, normalize_components, open_sbom_reader,
+                          walk_components)
+import result_writer
+from result_writer import S3MultipartWriter, upload_analysis
+from keyword_matcher import KeywordMatcher
+from sanctions_rules import RuleBundleError, RuleSetLoader, SanctionsRuleSet
+from incremental import AnalysisSnapshot, diff_snapshots
+from component_index import ComponentIndex, split_purl
+from ranking import TopK
+from metrics import Metrics
+from lazy_import import LazyModule
+from aws_clients import DynamoDBTable, batch_get_item
+from vuln_db import VulnerabilityDatabase, cvss3_base_score
+
+@pytest.fixture(autouse=True)
+def reset_memo_caches():
+    """Module-level caches persist across calls, so isolate every test."""
+    clear_memo_caches()
+    yield
+    clear_memo_caches()
+
 class TestEmailDomainExtraction:
     """Test email domain extraction functionality."""
     
@@ -73,10 +113,39 @@ class TestOFACRiskChecking:
         assert country is None
         assert confidence == 0.0
 
+class TestKeywordMatcher:
+    """Test the compiled multi-keyword matcher."""
+
+    def test_overlapping_matches_with_positions(self):
+        matcher = KeywordMatcher({"he": 1, "she": 2, "his": 3, "hers": 4})
+        assert matcher.find_all("ushers") == [(1, 4, "she", 2), (2, 4, "he", 1), (2, 6, "hers", 4)]
+        assert matcher.find_all("nothing") == []
+        assert matcher.find_all("") == []
+
+    def test_search_prefers_leftmost_longest(self):
+        matcher = KeywordMatcher(["iran", "tehran", "ran"])
+        assert matcher.search("tehran-iran.com") == (0, 6, "tehran", "tehran")
+        assert matcher.search("example.com") is None
+
+    def test_matches_naive_scan(self):
+        rng = random.Random(5)
+        keywords = {"".join(rng.choice("abc") for _ in range(rng.randint(1, 5))) for _ in range(200)}
+        matcher = KeywordMatcher(keywords)
+        assert len(matcher) == len(keywords)
+        for _ in range(200):
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 30)))
+            expected = sorted((start, start + len(keyword), keyword) for keyword in keywords
+                              for start in range(len(text)) if text.startswith(keyword, start))
+            assert sorted(match[:3] for match in matcher.find_all(text)) == expected
+
+    def test_find_ofac_keywords(self):
+        assert find_ofac_keywords("Tehran-Soft Iran") == [(0, 6, "tehran", "Iran"), (12, 16, "iran", "Iran")]
+        assert find_ofac_keywords(None) == []
+
 class TestCVEAnalysis:
     """Test CVE analysis functionality."""
     
-    @patch('lambda_function.requests.get')
+    @patch('lambda_function.requests.Session.get')
     def test_get_cve_data_success(self, mock_get):
         # Mock successful NVD API response
         mock_response = MagicMock()
@@ -114,7 +183,7 @@ class TestCVEAnalysis:
         assert result[0]["cvss_score"] == 9.1
         assert result[0]["severity"] == "CRITICAL"
     
-    @patch('lambda_function.requests.get')
+    @patch('lambda_function.requests.Session.get')
     def test_get_cve_data_api_failure(self, mock_get):
         # Mock API failure
         mock_get.side_effect = Exception("API unavailable")
@@ -151,6 +220,179 @@ class TestDependencyAnalysis:
         assert result["direct_dependencies"] == 0
         assert result["transitive_dependencies"] == 0
 
+    @staticmethod
+    def components(*refs):
+        return [{"name": ref, "bom-ref": ref, "purl": f"pkg:npm/{ref}@1.0.0"} for ref in refs]
+
+    def test_top_level_dependencies_by_bom_ref(self):
+        dependencies = [
+            {"ref": "app", "dependsOn": ["a", "b"]},  # metadata.component, not in components[]
+            {"ref": "a", "dependsOn": ["c"]},
+            {"ref": "b", "dependsOn": ["c", "missing"]},
+            {"ref": "c", "dependsOn": ["d"]},
+        ]
+        result = calculate_dependency_depth(self.components("a", "b", "c", "d"), dependencies)
+
+        assert result["depth_distribution"] == {"0": 2, "1": 1, "2": 1}
+        assert result["direct_dependencies"] == 2
+        assert result["transitive_dependencies"] == 2
+        assert result["max_depth"] == 2
+        assert result["dependency_edges"] == 3
+        assert result["dangling_references"] == 2
+        assert result["cycles_detected"] == 0
+        assert result["longest_path"] == ["a", "c", "d"]
+        assert result["longest_path_length"] == 2
+        assert [entry["name"] for entry in result["dependency_tree"]["2"]] == ["d"]
+        assert not result["dependency_tree_truncated"]
+
+    def test_dependency_tree_keeps_shallowest_nodes(self):
+        dependencies = [{"ref": "a", "dependsOn": ["c"]}, {"ref": "b", "dependsOn": ["d"]}]
+        with patch.object(lambda_function, 'MAX_REPORTED_TREE_NODES', 3):
+            result = calculate_dependency_depth(self.components("c", "a", "d", "b"), dependencies)
+
+        assert result["depth_distribution"] == {"0": 2, "1": 2}
+        assert [entry["name"] for entry in result["dependency_tree"]["0"]] == ["a", "b"]
+        assert [entry["name"] for entry in result["dependency_tree"]["1"]] == ["c"]
+        assert result["dependency_tree_truncated"]
+
+    def test_cycles_are_detected(self):
+        dependencies = [
+            {"ref": "root", "dependsOn": ["x"]},
+            {"ref": "x", "dependsOn": ["y"]},
+            {"ref": "y", "dependsOn": ["z"]},
+            {"ref": "z", "dependsOn": ["x", "leaf"]},
+            {"ref": "self", "dependsOn": ["self"]},
+        ]
+        result = calculate_dependency_depth(self.components("root", "x", "y", "z", "leaf", "self"), dependencies)
+
+        assert result["cycles_detected"] == 2
+        assert sorted(result["cycles"]) == [["self"], ["x", "y", "z"]]
+        assert result["depth_distribution"] == {"0": 2, "1": 1, "2": 1, "3": 1, "4": 1}
+        # The x-y-z cycle counts as one hop on the longest path
+        assert result["longest_path"] == ["root", "x", "leaf"]
+
+    def test_graph_without_roots(self):
+        dependencies = [{"ref": "p", "dependsOn": ["q"]}, {"ref": "q", "dependsOn": ["p"]}]
+        result = calculate_dependency_depth(self.components("p", "q"), dependencies)
+        assert result["depth_distribution"] == {"0": 1, "1": 1}
+        assert result["cycles"] == [["p", "q"]]
+
+    def test_legacy_component_dependencies(self):
+        components = [
+            {"name": "one", "purl": "pkg:pypi/one@1", "dependencies": [{"ref": "pkg:pypi/two@1"}]},
+            {"name": "two", "purl": "pkg:pypi/two@1"},
+        ]
+        result = calculate_dependency_depth(components)
+        assert result["depth_distribution"] == {"0": 1, "1": 1}
+
+    def test_long_chain_with_cycle(self):
+        count = 50000
+        refs = [f"n{i}" for i in range(count)]
+        dependencies = [{"ref": refs[i], "dependsOn": [refs[i + 1]]} for i in range(count - 1)]
+        dependencies.append({"ref": refs[-1], "dependsOn": [refs[count // 2]]})
+        result = calculate_dependency_depth(self.components(*refs), dependencies)
+        assert result["max_depth"] == count - 1
+        assert result["cycles_detected"] == 1
+        assert len(result["cycles"][0]) == count - count // 2
+        assert result["longest_path_length"] == count // 2
+
+    @staticmethod
+    def risk(score, **factors):
+        return {"risk_score": score, "risk_factors": factors}
+
+    def test_transitive_risk_counts_shared_descendants_once(self):
+        dependencies = [
+            {"ref": "a", "dependsOn": ["c", "e"]},
+            {"ref": "b", "dependsOn": ["c"]},
+            {"ref": "c", "dependsOn": ["d"]},
+            {"ref": "e", "dependsOn": ["d"]},
+        ]
+        component_risks = {
+            "d": self.risk(0.9, cve_risk="CRITICAL", cve_confidence=1.0),
+            "e": self.risk(0.7, author_email_country="Iran", author_email_confidence=0.7),
+            "f": self.risk(0.2, origin_country="Cuba", origin_confidence=0.9),
+        }
+        result = calculate_dependency_depth(self.components("a", "b", "c", "d", "e", "f"), dependencies,
+                                            component_risks)["transitive_risk"]
+
+        assert result["risky_components"] == 3
+        assert result["direct_dependencies_at_risk"] == 3
+        by_ref = {entry["ref"]: entry for entry in result["direct_dependencies"]}
+        assert [entry["ref"] for entry in result["direct_dependencies"]] == ["a", "b", "f"]
+        assert by_ref["a"]["risky_descendants"] == 2
+        assert by_ref["a"]["worst_risk_score"] == 0.9
+        assert by_ref["a"]["worst_risk_component"] == "d"
+        assert by_ref["a"]["sanctioned_origin_descendants"] == 1
+        assert by_ref["a"]["critical_cve_descendants"] == 1
+        assert by_ref["a"]["risk_score"] is None
+        assert by_ref["b"]["risky_descendants"] == 1
+        # A risky direct dependency reports its own score but is not its own descendant
+        assert by_ref["f"]["risky_descendants"] == 0
+        assert by_ref["f"]["worst_risk_score"] == 0.2
+
+    def test_transitive_risk_through_cycles(self):
+        dependencies = [
+            {"ref": "root", "dependsOn": ["x"]},
+            {"ref": "x", "dependsOn": ["y"]},
+            {"ref": "y", "dependsOn": ["x", "z"]},
+            {"ref": "p", "dependsOn": ["q"]},
+            {"ref": "q", "dependsOn": ["p"]},
+        ]
+        component_risks = {"z": self.risk(0.8, cve_risk="HIGH"), "q": self.risk(0.6), "x": self.risk(0.3)}
+        result = calculate_dependency_depth(self.components("root", "x", "y", "z", "p", "q"), dependencies,
+                                            component_risks)["transitive_risk"]
+
+        by_ref = {entry["ref"]: entry for entry in result["direct_dependencies"]}
+        assert by_ref["root"]["risky_descendants"] == 2
+        assert by_ref["root"]["worst_risk_component"] == "z"
+        assert by_ref["p"]["risky_descendants"] == 1
+        assert by_ref["p"]["worst_risk_score"] == 0.6
+
+    def test_transitive_risk_long_chain(self):
+        count = 50000
+        refs = [f"n{i}" for i in range(count)]
+        dependencies = [{"ref": refs[i], "dependsOn": [refs[i + 1]]} for i in range(count - 1)]
+        component_risks = {ref: self.risk(0.5) for ref in refs[1::100]}
+        component_risks[refs[-1]] = self.risk(1.0)
+        result = calculate_dependency_depth(self.components(*refs), dependencies, component_risks)["transitive_risk"]
+        [entry] = result["direct_dependencies"]
+        assert entry["risky_descendants"] == len(component_risks)
+        assert entry["worst_risk_component"] == refs[-1]
+
+    def test_transitive_risk_without_risks(self):
+        result = calculate_dependency_depth(self.components("a", "b"), [{"ref": "a", "dependsOn": ["b"]}])
+        assert result["transitive_risk"] == {
+            "risky_components": 0, "direct_dependencies_at_risk": 0, "direct_dependencies": []
+        }
+
+    @patch('lambda_function.fetch_cve_candidates', return_value=[])
+    def test_analysis_propagates_ofac_risk(self, mock_candidates):
+        components = self.components("app-lib", "helper", "util")
+        components[2]["properties"] = [{"name": "author_email", "value": "dev@example.ir"}]
+        sbom = {
+            "components": components,
+            "dependencies": [{"ref": "app-lib", "dependsOn": ["helper"]}, {"ref": "helper", "dependsOn": ["util"]}]
+        }
+        results = analyze_ofac(sbom)
+        [entry] = results["dependency_analysis"]["transitive_risk"]["direct_dependencies"]
+        assert entry["ref"] == "app-lib"
+        assert entry["worst_risk_component"] == "util"
+        assert entry["sanctioned_origin_descendants"] == 1
+        assert results["executive_summary"]["key_metrics"]["direct_dependencies_at_risk"] == 1
+
+    @patch('lambda_function.fetch_cve_candidates', return_value=[])
+    def test_analysis_uses_top_level_dependencies(self, mock_candidates):
+        sbom = {
+            "components": self.components("a", "b"),
+            "dependencies": [{"ref": "a", "dependsOn": ["b"]}]
+        }
+        buffered = analyze_ofac(sbom)["dependency_analysis"]
+        # Streamed SBOMs may list dependencies after components
+        reader = StreamingSBOMReader(io.BytesIO(json.dumps(sbom).encode('utf-8')), chunk_size=8)
+        streamed = analyze_ofac(reader.document, components=reader.components())["dependency_analysis"]
+        assert buffered["max_depth"] == streamed["max_depth"] == 1
+        assert buffered == streamed
+
 class TestExecutiveSummary:
     """Test executive summary generation."""
     
@@ -196,7 +438,7 @@ class TestExecutiveSummary:
 class TestEnhancedAnalysis:
     """Test enhanced SBOM analysis with CVE and dependency features."""
     
-    @patch('lambda_function.get_cve_data_for_package')
+    @patch('lambda_function.fetch_cve_candidates')
     def test_analyze_ofac_with_cve_integration(self, mock_cve_func):
         # Mock CVE data
         mock_cve_func.return_value = [
@@ -236,6 +478,1534 @@ class TestEnhancedAnalysis:
         assert "max_depth" in result["dependency_analysis"]
         assert result["executive_summary"]["risk_level"] in ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
 
+class TestTopK:
+    """Test bounded top-K ranking of report entries."""
+
+    def test_keeps_largest_with_stable_ties(self):
+        rng = random.Random(5)
+        items = [(rng.randint(0, 50), index) for index in range(1000)]
+        top = TopK(10, key=lambda item: item[0])
+        top.extend(items)
+        assert top.seen == 1000 and len(top) == 10
+        # Same as a stable full sort, i.e. equal keys keep their original order
+        assert top.items() == sorted(items, key=lambda item: item[0], reverse=True)[:10]
+
+        empty = TopK(0, key=lambda item: item)
+        empty.extend([3, 1, 2])
+        assert empty.items() == [] and empty.seen == 3
+
+    @patch('lambda_function.fetch_cve_candidates')
+    def test_reports_are_ranked(self, mock_candidates):
+        scores = {"first": 7.2, "second": 9.1, "third": 8.0, "fourth": 9.8}
+        mock_candidates.side_effect = lambda name, ecosystem: [{
+            "cve_id": f"CVE-2024-{name}", "cvss_score": scores[name],
+            "severity": "CRITICAL" if scores[name] >= 9.0 else "HIGH", "description": "",
+            "published_date": "", "last_modified": ""}]
+        sbom = {"components": [{"name": name, "version": "1.0.0", "purl": f"pkg:pypi/{name}@1.0.0"} for name in scores]}
+
+        clear_memo_caches()
+        with patch.object(lambda_function, 'MAX_REPORTED_VULNERABLE_COMPONENTS', 3):
+            result = analyze_ofac(sbom)
+        ranked = result["cve_analysis"]["vulnerable_components"]
+        assert [component["name"] for component in ranked] == ["fourth", "second", "third"]
+        assert result["cve_analysis"]["components_with_cves"] == 4
+        top_cves = [risk["component"] for risk in result["executive_summary"]["top_risks"]
+                    if risk["type"] == "Critical Vulnerability"]
+        assert top_cves == ["fourth", "second"]
+        # Component risk entries are ranked by risk score: CRITICAL CVE confidence first
+        ofac_top = [risk["component"] for risk in result["executive_summary"]["top_risks"]
+                    if risk["type"] == "OFAC Compliance Risk"]
+        assert ofac_top == ["second", "fourth"]
+
+class TestMetrics:
+    """Test stage timers, counters and EMF output."""
+
+    def test_stages_counters_and_merge(self):
+        metrics = Metrics()
+        with metrics.stage('parse'):
+            pass
+        metrics.add_stage('parse', 0.5)
+        assert list(metrics.timed_iter(iter([1, 2, 3]), 'read')) == [1, 2, 3]
+        metrics.count('NVDRequests', 4)
+        metrics.count('NVDErrors')
+
+        stages = metrics.breakdown()
+        assert stages['parse']['calls'] == 2 and stages['parse']['seconds'] >= 0.5
+        assert stages['read']['calls'] == 3
+        assert metrics.ratio('NVDErrors', 'NVDRequests') == 25.0
+        assert metrics.ratio('CVECacheHits', 'CVECacheHits', 'CVECacheMisses') is None
+
+        total = Metrics()
+        total.merge(metrics)
+        total.merge(metrics)
+        assert total.breakdown()['parse']['calls'] == 4 and total.counters['NVDRequests'] == 8
+
+    def test_emf_document(self):
+        metrics = Metrics()
+        metrics.add_stage('s3_read', 0.25)
+        metrics.count('SBOMsAnalyzed')
+        metrics.sample('NVDRequestLatency', 12.5, 'Milliseconds')
+        metrics.sample('NVDRequestLatency', 30.0, 'Milliseconds')
+        document = metrics.to_emf('Test', {'FunctionName': 'analyzer'},
+                                  {'NVDErrorRate': (0.0, 'Percent'), 'CVECacheHitRate': (None, 'Percent')})
+
+        directive = document['_aws']['CloudWatchMetrics'][0]
+        assert directive['Namespace'] == 'Test' and directive['Dimensions'] == [['FunctionName']]
+        assert {metric['Name']: metric['Unit'] for metric in directive['Metrics']} == {
+            'Stage.s3_read': 'Milliseconds', 'SBOMsAnalyzed': 'Count',
+            'NVDRequestLatency': 'Milliseconds', 'NVDErrorRate': 'Percent'}
+        assert document['FunctionName'] == 'analyzer'
+        assert document['Stage.s3_read'] == 250.0
+        assert document['NVDRequestLatency'] == [12.5, 30.0]
+        assert 'CVECacheHitRate' not in document
+
+class TestConcurrentCVEPrefetch:
+    """Test bounded-concurrency CVE prefetching."""
+
+    @staticmethod
+    def _fake_cves(name, ecosystem):
+        return [{
+            "cve_id": f"CVE-2024-{len(name)}{len(ecosystem)}",
+            "cvss_score": 9.5 if name.startswith('crit') else 7.5,
+            "severity": "CRITICAL" if name.startswith('crit') else "HIGH",
+            "description": f"{name} {ecosystem}",
+            "published_date": "2024-01-01T00:00:00.000",
+            "last_modified": "2024-01-01T00:00:00.000"
+        }]
+
+    def test_prefetch_deduplicates_lookups(self):
+        keys = [("lodash", "4.17.20", "npm"), ("requests", "2.0.0", "pypi"), ("lodash", "4.17.20", "npm"),
+                ("lodash", "4.17.21", "npm")]
+
+        with patch('lambda_function.fetch_cve_candidates', side_effect=self._fake_cves) as mock_cve_func:
+            result = prefetch_cve_data(keys, max_workers=4)
+
+        # One candidate fetch per package, shared by all of its versions
+        assert mock_cve_func.call_count == 2
+        assert list(result.keys()) == [("lodash", "4.17.20", "npm"), ("requests", "2.0.0", "pypi"),
+                                       ("lodash", "4.17.21", "npm")]
+
+    def test_prefetch_respects_concurrency_limit(self):
+        import threading
+        import time
+
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow_lookup(name, ecosystem):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+            return []
+
+        keys = [(f"pkg{i}", "1.0.0", "npm") for i in range(12)]
+        with patch('lambda_function.fetch_cve_candidates', side_effect=slow_lookup):
+            prefetch_cve_data(keys, max_workers=3)
+
+        assert 1 < state["peak"] <= 3
+
+    def test_concurrent_output_matches_serial(self):
+        sbom_data = {
+            "bomFormat": "CycloneDX",
+            "specVersion": "1.4",
+            "components": [
+                {"name": f"{'crit' if i % 3 == 0 else 'lib'}{i}", "version": f"1.{i}.0",
+                 "purl": f"pkg:{['npm', 'pypi', 'maven', 'nuget'][i % 4]}/pkg{i}@1.{i}.0"}
+                for i in range(30)
+            ]
+        }
+
+        with patch('lambda_function.fetch_cve_candidates', side_effect=self._fake_cves):
+            serial = analyze_ofac(sbom_data, max_workers=1)
+            clear_memo_caches()
+            concurrent = analyze_ofac(sbom_data, max_workers=8)
+
+        for result in (serial, concurrent):
+            result.pop("analysis_timestamp")
+            result.pop("metadata")  # Runtime cache counters
+            result["executive_summary"].pop("analysis_timestamp")
+        assert json.dumps(serial, sort_keys=True) == json.dumps(concurrent, sort_keys=True)
+        assert serial["cve_analysis"]["total_cves_found"] == 30
+
+class TestInProcessCache:
+    """Test the in-process TTL/LRU memoization layer."""
+
+    def test_lru_eviction(self):
+        cache = TTLLRUCache(maxsize=2, ttl_seconds=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1  # 'a' becomes most recently used
+        cache.put('c', 3)
+
+        assert 'b' not in cache
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+
+    def test_ttl_expiry(self):
+        cache = TTLLRUCache(maxsize=10, ttl_seconds=60)
+        with patch('lambda_function.time.monotonic', return_value=1000.0):
+            cache.put('a', 1)
+        with patch('lambda_function.time.monotonic', return_value=1061.0):
+            assert 'a' not in cache
+            assert cache.get('a') is None
+
+        stats = cache.stats()
+        assert stats['expirations'] == 1
+        assert stats['misses'] == 1
+        assert stats['size'] == 0
+
+    def test_domain_helpers_are_memoized(self):
+        for _ in range(5):
+            assert extract_domain_from_email("dev@tehran-soft.com") == "tehran-soft.com"
+            assert check_domain_for_ofac_risk("tehran-soft.com") == ("Iran", 0.6)
+
+        assert extract_domain_from_email.cache.stats()['hits'] == 4
+        assert check_domain_for_ofac_risk.cache.stats()['misses'] == 1
+
+    @patch('lambda_function.requests.Session.get')
+    def test_cve_lookup_survives_repeated_calls(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"vulnerabilities": []}
+        mock_get.return_value = mock_response
+
+        for _ in range(3):
+            assert get_cve_data_for_package("lodash", "4.17.20", "npm") == []
+
+        assert mock_get.call_count == 1
+
+    @patch('lambda_function.requests.Session.get')
+    def test_failed_cve_lookups_are_not_memoized(self, mock_get):
+        mock_get.side_effect = Exception("API unavailable")
+
+        get_cve_data_for_package("lodash", "4.17.20", "npm")
+        get_cve_data_for_package("lodash", "4.17.20", "npm")
+
+        assert mock_get.call_count == 2
+
+    def test_metadata_exposes_cache_stats(self):
+        sbom_data = {"components": [
+            {"name": f"lib{i}", "version": "1.0.0", "purl": f"pkg:pypi/lib{i}@1.0.0",
+             "properties": [{"name": "author_email", "value": "dev@example.com"}]}
+            for i in range(3)
+        ]}
+
+        with patch('lambda_function.fetch_cve_candidates', return_value=[]):
+            result = analyze_ofac(sbom_data)
+
+        memo = result["metadata"]["memo_cache"]
+        assert set(memo) == {"cve_lookup", "email_domain", "domain_risk", "range_index"}
+        # author_email repeats, and the absent maintainer_email is memoized too
+        assert memo["email_domain"]["hits"] == 4
+        assert {"hit_rate", "evictions"} <= set(memo["domain_risk"])
+
+class StubNVDServer:
+    """Local HTTP server that replays scripted NVD responses."""
+
+    def __init__(self, responses):
+        import http.server
+        import threading
+
+        self.responses = list(responses)
+        self.requests = []
+        self.client_ports = set()
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Allow keep-alive
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                stub.client_ports.add(self.client_address[1])
+                status, headers, body = stub.responses.pop(0) if len(stub.responses) > 1 else stub.responses[0]
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/rest/json/cves/2.0"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+NVD_OK_RESPONSE = {
+    "vulnerabilities": [{
+        "cve": {
+            "id": "CVE-2021-23337",
+            "descriptions": [{"lang": "en", "value": "Command injection"}],
+            "metrics": {"cvssMetricV31": [{"cvssData": {"baseScore": 7.2, "baseSeverity": "HIGH"}}]}
+        }
+    }]
+}
+
+class TestNVDClient:
+    """Test the pooled, rate-limited NVD client against a local stub server."""
+
+    def _patched_client(self, url):
+        return [
+            patch('lambda_function.NVD_API_URL', url),
+            patch('lambda_function.NVD_BACKOFF_BASE_SECONDS', 0.01),
+            patch('lambda_function._nvd_rate_limiter', TokenBucket(rate_per_second=1000, capacity=1000)),
+        ]
+
+    def _run(self, url, func):
+        patches = self._patched_client(url)
+        for p in patches:
+            p.start()
+        try:
+            return func()
+        finally:
+            for p in reversed(patches):
+                p.stop()
+
+    def test_retries_throttled_requests_with_backoff(self):
+        responses = [(429, {'Retry-After': '0'}, {}), (503, {}, {}), (200, {}, NVD_OK_RESPONSE)]
+        with StubNVDServer(responses) as server:
+            result = self._run(server.url, lambda: get_cve_data_for_package("lodash", "4.17.20", "npm"))
+
+        assert [cve["cve_id"] for cve in result] == ["CVE-2021-23337"]
+        assert len(server.requests) == 3
+
+    def test_requests_are_counted(self):
+        lambda_function.invocation_metrics.reset()
+        responses = [(429, {'Retry-After': '0'}, {}), (200, {}, NVD_OK_RESPONSE)]
+        with StubNVDServer(responses) as server:
+            self._run(server.url, lambda: get_cve_data_for_package("lodash", "4.17.20", "npm"))
+
+        metrics = lambda_function.invocation_metrics
+        assert metrics.counters['NVDRequests'] == 2
+        assert metrics.counters['NVDErrors'] == 1 and metrics.counters['NVDThrottled'] == 1
+        assert len(metrics.samples['NVDRequestLatency'][1]) == 2
+        assert metrics.ratio('NVDErrors', 'NVDRequests') == 50.0
+        lambda_function.invocation_metrics.reset()
+
+    def test_connections_are_reused(self):
+        with StubNVDServer([(200, {}, {"vulnerabilities": []})]) as server:
+            self._run(server.url, lambda: [
+                get_cve_data_for_package(f"pkg{i}", "1.0.0", "npm") for i in range(5)
+            ])
+
+        assert len(server.requests) == 5
+        assert len(server.client_ports) == 1
+
+    def test_rate_limited_lookups_are_reported(self):
+        sbom_data = {"components": [
+            {"name": "lodash", "version": "4.17.20", "purl": "pkg:npm/lodash@4.17.20"}
+        ]}
+
+        with StubNVDServer([(403, {}, {})]) as server:
+            result = self._run(server.url, lambda: analyze_ofac(sbom_data, max_workers=1))
+
+        assert len(server.requests) == 4  # Initial attempt plus NVD_MAX_RETRIES
+        cve_analysis = result["cve_analysis"]
+        assert cve_analysis["lookup_complete"] is False
+        assert cve_analysis["rate_limited_lookups"] == 1
+        assert cve_analysis["lookup_failures"] == [
+            {"component": "lodash", "version": "4.17.20", "ecosystem": "npm", "reason": "rate_limited"}
+        ]
+        assert result["summary"]["cve_lookup_failures"] == 1
+        assert "CVE data incomplete" in result["executive_summary"]["recommendation"]
+
+    def test_client_errors_are_not_retried(self):
+        with StubNVDServer([(404, {}, {})]) as server:
+            result = self._run(server.url, lambda: get_cve_data_for_package("lodash", "4.17.20", "npm"))
+
+        assert result == []
+        assert len(server.requests) == 1
+
+    def test_token_bucket_limits_burst(self):
+        bucket = TokenBucket(rate_per_second=0.1, capacity=2)
+
+        assert bucket.acquire(timeout=0)
+        assert bucket.acquire(timeout=0)
+        assert not bucket.acquire(timeout=1)
+
+class TestVersionRangeMatching:
+    """Test version-range aware CVE matching."""
+
+    @staticmethod
+    def _cve(cve_id, *ranges):
+        return {"cve_id": cve_id, "cvss_score": 9.0, "severity": "CRITICAL", "affected": list(ranges)}
+
+    def test_interval_bounds(self):
+        index = VersionRangeIndex([
+            self._cve("CVE-A", {"start": "1.0", "start_inclusive": True, "end": "1.5", "end_inclusive": False}),
+            self._cve("CVE-B", {"start": "1.5", "start_inclusive": False, "end": "2.0", "end_inclusive": True}),
+            self._cve("CVE-C", {"start": "1.2", "start_inclusive": True, "end": "1.2", "end_inclusive": True},
+                      {"start": "3.0", "start_inclusive": True, "end": None, "end_inclusive": False}),
+            self._cve("CVE-D"),  # No range data: applies to every version
+        ])
+
+        matched = index.match(["0.9", "1.0", "1.2.0", "1.5", "1.5.1", "2.0", "2.0.1", "3.7", "not-a-version"])
+        ids = {v: [cve["cve_id"] for cve in cves] for v, cves in matched.items()}
+
+        assert ids["0.9"] == ["CVE-D"]
+        assert ids["1.0"] == ["CVE-A", "CVE-D"]
+        assert ids["1.2.0"] == ["CVE-A", "CVE-C", "CVE-D"]  # 1.2 == 1.2.0 under PEP 440
+        assert ids["1.5"] == ["CVE-D"]
+        assert ids["1.5.1"] == ["CVE-B", "CVE-D"]
+        assert ids["2.0"] == ["CVE-B", "CVE-D"]
+        assert ids["2.0.1"] == ["CVE-D"]
+        assert ids["3.7"] == ["CVE-C", "CVE-D"]
+        assert ids["not-a-version"] == ["CVE-A", "CVE-B", "CVE-C", "CVE-D"]
+        assert "affected" not in matched["1.0"][0]
+
+    def test_nvd_cpe_ranges_filter_online_results(self):
+        nvd_response = {"vulnerabilities": [
+            nvd_vulnerability("CVE-2023-32681", 7.5, "HIGH", "cpe:2.3:a:python:requests:*:*:*:*:*:python:*:*",
+                              versionStartIncluding="2.3.0", versionEndExcluding="2.31.0"),
+            # Keyword hits whose CPE data only names other products are dropped
+            nvd_vulnerability("CVE-2020-9999", 8.0, "HIGH", "cpe:2.3:a:other:other-requests:*:*:*:*:*:*:*:*"),
+            nvd_vulnerability("CVE-2021-1111", 9.1, "CRITICAL", "cpe:2.3:a:acme:other_product:*:*:*:*:*:*:*:*"),
+        ]}
+        # Without any CPE data the CVE cannot be ruled out and applies to every version
+        unconfigured = nvd_vulnerability("CVE-2022-0001", 7.0, "HIGH", "")
+        unconfigured["cve"]["configurations"] = []
+        nvd_response["vulnerabilities"].append(unconfigured)
+
+        with patch('lambda_function.request_nvd_cves', return_value=nvd_response) as mock_nvd:
+            old = get_cve_data_for_package("requests", "2.30.0", "pypi")
+            new = get_cve_data_for_package("requests", "2.31.0", "pypi")
+
+        assert [cve["cve_id"] for cve in old] == ["CVE-2023-32681", "CVE-2022-0001"]
+        assert [cve["cve_id"] for cve in new] == ["CVE-2022-0001"]
+        assert mock_nvd.call_count == 1  # Compiled range index is reused across versions
+
+    def test_large_version_batch(self):
+        cves = [self._cve(f"CVE-{i}", {"start": f"{i}.0", "start_inclusive": True,
+                                        "end": f"{i}.5", "end_inclusive": False}) for i in range(200)]
+        versions = [f"{major}.{minor}" for major in range(200) for minor in range(10)]
+
+        matched = VersionRangeIndex(cves).match(versions)
+
+        assert sum(len(cves) for cves in matched.values()) == 200 * 5
+        assert [cve["cve_id"] for cve in matched["42.4"]] == ["CVE-42"]
+        assert matched["42.5"] == []
+
+def nvd_vulnerability(cve_id, score, severity, criteria, last_modified="2024-01-01T00:00:00.000", **bounds):
+    """Build an NVD API 2.0 vulnerability record with one vulnerable CPE match."""
+    return {
+        "cve": {
+            "id": cve_id,
+            "published": "2023-12-01T00:00:00.000",
+            "lastModified": last_modified,
+            "vulnStatus": "Analyzed",
+            "descriptions": [{"lang": "en", "value": f"{cve_id} description"}],
+            "metrics": {"cvssMetricV31": [{"cvssData": {"baseScore": score, "baseSeverity": severity}}]},
+            "configurations": [{"nodes": [{"cpeMatch": [{"vulnerable": True, "criteria": criteria, **bounds}]}]}]
+        }
+    }
+
+class TestOfflineVulnerabilityDatabase:
+    """Test the offline vulnerability index, its importer and the CVE source switch."""
+
+    def _write_json(self, path, document):
+        path.write_text(json.dumps(document))
+        return str(path)
+
+    def _build_db(self, tmp_path):
+        nvd_feed = self._write_json(tmp_path / "nvd.json", {"vulnerabilities": [
+            nvd_vulnerability("CVE-2021-23337", 7.2, "HIGH",
+                              "cpe:2.3:a:lodash:lodash:*:*:*:*:*:node.js:*:*", versionEndExcluding="4.17.21"),
+            nvd_vulnerability("CVE-2019-10744", 9.1, "CRITICAL",
+                              "cpe:2.3:a:lodash:lodash:*:*:*:*:*:*:*:*", versionEndExcluding="4.17.12"),
+            nvd_vulnerability("CVE-2020-0001", 5.0, "MEDIUM",
+                              "cpe:2.3:a:lodash:lodash:*:*:*:*:*:node.js:*:*"),
+        ]})
+        osv_record = self._write_json(tmp_path / "osv.json", {
+            "id": "GHSA-j8r2-6x86-q33q",
+            "aliases": ["CVE-2023-32681"],
+            "modified": "2024-02-01T00:00:00Z",
+            "published": "2023-05-26T00:00:00Z",
+            "summary": "Unintended leak of Proxy-Authorization header",
+            "severity": [{"type": "CVSS_V3", "score": "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N"}],
+            "database_specific": {"severity": "MODERATE"},
+            "affected": [{
+                "package": {"ecosystem": "PyPI", "name": "requests"},
+                "ranges": [{"type": "ECOSYSTEM", "events": [{"introduced": "2.3.0"}, {"fixed": "2.31.0"}]}]
+            }]
+        })
+        db_path = str(tmp_path / "vulns.db")
+        assert vuln_db.main(["import", "--db", db_path, nvd_feed, osv_record]) == 0
+        return db_path
+
+    def test_cvss3_base_score(self):
+        assert cvss3_base_score("CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H") == 9.8
+        assert cvss3_base_score("CVSS:3.1/AV:N/AC:L/PR:L/UI:N/S:C/C:H/I:H/A:H") == 9.9
+        assert cvss3_base_score("CVSS:3.1/AV:L/AC:L/PR:L/UI:N/S:U/C:N/I:N/A:N") == 0.0
+        assert cvss3_base_score("not-a-vector") is None
+
+    def test_import_and_lookup(self, tmp_path):
+        database = VulnerabilityDatabase(self._build_db(tmp_path))
+
+        lodash = {cve["cve_id"]: cve for cve in database.lookup("npm", "lodash")}
+        assert set(lodash) == {"CVE-2021-23337", "CVE-2019-10744"}  # MEDIUM is not indexed
+        assert lodash["CVE-2021-23337"]["affected"] == [
+            {"start": None, "start_inclusive": True, "end": "4.17.21", "end_inclusive": False}
+        ]
+
+        # CPE matches without target_sw apply to every ecosystem
+        assert [cve["cve_id"] for cve in database.lookup("maven", "lodash")] == ["CVE-2019-10744"]
+
+        requests_cves = database.lookup("pypi", "Requests")
+        assert requests_cves[0]["cve_id"] == "CVE-2023-32681"
+        assert requests_cves[0]["cvss_score"] == 7.5  # Computed from the CVSS vector
+        assert requests_cves[0]["severity"] == "HIGH"
+        assert database.stats()["feeds"] == 2
+
+    def test_incremental_delta_import(self, tmp_path):
+        db_path = self._build_db(tmp_path)
+        database = VulnerabilityDatabase(db_path, readonly=False)
+
+        delta = self._write_json(tmp_path / "delta.json", {"vulnerabilities": [
+            # Newer revision re-scores the CVE
+            nvd_vulnerability("CVE-2021-23337", 9.8, "CRITICAL",
+                              "cpe:2.3:a:lodash:lodash:*:*:*:*:*:node.js:*:*",
+                              last_modified="2024-03-01T00:00:00.000", versionEndExcluding="4.17.21"),
+            # Stale revision must not overwrite the indexed one
+            nvd_vulnerability("CVE-2019-10744", 1.0, "HIGH",
+                              "cpe:2.3:a:lodash:lodash:*:*:*:*:*:*:*:*", last_modified="2019-01-01T00:00:00.000"),
+            {"cve": {"id": "CVE-2020-0001", "lastModified": "2024-03-01T00:00:00.000", "vulnStatus": "Rejected"}},
+        ]})
+        counters = database.import_feed(delta)
+
+        assert counters["updated"] == 1
+        assert counters["skipped"] == 1
+        lodash = {cve["cve_id"]: cve for cve in database.lookup("npm", "lodash")}
+        assert lodash["CVE-2021-23337"]["cvss_score"] == 9.8
+        assert lodash["CVE-2019-10744"]["cvss_score"] == 9.1
+
+        rejected = self._write_json(tmp_path / "rejected.json", {"vulnerabilities": [
+            {"cve": {"id": "CVE-2019-10744", "lastModified": "2024-04-01T00:00:00.000", "vulnStatus": "Rejected"}}
+        ]})
+        assert database.import_feed(rejected)["removed"] == 1
+        assert [cve["cve_id"] for cve in database.lookup("npm", "lodash")] == ["CVE-2021-23337"]
+
+    def test_offline_mode_makes_no_network_calls(self, tmp_path):
+        db_path = self._build_db(tmp_path)
+        sbom_data = {"components": [
+            {"name": "lodash", "version": "4.17.11", "purl": "pkg:npm/lodash@4.17.11"},
+            {"name": "lodash", "version": "4.17.20", "purl": "pkg:npm/lodash@4.17.20"},
+            {"name": "requests", "version": "2.30.0", "purl": "pkg:pypi/requests@2.30.0"},
+            {"name": "requests", "version": "2.31.0", "purl": "pkg:pypi/requests@2.31.0"}
+        ]}
+
+        with patch('lambda_function.CVE_SOURCE', 'offline'), \
+             patch('lambda_function.VULN_DB_PATH', db_path), \
+             patch('lambda_function._offline_vuln_db', None), \
+             patch('lambda_function.request_nvd_cves', side_effect=AssertionError("network call")):
+            assert lambda_function.default_cve_cache() is None
+            result = analyze_ofac(sbom_data)
+
+        # Only CVEs whose affected ranges contain each version are reported
+        vulnerable = {(c["name"], c["version"]): c["cve_count"] for c in result["cve_analysis"]["vulnerable_components"]}
+        assert vulnerable == {("lodash", "4.17.11"): 2, ("lodash", "4.17.20"): 1, ("requests", "2.30.0"): 1}
+        assert result["cve_analysis"]["total_cves_found"] == 4
+        assert result["cve_analysis"]["critical_cves"][0]["cve_id"] == "CVE-2019-10744"
+        assert "affected" not in result["cve_analysis"]["critical_cves"][0]
+        assert result["metadata"]["cve_source"]["active_source"] == "offline"
+
+    def test_maven_lookup_uses_group_and_artifact(self, tmp_path):
+        osv_record = self._write_json(tmp_path / "osv-maven.json", {
+            "id": "GHSA-jfh8-c2jp-5v3q",
+            "aliases": ["CVE-2021-44228"],
+            "modified": "2024-02-01T00:00:00Z",
+            "severity": [{"type": "CVSS_V3", "score": "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:C/C:H/I:H/A:H"}],
+            "affected": [{
+                "package": {"ecosystem": "Maven", "name": "org.apache.logging.log4j:log4j-core"},
+                "ranges": [{"type": "ECOSYSTEM", "events": [{"introduced": "2.0"}, {"fixed": "2.15.0"}]}]
+            }]
+        })
+        nvd_feed = self._write_json(tmp_path / "nvd-maven.json", {"vulnerabilities": [
+            nvd_vulnerability("CVE-2021-45046", 9.0, "CRITICAL",
+                              "cpe:2.3:a:apache:log4j-core:*:*:*:*:*:java:*:*", versionEndExcluding="2.16.0"),
+        ]})
+        db_path = str(tmp_path / "vulns.db")
+        assert vuln_db.main(["import", "--db", db_path, osv_record, nvd_feed]) == 0
+        database = VulnerabilityDatabase(db_path)
+
+        purl = "pkg:maven/org.apache.logging.log4j/log4j-core@2.14.1?type=jar"
+        package = vuln_db.package_lookup_name("maven", purl, "log4j-core")
+        assert package == "org.apache.logging.log4j:log4j-core"
+        # OSV rows match on group:artifact, NVD CPE rows on the artifactId
+        assert sorted(cve["cve_id"] for cve in database.lookup("maven", package)) == \
+            ["CVE-2021-44228", "CVE-2021-45046"]
+        assert [cve["cve_id"] for cve in database.lookup("maven", "log4j-core")] == ["CVE-2021-45046"]
+        # Another group's artifact of the same name does not get the OSV advisory
+        assert [cve["cve_id"] for cve in database.lookup("maven", "com.example:log4j-core")] == ["CVE-2021-45046"]
+
+        sbom_data = {"components": [{"name": "log4j-core", "version": "2.14.1", "purl": purl}]}
+        with patch('lambda_function.CVE_SOURCE', 'offline'), \
+             patch('lambda_function.VULN_DB_PATH', db_path), \
+             patch('lambda_function._offline_vuln_db', None):
+            result = analyze_ofac(sbom_data)
+        assert result["cve_analysis"]["total_cves_found"] == 2
+        assert result["cve_analysis"]["vulnerable_components"][0]["name"] == "log4j-core"
+
+    def test_hybrid_mode_falls_back_when_index_is_stale(self, tmp_path):
+        db_path = self._build_db(tmp_path)
+
+        with patch('lambda_function.CVE_SOURCE', 'hybrid'), \
+             patch('lambda_function.VULN_DB_PATH', db_path), \
+             patch('lambda_function._offline_vuln_db', None):
+            assert lambda_function.get_offline_vuln_db() is not None
+            with patch('lambda_function.VULN_DB_MAX_AGE_HOURS', 0):
+                assert lambda_function.get_offline_vuln_db() is None
+                with patch('lambda_function.request_nvd_cves', return_value={"vulnerabilities": []}) as mock_nvd:
+                    assert get_cve_data_for_package("lodash", "4.17.20", "npm") == []
+                assert mock_nvd.call_count == 1
+
+    def test_offline_mode_without_index_reports_failures(self):
+        sbom_data = {"components": [{"name": "lodash", "version": "4.17.20", "purl": "pkg:npm/lodash@4.17.20"}]}
+
+        with patch('lambda_function.CVE_SOURCE', 'offline'), \
+             patch('lambda_function.VULN_DB_PATH', '/nonexistent/vulns.db'), \
+             patch('lambda_function._offline_vuln_db', None):
+            result = analyze_ofac(sbom_data)
+
+        assert result["cve_analysis"]["lookup_failures"][0]["reason"] == "error"
+        assert result["metadata"]["cve_source"]["active_source"] == "unavailable"
+
+def streamed_sbom(components, **members):
+    """Serialize a CycloneDX-style document with components after the other members."""
+    return json.dumps({"bomFormat": "CycloneDX", **members, "components": components}).encode('utf-8')
+
+class TestStreamingSBOMReader:
+    """Test incremental parsing of large SBOM documents."""
+
+    def read_all(self, payload, chunk_size=7):
+        reader = StreamingSBOMReader(io.BytesIO(payload), chunk_size=chunk_size)
+        return reader, list(reader.components())
+
+    def test_matches_json_loads_across_chunk_boundaries(self):
+        components = [
+            {"name": f"pkg-{i}", "version": f"{i}.0.{i * 37}", "purl": f"pkg:npm/pkg-{i}@{i}.0.0",
+             "score": 1234567.125 + i, "tags": ["a,b", "}{", "\"quoted\"", "caf\u00e9 \u2603"]}
+            for i in range(25)
+        ]
+        payload = streamed_sbom(components, metadata={"tools": [{"name": "syft"}]}, serialNumber=12345)
+        expected = json.loads(payload)
+        for chunk_size in (1, 3, 7, 64, 4096):
+            reader, streamed = self.read_all(payload, chunk_size)
+            assert streamed == expected["components"]
+            assert reader.document == {k: v for k, v in expected.items() if k != "components"}
+            assert reader.has_components
+            assert reader.components_read == 25
+            assert reader.bytes_read == len(payload)
+
+    def test_members_after_components_and_bom(self):
+        payload = b'\xef\xbb\xbf { "components" : [ ] , "dependencies": [{"ref": "a"}], "version": 10 }\n'
+        reader, streamed = self.read_all(payload, chunk_size=2)
+        assert streamed == []
+        assert reader.has_components
+        assert reader.document == {"dependencies": [{"ref": "a"}], "version": 10}
+
+    def test_missing_components(self):
+        reader, streamed = self.read_all(b'{"bomFormat": "CycloneDX"}')
+        assert streamed == []
+        assert not reader.has_components
+        assert reader.document == {"bomFormat": "CycloneDX"}
+
+    @pytest.mark.parametrize("payload", [
+        b'{"components": [{"name": "a"} {"name": "b"}]}',
+        b'{"components": [{"name": "a"}',
+        b'{"components": []} trailing',
+        b'[1, 2, 3]',
+        b'',
+    ])
+    def test_invalid_json(self, payload):
+        with pytest.raises(json.JSONDecodeError):
+            self.read_all(payload)
+
+    def test_malformed_element_fails_without_reading_ahead(self):
+        bad = b'{"components": [{"name": "a", "version": 1.0.2, "purl": "pkg:npm/a@1"}, '
+        payload = bad + b', '.join(b'{"name": "filler"}' for _ in range(10000)) + b']}'
+        reader = StreamingSBOMReader(io.BytesIO(payload), chunk_size=64)
+        with pytest.raises(json.JSONDecodeError, match="Expecting ','"):
+            list(reader.components())
+        assert reader.bytes_read <= 128
+
+    def test_oversized_element_is_rejected(self):
+        payload = streamed_sbom([{"name": "a", "description": "x" * 5000}, {"name": "b"}])
+        reader = StreamingSBOMReader(io.BytesIO(payload), chunk_size=64, max_element_size=1024)
+        with pytest.raises(json.JSONDecodeError, match="exceeds 1024"):
+            list(reader.components())
+        assert reader.bytes_read < 4096
+        reader = StreamingSBOMReader(io.BytesIO(payload), chunk_size=64, max_element_size=8192)
+        assert [c["name"] for c in reader.components()] == ["a", "b"]
+
+    @patch('lambda_function.fetch_cve_candidates', return_value=[])
+    def test_streamed_analysis_matches_buffered(self, mock_candidates):
+        sbom = {
+            "components": [
+                {"name": f"lib{i}", "version": "1.0.0", "purl": f"pkg:pypi/lib{i}@1.0.0", "bom-ref": f"lib{i}",
+                 "dependencies": [{"ref": f"pkg:pypi/lib{i + 1}@1.0.0"}] if i < 9 else [],
+                 "properties": [{"name": "author_email", "value": "dev@example.ir" if i % 3 == 0 else "dev@example.com"}]}
+                for i in range(10)
+            ]
+        }
+        buffered = analyze_ofac(sbom)
+        reader = StreamingSBOMReader(io.BytesIO(json.dumps(sbom).encode('utf-8')), chunk_size=16)
+        with patch.object(lambda_function, 'CVE_PREFETCH_BATCH_SIZE', 3):
+            streamed = analyze_ofac(reader.document, components=reader.components())
+
+        for results in (buffered, streamed):
+            results.pop("analysis_timestamp")
+            results.pop("metadata")
+            results["executive_summary"].pop("analysis_timestamp")
+        assert streamed == buffered
+        assert streamed["components_analyzed"] == 10
+        assert streamed["dependency_analysis"]["max_depth"] == buffered["dependency_analysis"]["max_depth"]
+
+CYCLONEDX_XML_SBOM = b"""<?xml version="1.0" encoding="UTF-8"?>
+<bom xmlns="http://cyclonedx.org/schema/bom/1.5" version="1">
+  <metadata><component type="application" bom-ref="app"><name>app</name></component></metadata>
+  <components>
+    <component type="library" bom-ref="web">
+      <name>web</name><version>2.0.0</version><purl>pkg:npm/web@2.0.0</purl>
+    </component>
+    <component type="library" bom-ref="parser">
+      <name>parser</name><version>1.1.0</version><purl>pkg:pypi/parser@1.1.0</purl>
+      <properties>
+        <property name="author_email">dev@example.ir</property>
+        <property name="maintainer_email">ops@example.com</property>
+      </properties>
+    </component>
+    <component type="library" bom-ref="codec">
+      <name>codec</name><version>0.3.0</version><purl>pkg:maven/org.example/codec@0.3.0</purl>
+    </component>
+  </components>
+  <dependencies>
+    <dependency ref="app"><dependency ref="web"/></dependency>
+    <dependency ref="web"><dependency ref="parser"/></dependency>
+    <dependency ref="parser"><dependency ref="codec"/></dependency>
+  </dependencies>
+</bom>
+"""
+
+SPDX_TAG_VALUE_SBOM = b"""SPDXVersion: SPDX-2.3
+DataLicense: CC0-1.0
+SPDXID: SPDXRef-DOCUMENT
+DocumentComment: <text>Generated for tests.
+PackageName: not-a-package
+</text>
+
+PackageName: web
+SPDXID: web
+PackageVersion: 2.0.0
+PackageSupplier: NOASSERTION
+ExternalRef: PACKAGE-MANAGER purl pkg:npm/web@2.0.0
+
+PackageName: parser
+SPDXID: parser
+PackageVersion: 1.1.0
+PackageOriginator: Person: Dev (dev@example.ir)
+PackageSupplier: Organization: Example (ops@example.com)
+ExternalRef: PACKAGE-MANAGER purl pkg:pypi/parser@1.1.0
+
+PackageName: codec
+SPDXID: codec
+PackageVersion: 0.3.0
+ExternalRef: PACKAGE-MANAGER purl pkg:maven/org.example/codec@0.3.0
+
+FileName: ./LICENSE
+SPDXID: SPDXRef-File
+Relationship: SPDXRef-DOCUMENT DESCRIBES web
+Relationship: web DEPENDS_ON parser
+Relationship: codec DEPENDENCY_OF parser
+"""
+
+class TestSBOMFormats:
+    """Test format detection and normalization of CycloneDX and SPDX documents."""
+
+    cyclonedx_json = {
+        "bomFormat": "CycloneDX",
+        "specVersion": "1.5",
+        "components": [
+            {"bom-ref": "web", "name": "web", "version": "2.0.0", "purl": "pkg:npm/web@2.0.0"},
+            {"bom-ref": "parser", "name": "parser", "version": "1.1.0", "purl": "pkg:pypi/parser@1.1.0",
+             "licenses": [{"license": {"id": "MIT"}}],
+             "properties": [{"name": "author_email", "value": "dev@example.ir"},
+                            {"name": "maintainer_email", "value": "ops@example.com"}]},
+            {"bom-ref": "codec", "name": "codec", "version": "0.3.0", "purl": "pkg:maven/org.example/codec@0.3.0"}
+        ],
+        "dependencies": [{"ref": "app", "dependsOn": ["web"]}, {"ref": "web", "dependsOn": ["parser"]},
+                         {"ref": "parser", "dependsOn": ["codec"]}]
+    }
+    spdx_json = {
+        "spdxVersion": "SPDX-2.3",
+        "SPDXID": "SPDXRef-DOCUMENT",
+        "relationships": [
+            {"spdxElementId": "web", "relationshipType": "DEPENDS_ON", "relatedSpdxElement": "parser"},
+            {"spdxElementId": "codec", "relationshipType": "DEPENDENCY_OF", "relatedSpdxElement": "parser"},
+            {"spdxElementId": "SPDXRef-DOCUMENT", "relationshipType": "DESCRIBES", "relatedSpdxElement": "web"}
+        ],
+        "packages": [
+            {"SPDXID": "web", "name": "web", "versionInfo": "2.0.0", "supplier": "NOASSERTION",
+             "externalRefs": [{"referenceCategory": "PACKAGE-MANAGER", "referenceType": "purl",
+                               "referenceLocator": "pkg:npm/web@2.0.0"}]},
+            {"SPDXID": "parser", "name": "parser", "versionInfo": "1.1.0",
+             "originator": "Person: Dev (dev@example.ir)", "supplier": "Organization: Example (ops@example.com)",
+             "externalRefs": [{"referenceCategory": "PACKAGE-MANAGER", "referenceType": "purl",
+                               "referenceLocator": "pkg:pypi/parser@1.1.0"}]},
+            {"SPDXID": "codec", "name": "codec", "versionInfo": "0.3.0",
+             "externalRefs": [{"referenceCategory": "PACKAGE-MANAGER", "referenceType": "purl",
+                               "referenceLocator": "pkg:maven/org.example/codec@0.3.0"}]}
+        ]
+    }
+
+    def documents(self):
+        return {
+            CYCLONEDX_JSON: json.dumps(self.cyclonedx_json).encode('utf-8'),
+            CYCLONEDX_XML: CYCLONEDX_XML_SBOM,
+            SPDX_JSON: json.dumps(self.spdx_json).encode('utf-8'),
+            SPDX_TAG_VALUE: SPDX_TAG_VALUE_SBOM
+        }
+
+    def test_every_format_normalizes_to_the_same_records(self):
+        expected = [
+            ComponentRecord("web", "2.0.0", "pkg:npm/web@2.0.0", "web"),
+            ComponentRecord("parser", "1.1.0", "pkg:pypi/parser@1.1.0", "parser", "dev@example.ir", "ops@example.com"),
+            ComponentRecord("codec", "0.3.0", "pkg:maven/org.example/codec@0.3.0", "codec")
+        ]
+        for sbom_format, payload in self.documents().items():
+            assert detect_format(payload) == sbom_format
+            for chunk_size in (5, 4096):
+                detected, reader = open_sbom_reader(io.BytesIO(payload), chunk_size=chunk_size)
+                records = [ComponentRecord.from_cyclonedx(component) if isinstance(component, dict) else component
+                           for component in reader.components()]
+                assert detected == sbom_format
+                assert records == expected, sbom_format
+                assert reader.has_components
+                dependencies = {entry["ref"]: entry["dependsOn"] for entry in reader.document["dependencies"]}
+                assert dependencies["web"] == ["parser"] and dependencies["parser"] == ["codec"]
+            loaded_format, document = load_document(payload)
+            assert loaded_format == sbom_format
+            assert lambda_function.sbom_content_digest(document["components"], document["dependencies"]) == \
+                lambda_function.sbom_content_digest(expected, document["dependencies"])
+
+    def test_json_format_markers_beyond_the_sniffed_head(self):
+        comment = {"comment": "x" * (2 * SNIFF_BYTES)}
+        spdx_late = json.dumps({**comment, **self.spdx_json}).encode('utf-8')
+        cyclonedx_late = json.dumps({**comment, **self.cyclonedx_json}).encode('utf-8')
+        # Without spdxVersion in the head, any other SPDX-only key decides
+        assert detect_format(json.dumps({"SPDXID": "SPDXRef-DOCUMENT", **comment}).encode('utf-8')) == SPDX_JSON
+        assert detect_format(spdx_late[:SNIFF_BYTES]) == CYCLONEDX_JSON
+
+        for payload, sbom_format in ((spdx_late, SPDX_JSON), (cyclonedx_late, CYCLONEDX_JSON)):
+            _, reader = open_sbom_reader(io.BytesIO(payload), chunk_size=4096)
+            records = list(normalize_components(reader.components()))
+            assert reader.sbom_format == sbom_format
+            assert [record.name for record in records] == ["web", "parser", "codec"]
+            dependencies = {entry["ref"]: entry["dependsOn"] for entry in reader.document["dependencies"]}
+            assert dependencies["web"] == ["parser"] and dependencies["parser"] == ["codec"]
+            assert load_document(payload)[0] == sbom_format
+
+    @patch('lambda_function.fetch_cve_candidates', return_value=[])
+    def test_analysis_is_format_independent(self, mock_candidates):
+        reports = {}
+        for sbom_format, payload in self.documents().items():
+            report = analyze_ofac(load_document(payload)[1])
+            reports[sbom_format] = (report["summary"], report["ofac_risks"], report["dependency_analysis"]["max_depth"])
+        assert reports[CYCLONEDX_JSON][0]["ofac_risk_components"] == 1
+        assert reports[CYCLONEDX_JSON][2] == 2
+        assert all(report == reports[CYCLONEDX_JSON] for report in reports.values())
+
+    @pytest.mark.parametrize("payload", [
+        b'<?xml version="1.0"?><!DOCTYPE bom [<!ENTITY a "aaaa">]><bom><components/></bom>',
+        b'<bom><components><component><name>a</name></components></bom>',
+        b'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"></rdf:RDF>',
+        b'PackageName web\nSPDXVersion: SPDX-2.3\n',
+        b'just text',
+    ])
+    def test_invalid_documents(self, payload):
+        with pytest.raises(SBOMFormatError):
+            load_document(payload)
+
+    @staticmethod
+    def library(name, *nested, **fields):
+        component = {"bom-ref": name, "name": name, "version": "1.0.0", "purl": f"pkg:npm/{name}@1.0.0", **fields}
+        if nested:
+            component["components"] = list(nested)
+        return component
+
+    def test_walk_flattens_and_dedupes_nested_components(self):
+        shared = self.library("shared", self.library("shared-child"))
+        image = self.library("image", self.library("os-pkg", shared, self.library("tool")), dict(shared))
+        walked = [(component["name"], parent.refs() if parent else []) for component, parent in
+                  walk_components([image, self.library("app"), dict(self.library("app"), components=[shared]),
+                                   self.library("tool")])]
+        assert walked == [
+            ("image", []), ("os-pkg", ["image"]), ("shared", ["image", "os-pkg"]),
+            ("shared-child", ["image", "os-pkg", "shared"]), ("tool", ["image", "os-pkg"]),
+            # Top-level duplicates are kept; nested ones reached a second time, and top-level ones already
+            # seen nested, are not
+            ("app", []), ("app", [])
+        ]
+
+    def test_deep_nesting_does_not_recurse(self):
+        depth = 5 * sys.getrecursionlimit()
+        innermost = root = self.library("level-0")
+        for level in range(1, depth):
+            innermost["components"] = [self.library(f"level-{level}")]
+            innermost = innermost["components"][0]
+        records = list(normalize_components([root]))
+        assert len(records) == depth
+        assert records[-1].parent.depth == depth - 1
+        assert records[-1].parent.refs() == [f"level-{level}" for level in range(depth - 11, depth - 1)]
+
+        xml = (b'<bom xmlns="http://cyclonedx.org/schema/bom/1.5"><components>' +
+               b''.join(b'<component bom-ref="c%d"><name>c%d</name><components>' % (i, i) for i in range(depth)) +
+               b'</components></component>' * depth + b'</components></bom>')
+        _, document = load_document(xml)
+        assert len(document["components"]) == depth
+        with pytest.raises(SBOMFormatError):
+            # JSON decoding itself is bounded by the recursion limit; such documents are rejected cleanly
+            load_document(b'{"components": [' + b'{"components": [' * depth + b']}' * depth + b']}')
+
+    @patch('lambda_function.fetch_cve_candidates', return_value=[])
+    def test_nested_risks_report_their_parents(self, mock_candidates):
+        risky = self.library("risky", properties=[{"name": "author_email", "value": "dev@example.ir"}])
+        sbom = {"components": [self.library("image", self.library("os-pkg", risky)), self.library("app", risky)]}
+        results = analyze_ofac(sbom)
+        assert results["components_analyzed"] == 4
+        [risk] = results["ofac_risks"]
+        assert risk["name"] == "risky" and risk["parents"] == ["image", "os-pkg"]
+
+    @patch('lambda_function.fetch_cve_candidates', return_value=[])
+    def test_nested_components_hang_off_their_parent(self, mock_candidates):
+        sbom = {"components": [self.library("image", self.library("os-pkg", self.library("libc"))),
+                               self.library("app")]}
+        dependencies = analyze_ofac(sbom)["dependency_analysis"]
+        # Only the top-level components are roots
+        assert dependencies["direct_dependencies"] == 2
+        assert dependencies["depth_distribution"] == {"0": 2, "1": 1, "2": 1}
+        assert dependencies["longest_path"] == ["image", "os-pkg", "libc"]
+
+        # Declaring the same edge in dependencies[] does not count it twice
+        sbom["dependencies"] = [{"ref": "image", "dependsOn": ["os-pkg"]}]
+        assert analyze_ofac(sbom)["dependency_analysis"]["dependency_edges"] == 2
+
+@mock_aws
+class TestSanctionsRules:
+    """Test loading, validating and hot-reloading sanctions rule bundles."""
+
+    bundle = {
+        "version": "2024-06-01",
+        "keywords": {"pyongyang": "North Korea", "tehran": "Iran"},
+        "domain_countries": {"kp": "North Korea"},
+        "risk_weights": {"keyword_match": 0.5}
+    }
+
+    def write_bundle(self, path, bundle, mtime_ns):
+        path.write_text(json.dumps(bundle))
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_bundle_validation(self):
+        rules = SanctionsRuleSet.from_bundle(self.bundle, source="test", defaults=lambda_function.BUILTIN_SANCTIONS_RULES)
+        assert rules.version == "2024-06-01"
+        assert rules.risk_weights["keyword_match"] == 0.5
+        assert rules.risk_weights["domain_match"] == 0.8  # Taken from the defaults
+        assert rules.matcher.search("pyongyang-soft")[3] == "North Korea"
+
+        for broken in ({**self.bundle, "version": ""}, {**self.bundle, "keywords": {}},
+                       {**self.bundle, "risk_weights": {"keyword_match": 2}}, ["not", "an", "object"]):
+            with pytest.raises(RuleBundleError):
+                SanctionsRuleSet.from_bundle(broken, source="test")
+
+    def test_local_bundle_reloads_only_when_changed(self, tmp_path):
+        path = tmp_path / "rules.json"
+        self.write_bundle(path, self.bundle, 1_000_000_000)
+        reloaded = []
+        loader = RuleSetLoader(str(path), lambda_function.BUILTIN_SANCTIONS_RULES, refresh_seconds=0,
+                               on_reload=reloaded.append)
+
+        first = loader.get()
+        assert first.version == "2024-06-01"
+        assert loader.get() is first
+        assert loader.reloads == 1
+
+        self.write_bundle(path, {**self.bundle, "version": "2024-07-01"}, 2_000_000_000)
+        assert loader.get().version == "2024-07-01"
+        assert [rules.version for rules in reloaded] == ["2024-06-01", "2024-07-01"]
+
+        # A broken update keeps the last good rules
+        path.write_text("{not json")
+        assert loader.get().version == "2024-07-01"
+
+    def test_missing_bundle_falls_back_to_builtin_rules(self, tmp_path):
+        loader = RuleSetLoader(str(tmp_path / "missing.json"), lambda_function.BUILTIN_SANCTIONS_RULES)
+        assert loader.get() is lambda_function.BUILTIN_SANCTIONS_RULES
+
+    def test_s3_bundle_uses_conditional_get(self):
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="rules-bucket")
+        s3.put_object(Bucket="rules-bucket", Key="sanctions/rules.json", Body=json.dumps(self.bundle))
+        client = MagicMock(wraps=s3)
+        loader = RuleSetLoader("s3://rules-bucket/sanctions/rules.json", lambda_function.BUILTIN_SANCTIONS_RULES,
+                               s3_client=client, refresh_seconds=0)
+
+        first = loader.get()
+        assert first.version == "2024-06-01"
+        assert loader.get() is first
+        assert client.get_object.call_args.kwargs["IfNoneMatch"] == first.etag
+        assert loader.reloads == 1
+
+        s3.put_object(Bucket="rules-bucket", Key="sanctions/rules.json",
+                      Body=json.dumps({**self.bundle, "version": "2024-07-01"}))
+        assert loader.get().version == "2024-07-01"
+        assert loader.reloads == 2
+
+    @patch('lambda_function.fetch_cve_candidates', return_value=[])
+    def test_analysis_uses_active_rules(self, mock_candidates, tmp_path):
+        path = tmp_path / "rules.json"
+        self.write_bundle(path, self.bundle, 1_000_000_000)
+        loader = RuleSetLoader(str(path), lambda_function.BUILTIN_SANCTIONS_RULES, refresh_seconds=0,
+                               on_reload=lambda rules: lambda_function._domain_risk_memo.clear())
+        sbom = {"components": [{
+            "name": "lib", "version": "1.0", "purl": "pkg:pypi/lib@1.0",
+            "properties": [{"name": "author_email", "value": "dev@pyongyang-soft.com"}]
+        }]}
+
+        with patch.object(lambda_function, 'sanctions_rule_loader', loader):
+            results = analyze_ofac(sbom)
+            assert results["metadata"]["sanctions_rules"]["version"] == "2024-06-01"
+            [risk] = results["ofac_risks"]
+            assert risk["risk_factors"]["author_email_country"] == "North Korea"
+            assert risk["risk_factors"]["author_email_confidence"] == 0.5
+
+            # Cached domain verdicts are dropped when the bundle changes
+            self.write_bundle(path, {**self.bundle, "keywords": {"tehran": "Iran"}, "version": "2024-07-01"},
+                              2_000_000_000)
+            results = analyze_ofac(sbom)
+            assert results["metadata"]["sanctions_rules"]["version"] == "2024-07-01"
+            assert results["ofac_risks"] == []
+
+        assert analyze_ofac(sbom)["metadata"]["sanctions_rules"]["version"] == "builtin"
+
+class TestContentDigest:
+    """Test canonical SBOM content hashing."""
+
+    def test_digest_ignores_formatting_and_key_order(self):
+        components = [{"name": "a", "version": "1.0", "purl": "pkg:npm/a@1.0"}]
+        reordered = [{"purl": "pkg:npm/a@1.0", "version": "1.0", "name": "a"}]
+        digest = lambda_function.sbom_content_digest(components)
+        assert digest == lambda_function.sbom_content_digest(reordered, [])
+        assert digest != lambda_function.sbom_content_digest(components, [{"ref": "a", "dependsOn": []}])
+        assert digest != lambda_function.sbom_content_digest([dict(components[0], version="1.1")])
+
+class TestAnalysisSnapshot:
+    """Test incremental analysis snapshots and diffs."""
+
+    def snapshot(self, cves, timestamp="2024-06-01T00:00:00"):
+        snapshot = AnalysisSnapshot(timestamp, "sboms/app.json", "analysis/app_analysis.json")
+        for (name, version), ids in cves.items():
+            snapshot.packages.add((name, version, "npm"))
+            snapshot.cves[(name, version, "npm")] = [{"cve_id": cve_id, "severity": "HIGH"} for cve_id in ids]
+        return snapshot
+
+    def test_round_trip(self):
+        snapshot = self.snapshot({("left-pad", "1.0"): ["CVE-1"], ("lodash", "4.17.20"): []})
+        restored = AnalysisSnapshot.from_bytes(snapshot.to_bytes())
+        assert restored.packages == snapshot.packages
+        assert restored.cves == snapshot.cves
+        assert restored.output_key == "analysis/app_analysis.json"
+        assert restored.age_seconds(datetime(2024, 6, 1, 1)) == 3600
+
+    def test_lookup_times_round_trip(self):
+        snapshot = self.snapshot({("left-pad", "1.0"): ["CVE-1"], ("lodash", "4.17.20"): []})
+        snapshot.lookup_times[("left-pad", "1.0", "npm")] = "2024-05-31T00:00:00"
+        restored = AnalysisSnapshot.from_bytes(snapshot.to_bytes())
+        assert restored.lookup_age_seconds(("left-pad", "1.0", "npm"), datetime(2024, 6, 1)) == 86400
+        # Entries without their own fetch time date from the analysis
+        assert restored.lookup_age_seconds(("lodash", "4.17.20", "npm"), datetime(2024, 6, 1)) == 0
+
+        # Version 1 snapshots stored no fetch times
+        document = json.loads(gzip.decompress(snapshot.to_bytes()))
+        document['format_version'] = 1
+        document['cves'] = [row[:4] for row in document['cves']]
+        legacy = AnalysisSnapshot.from_bytes(gzip.compress(json.dumps(document).encode()))
+        assert legacy.cves == snapshot.cves
+        assert legacy.fetched_at(("left-pad", "1.0", "npm")) == "2024-06-01T00:00:00"
+
+    def test_diff_reports_new_and_resolved_cves(self):
+        previous = self.snapshot({("lodash", "4.17.20"): ["CVE-OLD"], ("left-pad", "1.0"): []})
+        current = self.snapshot({("lodash", "4.17.21"): [], ("left-pad", "1.0"): [], ("axios", "0.21.0"): ["CVE-NEW"]})
+        changes = diff_snapshots(previous, current)
+        assert changes["added"] == [{"name": "axios", "version": "0.21.0", "ecosystem": "npm"}]
+        assert changes["changed"][0]["versions"] == ["4.17.21"]
+        assert changes["removed_count"] == 0
+        assert changes["unchanged_count"] == 1
+        assert [cve["cve_id"] for cve in changes["new_cves"]] == ["CVE-NEW"]
+        assert changes["resolved_cves"] == [{"cve_id": "CVE-OLD", "severity": "HIGH", "component": "lodash"}]
+
+def create_component_index_table():
+    return boto3.resource('dynamodb', region_name='us-east-1').create_table(
+        TableName='ErasmusComponentIndex',
+        KeySchema=[{'AttributeName': 'package', 'KeyType': 'HASH'},
+                   {'AttributeName': 'entry', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'package', 'AttributeType': 'S'},
+                              {'AttributeName': 'entry', 'AttributeType': 'S'},
+                              {'AttributeName': 'sbom_id', 'AttributeType': 'S'},
+                              {'AttributeName': 'product', 'AttributeType': 'S'}],
+        GlobalSecondaryIndexes=[{'IndexName': 'sbom-index',
+                                 'KeySchema': [{'AttributeName': 'sbom_id', 'KeyType': 'HASH'}],
+                                 'Projection': {'ProjectionType': 'KEYS_ONLY'}},
+                                {'IndexName': 'product-index',
+                                 'KeySchema': [{'AttributeName': 'product', 'KeyType': 'HASH'},
+                                               {'AttributeName': 'entry', 'KeyType': 'RANGE'}],
+                                 'Projection': {'ProjectionType': 'INCLUDE',
+                                                'NonKeyAttributes': ['sbom_id', 'version', 'purl', 'name',
+                                                                     'source_key']}}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+@mock_aws
+class TestAWSClients:
+    """Test deferred imports and the low-level DynamoDB table wrapper."""
+
+    def test_import_defers_heavy_modules(self):
+        code = ("import sys, lambda_function; "
+                "print(sorted(m for m in ('boto3', 'botocore', 'requests', 'packaging.version') if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True, capture_output=True, text=True).stdout
+        assert output.strip().splitlines()[-1] == '[]'
+
+        lazy = LazyModule('colorsys')
+        assert not lazy.loaded
+        assert lazy.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+        assert lazy.loaded
+
+    def test_table_round_trip(self):
+        boto3.resource('dynamodb', region_name='us-east-1').create_table(
+            TableName='ErasmusSBOMAnalysisCache',
+            KeySchema=[{'AttributeName': 'sbom_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'sbom_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table = DynamoDBTable('ErasmusSBOMAnalysisCache')
+        table.put_item(Item={'sbom_id': 'a', 'summary': {'risk_level': 'LOW', 'total': 3}, 'tags': ['x', 'y']})
+        table.update_item(Key={'sbom_id': 'a'}, UpdateExpression='SET #status = :status',
+                          ExpressionAttributeNames={'#status': 'status'}, ExpressionAttributeValues={':status': 'DONE'})
+        item = table.get_item(Key={'sbom_id': 'a'})['Item']
+        assert item == {'sbom_id': 'a', 'summary': {'risk_level': 'LOW', 'total': Decimal(3)}, 'tags': ['x', 'y'],
+                        'status': 'DONE'}
+        assert 'Item' not in table.get_item(Key={'sbom_id': 'missing'})
+        with pytest.raises(TypeError):
+            table.put_item(Item={'sbom_id': 'b', 'score': 0.5})  # Floats are rejected, as by the resource
+
+        with table.batch_writer(overwrite_by_pkeys=['sbom_id']) as batch:
+            for index in range(30):
+                batch.put_item(Item={'sbom_id': f"cve#{index}", 'cves': '[]'})
+            batch.delete_item(Key={'sbom_id': 'a'})
+        response = batch_get_item(RequestItems={'ErasmusSBOMAnalysisCache': {
+            'Keys': [{'sbom_id': 'a'}, {'sbom_id': 'cve#0'}, {'sbom_id': 'cve#29'}]}})
+        assert sorted(item['sbom_id'] for item in response['Responses']['ErasmusSBOMAnalysisCache']) == [
+            'cve#0', 'cve#29']
+
+@mock_aws
+class TestComponentIndex:
+    """Test the purl -> SBOM inverted index and its API route."""
+
+    log4j = 'pkg:maven/org.apache.logging.log4j/log4j-core'
+
+    def setup_method(self, method):
+        self.table = create_component_index_table()
+        self.index = ComponentIndex(DynamoDBTable('ErasmusComponentIndex'))
+
+    def test_split_purl(self):
+        assert split_purl(f"{self.log4j}@2.14.1?type=jar#src") == (self.log4j, '2.14.1')
+        assert split_purl('pkg:npm/%40angular/core@16.0.0') == ('pkg:npm/%40angular/core', '16.0.0')
+        assert split_purl('pkg:pypi/requests') == ('pkg:pypi/requests', '')
+        assert split_purl('requests==2.0') is None
+
+    def test_version_prefix_and_exact_queries(self):
+        self.index.update('a.json', [(f"{self.log4j}@2.14.1", 'log4j-core'), ('pkg:pypi/requests@2.31.0', 'requests')])
+        self.index.update('b.json', [(f"{self.log4j}@2.14.0", 'log4j-core')])
+        self.index.update('c.json', [(f"{self.log4j}@2.17.1", 'log4j-core')])
+
+        assert self.index.query(self.log4j, '2.14')['sbom_ids'] == ['a.json', 'b.json']
+        assert self.index.query(self.log4j, '2.14.1', exact=True)['sbom_ids'] == ['a.json']
+        assert self.index.query(self.log4j, '2.14', exact=True)['count'] == 0
+        assert self.index.query(self.log4j)['sbom_ids'] == ['a.json', 'b.json', 'c.json']
+
+    def test_reprocessing_is_idempotent_and_drops_stale_entries(self):
+        components = [(f"{self.log4j}@2.14.1", 'log4j-core'), ('pkg:pypi/requests@2.31.0', 'requests')]
+        assert self.index.update('a.json', components) == {'entries': 2, 'removed': 0}
+        assert self.index.update('a.json', components + components) == {'entries': 2, 'removed': 0}
+        assert self.table.scan()['Count'] == 2
+
+        # log4j upgraded: the old version no longer points at this SBOM
+        upgraded = [(f"{self.log4j}@2.17.1", 'log4j-core'), ('pkg:pypi/requests@2.31.0', 'requests')]
+        assert self.index.update('a.json', upgraded)['removed'] == 1
+        assert self.index.query(self.log4j, '2.14')['count'] == 0
+        assert self.index.query(self.log4j, '2.17')['sbom_ids'] == ['a.json']
+        assert self.table.scan()['Count'] == 2
+
+    def test_pagination(self):
+        for number in range(5):
+            self.index.update(f"sbom-{number}.json", [(f"{self.log4j}@2.14.1", 'log4j-core')])
+        seen, token = [], None
+        while True:
+            page = self.index.query(self.log4j, '2.14', limit=2, next_token=token)
+            seen.extend(page['sbom_ids'])
+            token = page.get('next_token')
+            if not token:
+                break
+        assert sorted(seen) == [f"sbom-{number}.json" for number in range(5)]
+
+    def test_foreign_next_token_is_rejected(self):
+        for number in range(3):
+            self.index.update(f"sbom-{number}.json", [(f"{self.log4j}@2.14.1", 'log4j-core')])
+        token = self.index.query(self.log4j, '2.14', limit=1)['next_token']
+
+        def encode(key):
+            return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+        for bad_token in (encode({'package': self.log4j}), encode({'package': self.log4j, 'entry': 214}),
+                          encode([self.log4j, '2.14.1#sbom-0.json']),
+                          encode({'package': 'pkg:pypi/requests', 'entry': '2.14.1#sbom-0.json'}),
+                          'not base64!'):
+            with pytest.raises(ValueError):
+                self.index.query(self.log4j, '2.14', next_token=bad_token)
+        # Issued for a different version prefix
+        with pytest.raises(ValueError):
+            self.index.query(self.log4j, '2.17', next_token=token)
+
+        event = {'httpMethod': 'GET', 'path': '/components',
+                 'queryStringParameters': {'purl': f"{self.log4j}@2.14", 'next_token': encode({'package': 'x'})}}
+        with patch.object(lambda_function, 'COMPONENT_INDEX_TABLE', 'ErasmusComponentIndex'):
+            response = lambda_handler(event, None)
+        assert response['statusCode'] == 400
+        assert json.loads(response['body'])['error'] == 'Invalid next_token'
+
+    def test_api_route(self):
+        self.index.update('a.json', [(f"{self.log4j}@2.14.1", 'log4j-core')])
+        event = {'httpMethod': 'GET', 'path': '/components',
+                 'queryStringParameters': {'purl': f"{self.log4j}@2.14"}}
+        with patch.object(lambda_function, 'COMPONENT_INDEX_TABLE', 'ErasmusComponentIndex'):
+            response = lambda_handler(event, None)
+            missing = lambda_handler({**event, 'queryStringParameters': {}}, None)
+        assert response['statusCode'] == 200
+        assert response['headers']['Access-Control-Allow-Origin'] == '*'
+        assert json.loads(response['body'])['sbom_ids'] == ['a.json']
+        assert missing['statusCode'] == 400
+
+        disabled = lambda_handler(event, None)
+        assert disabled['statusCode'] == 404
+
+@mock_aws
+class TestDynamoDBCVECache:
+    """Test the DynamoDB-backed CVE result cache."""
+
+    def setup_method(self, method):
+        self.dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.table = self.dynamodb.create_table(
+            TableName='ErasmusSBOMAnalysisCache',
+            KeySchema=[{'AttributeName': 'sbom_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'sbom_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        self.cve = {
+            "cve_id": "CVE-2021-23337",
+            "cvss_score": 7.2,
+            "severity": "HIGH",
+            "description": "Command injection",
+            "published_date": "2021-02-15T13:15:12.000",
+            "last_modified": "2021-02-15T13:15:12.000"
+        }
+
+    def test_round_trip_and_counters(self):
+        cache = DynamoDBCVECache(ttl_seconds=3600)
+        cache.put_many({("lodash", "4.17.20", "npm"): [self.cve], ("left-pad", "1.3.0", "npm"): []})
+
+        result = cache.get_many([("lodash", "4.17.20", "npm"), ("left-pad", "1.3.0", "npm"), ("react", "18.0.0", "npm")])
+
+        assert result[("lodash", "4.17.20", "npm")] == [self.cve]
+        assert result[("left-pad", "1.3.0", "npm")] == []
+        assert ("react", "18.0.0", "npm") not in result
+        stats = cache.stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["writes"] == 2
+
+        item = self.table.get_item(Key={'sbom_id': 'cve#npm#lodash#4.17.20'})['Item']
+        assert item['record_type'] == 'cve_cache'
+
+    def test_expired_entries_are_misses(self):
+        self.table.put_item(Item={
+            'sbom_id': DynamoDBCVECache.cache_key("lodash", "4.17.20", "npm"),
+            'cves': json.dumps([self.cve]),
+            'expires_at': 1
+        })
+
+        cache = DynamoDBCVECache(ttl_seconds=3600)
+        assert cache.get_many([("lodash", "4.17.20", "npm")]) == {}
+        assert cache.stats()["expired"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_batch_read_beyond_single_request_limit(self):
+        keys = [(f"pkg{i}", "1.0.0", "npm") for i in range(250)]
+        cache = DynamoDBCVECache(ttl_seconds=3600)
+        cache.put_many({key: [] for key in keys})
+
+        assert len(DynamoDBCVECache(ttl_seconds=3600).get_many(keys)) == 250
+
+    def test_prefetch_reads_through_and_writes_back(self):
+        cache = DynamoDBCVECache(ttl_seconds=3600)
+        cache.put_many({("lodash", "4.17.20", "npm"): [self.cve]})
+
+        def lookup(name, ecosystem):
+            if name == "flaky":
+                raise CVELookupError("NVD API returned HTTP 503")
+            return []
+
+        keys = [("lodash", "4.17.20", "npm"), ("react", "18.0.0", "npm"), ("flaky", "1.0.0", "pypi")]
+        with patch('lambda_function.fetch_cve_candidates', side_effect=lookup) as mock_cve_func:
+            result = prefetch_cve_data(keys, max_workers=2, cve_cache=cache)
+
+        assert mock_cve_func.call_count == 2
+        assert result == {keys[0]: [self.cve], keys[1]: [], keys[2]: []}
+
+        # Failed lookups are not cached, successful ones are
+        cached = DynamoDBCVECache(ttl_seconds=3600).get_many(keys)
+        assert set(cached) == {keys[0], keys[1]}
+
+    def test_disabled_cache_skips_dynamodb(self):
+        cache = DynamoDBCVECache(ttl_seconds=0)
+        cache.put_many({("lodash", "4.17.20", "npm"): [self.cve]})
+
+        assert cache.get_many([("lodash", "4.17.20", "npm")]) == {}
+        assert self.table.scan()['Count'] == 0
+
+    def test_analysis_metadata_reports_cache_stats(self):
+        sbom_data = {"components": [{"name": "lodash", "version": "4.17.20", "purl": "pkg:npm/lodash@4.17.20"}]}
+
+        with patch('lambda_function.fetch_cve_candidates', return_value=[self.cve]):
+            first = analyze_ofac(sbom_data, cve_cache=DynamoDBCVECache(ttl_seconds=3600))
+            clear_memo_caches()  # Simulate a cold container
+            second = analyze_ofac(sbom_data, cve_cache=DynamoDBCVECache(ttl_seconds=3600))
+
+        assert first["metadata"]["cve_cache"]["misses"] == 1
+        assert second["metadata"]["cve_cache"]["hits"] == 1
+        assert second["metadata"]["cve_cache"]["hit_rate"] == 1.0
+        assert second["cve_analysis"]["high_cves"][0]["cve_id"] == "CVE-2021-23337"
+
+@mock_aws
+class TestResultWriter:
+    """Test streamed, compressed analysis uploads to S3."""
+
+    def setup_method(self, method):
+        self.s3_client = boto3.client('s3', region_name='us-east-1')
+        self.bucket = 'results-bucket'
+        self.s3_client.create_bucket(Bucket=self.bucket)
+        self.results = {
+            "summary": {"risk_level": "HIGH", "total_components": 3},
+            "ofac_risks": [{"name": f"pkg{i}", "risk_score": 0.9} for i in range(3)],
+            "cve_analysis": {"critical_cves": [{"id": "CVE-2024-0001"}], "high_cves": [], "total_cves_found": 1},
+            "analysis_time": datetime(2024, 1, 1)
+        }
+
+    def large_results(self, count=45000):
+        """About 12 MB of poorly compressible JSON, enough for several gzip parts."""
+        rng = random.Random(3)
+        return {"summary": {"risk_level": "LOW"},
+                "ofac_risks": [{"name": f"pkg{i}", "digest": base64.b64encode(rng.randbytes(192)).decode('ascii')}
+                               for i in range(count)]}
+
+    def fetch(self, key):
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        return response, response['Body'].read()
+
+    def test_small_result_uses_single_put(self):
+        stats = upload_analysis(self.s3_client, self.bucket, 'analysis/small.json', self.results,
+                                metadata={'risk-level': 'HIGH'})
+        response, body = self.fetch('analysis/small.json')
+        assert json.loads(body) == json.loads(json.dumps(self.results, default=str))
+        assert body == json.dumps(self.results, indent=2, default=str).encode('utf-8')
+        assert response['ContentType'] == 'application/json'
+        assert response['Metadata'] == {'risk-level': 'HIGH'}
+        assert stats['parts'] == 0
+
+    def test_compact_output(self):
+        pretty = upload_analysis(self.s3_client, self.bucket, 'pretty.json', self.results)
+        compact = upload_analysis(self.s3_client, self.bucket, 'compact.json', self.results, pretty=False)
+        _, body = self.fetch('compact.json')
+        assert json.loads(body) == json.loads(json.dumps(self.results, default=str))
+        assert compact['bytes_uploaded'] < pretty['bytes_uploaded']
+
+    def test_multipart_gzip_round_trip(self):
+        results = self.large_results()
+        stats = upload_analysis(self.s3_client, self.bucket, 'big.json', results, pretty=False,
+                                content_encoding='gzip')
+        response, body = self.fetch('big.json')
+        assert stats['parts'] >= 2
+        assert response['ContentEncoding'] == 'gzip'
+        assert stats['bytes_uploaded'] == len(body) < stats['bytes_serialized']
+        assert json.loads(gzip.decompress(body)) == results
+
+    def test_ndjson_records(self):
+        stats = upload_analysis(self.s3_client, self.bucket, 'result.ndjson', self.results, output_format='ndjson')
+        response, body = self.fetch('result.ndjson')
+        records = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        assert response['ContentType'] == 'application/x-ndjson'
+        assert [r['record_type'] for r in records] == ['analysis', 'ofac_risk', 'ofac_risk', 'ofac_risk', 'critical_cve']
+        assert 'ofac_risks' not in records[0]
+        assert records[0]['cve_analysis'] == {"total_cves_found": 1}
+        assert records[4]['id'] == 'CVE-2024-0001'
+        # The caller's results are left untouched
+        assert len(self.results["cve_analysis"]["critical_cves"]) == 1
+        assert stats['format'] == 'ndjson'
+
+    def test_failed_upload_is_aborted(self):
+        with pytest.raises(RuntimeError):
+            with S3MultipartWriter(self.s3_client, self.bucket, 'partial.json') as writer:
+                writer.write(os.urandom(6 * 1024 * 1024))
+                raise RuntimeError("serialization failed")
+        assert self.s3_client.list_multipart_uploads(Bucket=self.bucket).get('Uploads', []) == []
+        assert 'Contents' not in self.s3_client.list_objects_v2(Bucket=self.bucket)
+
+    def test_zstd_falls_back_to_gzip_without_zstandard(self):
+        with patch.object(result_writer, 'zstandard', None):
+            stats = upload_analysis(self.s3_client, self.bucket, 'fallback.json', self.results, content_encoding='zstd')
+        response, body = self.fetch('fallback.json')
+        assert stats['content_encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(body))["summary"]["risk_level"] == "HIGH"
+
+    def test_zstd_round_trip(self):
+        zstandard = pytest.importorskip('zstandard')
+        upload_analysis(self.s3_client, self.bucket, 'result.json', self.results, content_encoding='zstd')
+        response, body = self.fetch('result.json')
+        assert response['ContentEncoding'] == 'zstd'
+        assert json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(body))["summary"]["total_components"] == 3
+
+    def test_unsupported_options(self):
+        with pytest.raises(ValueError):
+            upload_analysis(self.s3_client, self.bucket, 'x.json', self.results, content_encoding='brotli')
+        with pytest.raises(ValueError):
+            upload_analysis(self.s3_client, self.bucket, 'x.json', self.results, output_format='xml')
+
+@mock_aws
+class TestAsyncJobs:
+    """Test the API Gateway submit/poll job mode end to end."""
+
+    def setup_method(self, method):
+        self.s3_client = boto3.client('s3', region_name='us-east-1')
+        self.s3_client.create_bucket(Bucket='jobs-bucket')
+        boto3.resource('dynamodb', region_name='us-east-1').create_table(
+            TableName='ErasmusSBOMAnalysisCache',
+            KeySchema=[{'AttributeName': 'sbom_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'sbom_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        self.sbom = {"components": [
+            {"name": "requests", "version": "2.0.0", "purl": "pkg:pypi/requests@2.0.0",
+             "properties": [{"name": "author_email", "value": "dev@example.ir"}]},
+            {"name": "left-pad", "version": "1.0.0", "purl": "pkg:npm/left-pad@1.0.0"}
+        ]}
+        self.patches = [
+            patch.object(lambda_function, 'S3_BUCKET_NAME', 'jobs-bucket'),
+            patch('lambda_function.fetch_cve_candidates', return_value=[]),
+        ]
+        for p in self.patches:
+            p.start()
+        self.invoke = patch.object(lambda_function.get_client('lambda'), 'invoke').start()
+        self.patches.append(self.invoke)
+        self.context = MagicMock(aws_request_id='job-request', function_name='sbom-analyzer')
+
+    def teardown_method(self, method):
+        for p in self.patches:
+            p.stop()
+
+    def submit(self, path='/jobs', body=None):
+        event = {'httpMethod': 'POST', 'path': path, 'body': json.dumps(body or {'sbom': self.sbom})}
+        return lambda_handler(event, self.context)
+
+    def poll(self, job_id):
+        event = {'httpMethod': 'GET', 'path': f'/jobs/{job_id}', 'pathParameters': {'job_id': job_id}}
+        response = lambda_handler(event, self.context)
+        return response['statusCode'], json.loads(response['body'])
+
+    def run_background_invocation(self):
+        payload = json.loads(self.invoke.call_args.kwargs['Payload'])
+        return lambda_handler(payload, self.context)
+
+    def test_submit_and_poll(self):
+        response = self.submit()
+        assert response['statusCode'] == 202
+        job_id = json.loads(response['body'])['job_id']
+        assert self.invoke.call_args.kwargs['InvocationType'] == 'Event'
+        assert self.invoke.call_args.kwargs['FunctionName'] == 'sbom-analyzer'
+        assert self.poll(job_id) == (200, {'job_id': job_id, 'status': 'QUEUED',
+                                           'submitted_at': json.loads(response['body'])['submitted_at'],
+                                           'updated_at': json.loads(response['body'])['submitted_at']})
+
+        assert self.run_background_invocation()['statusCode'] == 200
+
+        status_code, job = self.poll(job_id)
+        assert status_code == 200
+        assert job['status'] == 'COMPLETE'
+        assert job['summary']['total_components'] == 2
+        assert job['result']['metadata']['job_id'] == job_id
+        assert job['result']['summary'] == job['summary']
+        assert len(job['result']['ofac_risks']) == 1
+
+    def test_async_flag_and_sync_results_match(self):
+        sync = lambda_handler({'httpMethod': 'POST', 'path': '/analyze', 'body': json.dumps({'sbom': self.sbom})},
+                              self.context)
+        queued = lambda_handler({'httpMethod': 'POST', 'path': '/analyze', 'queryStringParameters': {'mode': 'async'},
+                                 'body': json.dumps({'sbom': self.sbom})}, self.context)
+        assert sync['statusCode'] == 200
+        assert queued['statusCode'] == 202
+        self.run_background_invocation()
+        _, job = self.poll(json.loads(queued['body'])['job_id'])
+        assert job['result']['ofac_risks'] == json.loads(sync['body'])['ofac_risks']
+
+    def test_large_result_is_returned_as_url(self):
+        job_id = json.loads(self.submit(body={'sbom': self.sbom, 'mode': 'async'})['body'])['job_id']
+        self.run_background_invocation()
+        with patch.object(lambda_function, 'JOB_INLINE_RESULT_MAX_BYTES', 10):
+            _, job = self.poll(job_id)
+        assert 'result' not in job
+        assert f'jobs/{job_id}/result.json' in job['result_url']
+
+    def test_failed_analysis_is_reported(self):
+        job_id = json.loads(self.submit()['body'])['job_id']
+        with patch('lambda_function.analyze_ofac', side_effect=RuntimeError("analysis exploded")):
+            assert self.run_background_invocation()['statusCode'] == 500
+        _, job = self.poll(job_id)
+        assert job['status'] == 'FAILED'
+        assert job['error'] == 'analysis exploded'
+
+    def test_dispatch_failure_marks_job_failed(self):
+        self.invoke.side_effect = RuntimeError("throttled")
+        response = self.submit()
+        assert response['statusCode'] == 500
+        _, job = self.poll(json.loads(response['body'])['job_id'])
+        assert job['status'] == 'FAILED'
+
+    def test_unknown_job(self):
+        status_code, body = self.poll('does-not-exist')
+        assert status_code == 404
+
 @mock_aws
 class TestLambdaHandler:
     """Test Lambda handler functionality."""
@@ -278,6 +2048,13 @@ class TestLambdaHandler:
                 }
             ]
         }
+
+        # Keep handler tests independent of live NVD availability
+        self.cve_patch = patch('lambda_function.fetch_cve_candidates', return_value=[])
+        self.cve_patch.start()
+
+    def teardown_method(self, method):
+        self.cve_patch.stop()
     
     def test_s3_event_trigger(self):
         """Test Lambda handler with S3 event."""
@@ -309,6 +2086,7 @@ class TestLambdaHandler:
         body = json.loads(response['body'])
         assert 'summary' in body
         assert body['summary']['total_components'] == 1
+        assert 'cve_cache' in body['metadata']
     
     def test_invalid_file_format(self):
         """Test handler with non-JSON file."""
@@ -366,5 +2144,391 @@ class TestLambdaHandler:
         
         assert response['statusCode'] == 200
 
+    def upload_and_invoke(self, key, body):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=body)
+        context = MagicMock()
+        context.aws_request_id = 'test-request-id'
+        with patch.dict(os.environ, {'DDB_TABLE_NAME': 'ErasmusSBOMAnalysisCache'}):
+            return lambda_handler({'bucket': self.bucket_name, 'key': key}, context)
+
+    def test_invocation_emits_stage_metrics(self, capsys):
+        lambda_function.invocation_metrics.reset()
+        with patch.dict(os.environ, {'AWS_LAMBDA_FUNCTION_NAME': 'sbom-analyzer'}):
+            response = self.upload_and_invoke('sboms/timed.json', json.dumps(self.sample_sbom))
+        assert response['statusCode'] == 200
+
+        stages = json.loads(response['body'])['metadata']['stages']
+        for stage in ('s3_read', 'json_parse', 'component_read', 'cve_lookup', 'risk_scoring',
+                      'dependency_analysis', 'output_write', 'audit_write'):
+            assert stages[stage]['calls'] >= 1
+        stored = json.loads(self.s3_client.get_object(
+            Bucket=self.bucket_name, Key=json.loads(response['body'])['output_key'])['Body'].read())
+        assert 'cve_lookup' in stored['metadata']['stages']
+
+        emf_lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+        assert len(emf_lines) == 1
+        document = emf_lines[0]
+        assert document['FunctionName'] == 'sbom-analyzer'
+        assert document['_aws']['CloudWatchMetrics'][0]['Namespace'] == lambda_function.METRICS_NAMESPACE
+        assert document['SBOMsAnalyzed'] == 1 and document['ComponentsAnalyzed'] == 1
+        assert 'Stage.cve_lookup' in document and 'ComponentsPerSecond' in document
+        # Emitting starts the next invocation from zero
+        assert lambda_function.invocation_metrics.is_empty()
+
+        with patch.object(lambda_function, 'METRICS_ENABLED', False):
+            self.upload_and_invoke('sboms/timed.json', json.dumps(self.sample_sbom))
+        assert '"_aws"' not in capsys.readouterr().out
+
+    def test_analysis_updates_component_index(self):
+        index_table = create_component_index_table()
+        sbom = dict(self.sample_sbom, components=self.sample_sbom["components"] + [
+            {"name": "log4j-core", "version": "2.14.1", "purl": "pkg:maven/org.apache.logging.log4j/log4j-core@2.14.1"}])
+        with patch.object(lambda_function, 'COMPONENT_INDEX_TABLE', 'ErasmusComponentIndex'):
+            assert self.upload_and_invoke('sboms/indexed.json', json.dumps(sbom))['statusCode'] == 200
+            # Served from the stored analysis, and streamed: the entries stay the same
+            assert json.loads(self.upload_and_invoke('sboms/indexed.json', json.dumps(sbom))['body'])['cache']['hit']
+            with patch.object(lambda_function, 'SBOM_STREAMING_THRESHOLD_BYTES', 0), \
+                    patch.object(lambda_function, 'DEDUP_FRESHNESS_SECONDS', 0):
+                assert self.upload_and_invoke('sboms/indexed.json', json.dumps(sbom))['statusCode'] == 200
+
+        items = index_table.scan()['Items']
+        assert sorted(item['entry'] for item in items) == ['1.0.0#indexed.json', '2.14.1#indexed.json']
+        assert {item['source_key'] for item in items} == {'sboms/indexed.json'}
+
+    def run_rescan(self, tmp_path, *events):
+        """Index a vulnerable and a patched log4j SBOM, then run the re-scan events against an NVD delta feed."""
+        create_component_index_table()
+        log4j = 'pkg:maven/org.apache.logging.log4j/log4j-core'
+        for sbom_id, version in (('vulnerable.json', '2.14.1'), ('patched.json', '2.17.1')):
+            sbom = {"bomFormat": "CycloneDX",
+                    "components": [{"name": "log4j-core", "version": version, "purl": f"{log4j}@{version}"}]}
+            with patch.object(lambda_function, 'COMPONENT_INDEX_TABLE', 'ErasmusComponentIndex'):
+                assert self.upload_and_invoke(f'sboms/{sbom_id}', json.dumps(sbom))['statusCode'] == 200
+
+        vulnerability = {"cve": {
+            "id": "CVE-2021-44228",
+            "lastModified": (datetime.utcnow() - timedelta(hours=1)).isoformat(),
+            "metrics": {"cvssMetricV31": [{"cvssData": {"baseScore": 10.0, "baseSeverity": "CRITICAL"}}]},
+            "descriptions": [{"lang": "en", "value": "JNDI lookup RCE"}],
+            "configurations": [{"nodes": [{"cpeMatch": [{
+                "vulnerable": True, "criteria": "cpe:2.3:a:apache:log4j-core:*:*:*:*:*:*:*:*",
+                "versionStartIncluding": "2.0", "versionEndExcluding": "2.15.0"}]}]}]
+        }}
+        feed = tmp_path / 'nvd-delta.json'
+        feed.write_text(json.dumps({"vulnerabilities": [vulnerability]}))
+        candidates = vuln_db.parse_nvd_vulnerability(vulnerability)[2]
+
+        context = MagicMock()
+        context.aws_request_id = 'rescan-request-id'
+        with patch.object(lambda_function, 'COMPONENT_INDEX_TABLE', 'ErasmusComponentIndex'), \
+                patch.object(lambda_function, 'S3_BUCKET_NAME', self.bucket_name), \
+                patch.object(lambda_function, 'CVE_RESCAN_FEED_PATH', str(feed)), \
+                patch('lambda_function.fetch_cve_candidates', return_value=candidates):
+            return [lambda_handler(event, context) for event in events]
+
+    def test_cve_rescan_reanalyzes_only_affected_sboms(self, tmp_path):
+        event = {'source': 'aws.events', 'detail-type': 'Scheduled Event', 'detail': {}}
+        response, repeat = self.run_rescan(tmp_path, event, event)
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['cves_modified'] == 1
+        assert [result['sbom_id'] for result in body['results']] == ['vulnerable.json']
+        # The cached empty lookup from the first analysis was dropped, so the new CVE is reported
+        assert body['results'][0]['summary']['critical_cves'] == 1
+        assert self.table.get_item(Key={'sbom_id': 'vulnerable.json'})['Item']['summary']['critical_cves'] == 1
+        assert self.table.get_item(Key={'sbom_id': 'patched.json'})['Item']['summary']['critical_cves'] == 0
+
+        # The watermark moved past the CVE's modification time
+        assert json.loads(repeat['body'])['sboms_rescanned'] == 0
+        assert 'window_end' in self.table.get_item(Key={'sbom_id': 'sync#cve-rescan'})['Item']
+
+    def test_cve_rescan_validates_since(self, tmp_path):
+        future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+        since = (datetime.utcnow() - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        responses = self.run_rescan(tmp_path, *({'cve_rescan': {'since': value}}
+                                                for value in ('last tuesday', 20240131, future, since)))
+
+        assert [response['statusCode'] for response in responses] == [400, 400, 400, 200]
+        assert "Invalid 'since' 'last tuesday'" in json.loads(responses[0]['body'])['error']
+        assert 'in the future' in json.loads(responses[2]['body'])['error']
+        assert json.loads(responses[3]['body'])['cves_modified'] == 1
+
+    def test_cve_rescan_continues_when_cache_invalidation_fails(self, tmp_path, caplog):
+        event = {'source': 'aws.events', 'detail-type': 'Scheduled Event', 'detail': {}}
+        with patch.object(lambda_function.DynamoDBCVECache, 'invalidate', side_effect=RuntimeError('throttled')):
+            response, = self.run_rescan(tmp_path, event)
+
+        assert response['statusCode'] == 200
+        # The stale cached lookup is bypassed, not reused
+        assert json.loads(response['body'])['results'][0]['summary']['critical_cves'] == 1
+        assert 'CVE cache invalidation failed' in caplog.text
+
+    def test_large_sbom_is_streamed(self):
+        """SBOMs above the streaming threshold are analyzed without buffering the object."""
+        sbom = dict(self.sample_sbom, components=self.sample_sbom["components"] * 50)
+        with patch.object(lambda_function, 'SBOM_STREAMING_THRESHOLD_BYTES', 0):
+            response = self.upload_and_invoke('sboms/large.json', json.dumps(sbom))
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['metadata']['ingestion'] == 'streaming'
+        assert body['summary']['total_components'] == 50
+        assert body['summary']['ofac_risk_components'] == 50
+
+    def test_xml_and_spdx_uploads(self):
+        with patch.object(lambda_function, 'SBOM_STREAMING_THRESHOLD_BYTES', 0):
+            xml = self.upload_and_invoke('sboms/app.xml', CYCLONEDX_XML_SBOM)
+        spdx = self.upload_and_invoke('sboms/app.spdx', SPDX_TAG_VALUE_SBOM)
+        for response, sbom_format in ((xml, 'cyclonedx-xml'), (spdx, 'spdx-tag-value')):
+            assert response['statusCode'] == 200
+            body = json.loads(response['body'])
+            assert body['metadata']['sbom_format'] == sbom_format
+            assert body['summary']['total_components'] == 3
+            assert body['summary']['ofac_risk_components'] == 1
+        assert json.loads(spdx['body'])['output_key'].startswith('analysis/app_analysis_')
+
+        # spdxVersion past the sniffed head: the streaming reader settles the format from packages[]
+        late = json.dumps({"comment": "x" * (2 * SNIFF_BYTES), **TestSBOMFormats.spdx_json})
+        with patch.object(lambda_function, 'SBOM_STREAMING_THRESHOLD_BYTES', 0), \
+                patch.object(lambda_function, 'DEDUP_FRESHNESS_SECONDS', 0):
+            body = json.loads(self.upload_and_invoke('sboms/late.spdx.json', late)['body'])
+        assert body['metadata']['sbom_format'] == 'spdx-json'
+        assert body['summary']['total_components'] == 3
+
+    def test_streamed_sbom_validation(self):
+        with patch.object(lambda_function, 'SBOM_STREAMING_THRESHOLD_BYTES', 0):
+            missing = self.upload_and_invoke('sboms/missing.json', json.dumps({"bomFormat": "CycloneDX"}))
+            invalid = self.upload_and_invoke('sboms/invalid.json', '{"components": [{"name": "a"},')
+        assert missing['statusCode'] == 400
+        assert invalid['statusCode'] == 400
+
+    def test_compressed_output(self):
+        with patch.object(lambda_function, 'ANALYSIS_OUTPUT_ENCODING', 'gzip'), \
+                patch.object(lambda_function, 'ANALYSIS_OUTPUT_PRETTY', False):
+            response = self.upload_and_invoke('sboms/gzip.json', json.dumps(self.sample_sbom))
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        stored = self.s3_client.get_object(Bucket=self.bucket_name, Key=body['output_key'])
+        assert stored['ContentEncoding'] == 'gzip'
+        assert body['output']['content_encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(stored['Body'].read()))['summary']['total_components'] == 1
+
+    def s3_record(self, key):
+        return {'eventSource': 'aws:s3', 's3': {'bucket': {'name': self.bucket_name}, 'object': {'key': key}}}
+
+    def sqs_record(self, message_id, body):
+        return {'messageId': message_id, 'eventSource': 'aws:sqs',
+                'body': body if isinstance(body, str) else json.dumps(body)}
+
+    def test_s3_batch_processes_every_record(self):
+        for name in ('a', 'b'):
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=f'sboms/{name}.json',
+                                      Body=json.dumps(self.sample_sbom))
+        event = {'Records': [self.s3_record('sboms/a.json'), self.s3_record('sboms/b.json'),
+                             self.s3_record('sboms/missing.json')]}
+
+        with patch('lambda_function.default_cve_cache', wraps=lambda_function.default_cve_cache) as cache_factory:
+            response = lambda_handler(event, MagicMock(aws_request_id='batch-request'))
+
+        body = json.loads(response['body'])
+        assert [r['statusCode'] for r in body['results']] == [200, 200, 500]
+        assert response['batchItemFailures'] == [{'itemIdentifier': '2'}]
+        assert cache_factory.call_count == 1
+        outputs = self.s3_client.list_objects_v2(Bucket=self.bucket_name, Prefix='analysis/')['Contents']
+        assert len(outputs) == 2
+
+    def test_sqs_batch_reports_partial_failures(self):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key='sboms/queued.json', Body=json.dumps(self.sample_sbom))
+        notification = {'Records': [self.s3_record('sboms/queued.json')]}
+        event = {'Records': [
+            self.sqs_record('ok', notification),
+            self.sqs_record('via-sns', {'Type': 'Notification', 'Message': json.dumps(notification)}),
+            self.sqs_record('test-event', {'Event': 's3:TestEvent', 'Bucket': self.bucket_name}),
+            self.sqs_record('missing', {'Records': [self.s3_record('sboms/gone.json')]}),
+            self.sqs_record('malformed', 'not json'),
+        ]}
+
+        response = lambda_handler(event, MagicMock(aws_request_id='sqs-request'))
+
+        assert response['statusCode'] == 200
+        assert response['batchItemFailures'] == [{'itemIdentifier': 'missing'}]
+        statuses = {r['itemIdentifier']: r['statusCode'] for r in json.loads(response['body'])['results']}
+        assert statuses == {'ok': 200, 'via-sns': 200, 'missing': 500, 'malformed': 400}
+        # Both deliveries of sboms/queued.json share one analysis
+        outputs = self.s3_client.list_objects_v2(Bucket=self.bucket_name, Prefix='analysis/')['Contents']
+        assert len(outputs) == 1
+
+    def test_duplicate_targets_are_analyzed_once(self):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key='sboms/dup.json', Body=json.dumps(self.sample_sbom))
+        notification = {'Records': [self.s3_record('sboms/dup.json'), self.s3_record('sboms/gone.json')]}
+        event = {'Records': [self.sqs_record(f'delivery-{i}', notification) for i in range(4)]}
+
+        with patch.object(lambda_function, 'RECORD_CONCURRENCY', 4), \
+                patch('lambda_function.process_sbom_object', wraps=lambda_function.process_sbom_object) as process:
+            response = lambda_handler(event, MagicMock(aws_request_id='dup-request'))
+
+        # Concurrent analyses of one object would race on its output key and DynamoDB row
+        assert sorted(call.args[1] for call in process.call_args_list) == ['sboms/dup.json', 'sboms/gone.json']
+        results = json.loads(response['body'])['results']
+        assert [(r['itemIdentifier'], r['key'], r['statusCode']) for r in results] == [
+            (f'delivery-{i}', key, status) for i in range(4)
+            for key, status in (('sboms/dup.json', 200), ('sboms/gone.json', 500))
+        ]
+        assert len({r['body']['output_key'] for r in results if r['statusCode'] == 200}) == 1
+        assert response['batchItemFailures'] == [{'itemIdentifier': f'delivery-{i}'} for i in range(4)]
+
+    def test_size_ceiling_is_configurable(self):
+        with patch.object(lambda_function, 'MAX_SBOM_SIZE_BYTES', 10):
+            response = self.upload_and_invoke('sboms/too-large.json', json.dumps(self.sample_sbom))
+        assert response['statusCode'] == 413
+
+    @staticmethod
+    def versioned_sbom(*packages):
+        return {"bomFormat": "CycloneDX", "components": [
+            {"name": name, "version": version, "purl": f"pkg:pypi/{name}@{version}"} for name, version in packages
+        ]}
+
+    def test_incremental_reanalysis_reuses_previous_lookups(self):
+        first = self.versioned_sbom(("a", "1.0"), ("b", "1.0"), ("c", "1.0"))
+        second = self.versioned_sbom(("a", "1.0"), ("b", "2.0"), ("d", "1.0"))
+
+        with patch.object(lambda_function, 'INCREMENTAL_ANALYSIS', True):
+            response = self.upload_and_invoke('sboms/app.json', json.dumps(first))
+            assert json.loads(response['body'])['metadata']['analysis_mode'] == 'full'
+            row = self.table.get_item(Key={'sbom_id': 'app.json'})['Item']
+            assert row['snapshot_key'] == 'analysis/snapshots/app.snapshot.json.gz'
+
+            with patch('lambda_function.prefetch_cve_data', wraps=lambda_function.prefetch_cve_data) as prefetch:
+                response = self.upload_and_invoke('sboms/app.json', json.dumps(second))
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['metadata']['analysis_mode'] == 'incremental'
+        # Only the added and re-versioned packages are looked up
+        looked_up = {key for call in prefetch.call_args_list for key in call.args[0]}
+        assert looked_up == {("b", "2.0", "pypi"), ("d", "1.0", "pypi")}
+
+        report = json.loads(self.s3_client.get_object(Bucket=self.bucket_name, Key=body['output_key'])['Body'].read())
+        changes = report['changes']
+        assert changes['base_output_key'] == row['output_key']
+        assert [entry['name'] for entry in changes['added']] == ['d']
+        assert [entry['name'] for entry in changes['removed']] == ['c']
+        assert changes['changed'] == [{'name': 'b', 'ecosystem': 'pypi', 'previous_versions': ['1.0'],
+                                       'versions': ['2.0']}]
+        assert changes['unchanged_count'] == 1
+        assert (changes['cve_lookups_reused'], changes['cve_lookups_performed']) == (1, 2)
+
+        # The merged report matches a full analysis of the new SBOM
+        full = json.loads(json.dumps(analyze_ofac(second), default=str))
+        for results in (report, full):
+            for key in ('analysis_timestamp', 'metadata', 'changes'):
+                results.pop(key, None)
+            results['executive_summary'].pop('analysis_timestamp')
+        assert report == full
+
+    def test_incremental_reanalysis_ignores_stale_base(self):
+        sbom = json.dumps(self.versioned_sbom(("a", "1.0")))
+        with patch.object(lambda_function, 'INCREMENTAL_ANALYSIS', True), \
+                patch.object(lambda_function, 'DEDUP_FRESHNESS_SECONDS', 0):
+            self.upload_and_invoke('sboms/stale.json', sbom)
+            with patch.object(lambda_function, 'INCREMENTAL_MAX_BASE_AGE_HOURS', 0):
+                response = self.upload_and_invoke('sboms/stale.json', sbom)
+        body = json.loads(response['body'])
+        assert body['metadata']['analysis_mode'] == 'full'
+
+    def backdate_snapshot(self, key, hours):
+        stored = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+        snapshot = AnalysisSnapshot.from_bytes(stored)
+        shift = lambda timestamp: (datetime.fromisoformat(timestamp) - timedelta(hours=hours)).isoformat()
+        snapshot.lookup_times = {package: shift(snapshot.fetched_at(package)) for package in snapshot.cves}
+        snapshot.analysis_timestamp = shift(snapshot.analysis_timestamp)
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=snapshot.to_bytes())
+
+    def test_incremental_reanalysis_refreshes_expired_lookups(self):
+        sbom = json.dumps(self.versioned_sbom(("a", "1.0")))
+        key = 'analysis/snapshots/refresh.snapshot.json.gz'
+        with patch.object(lambda_function, 'INCREMENTAL_ANALYSIS', True), \
+                patch.object(lambda_function, 'DEDUP_FRESHNESS_SECONDS', 0):
+            self.upload_and_invoke('sboms/refresh.json', sbom)
+            looked_up = []
+            for _ in range(2):
+                # Each base is recent enough to reuse, but the lookup for "a" keeps its original fetch time
+                self.backdate_snapshot(key, 20)
+                with patch('lambda_function.prefetch_cve_data', wraps=lambda_function.prefetch_cve_data) as prefetch:
+                    response = self.upload_and_invoke('sboms/refresh.json', sbom)
+                assert json.loads(response['body'])['metadata']['analysis_mode'] == 'incremental'
+                looked_up.append({package for call in prefetch.call_args_list for package in call.args[0]})
+
+        # Reused 20 hours in, looked up again once 40 hours old
+        assert looked_up == [set(), {("a", "1.0", "pypi")}]
+        snapshot = AnalysisSnapshot.from_bytes(
+            self.s3_client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read())
+        assert snapshot.lookup_age_seconds(("a", "1.0", "pypi")) < 3600
+
+    def test_identical_content_is_served_from_cache(self):
+        first = dict(self.sample_sbom, metadata={"timestamp": "2024-06-01T00:00:00Z"})
+        # Same components, different formatting, key order and metadata
+        second = {"metadata": {"timestamp": "2024-06-02T00:00:00Z"},
+                  "components": [dict(reversed(list(self.sample_sbom["components"][0].items())))]}
+
+        response = self.upload_and_invoke('sboms/build-1.json', json.dumps(first))
+        original = json.loads(response['body'])
+        assert original['cache']['hit'] is False
+
+        with patch('lambda_function.analyze_ofac') as analyze:
+            response = self.upload_and_invoke('sboms/build-2.json', json.dumps(second, indent=4))
+        analyze.assert_not_called()
+
+        body = json.loads(response['body'])
+        assert body['cache']['hit'] is True
+        assert body['cache']['original_output_key'] == original['output_key']
+        assert body['cache']['content_sha256'] == original['cache']['content_sha256']
+        assert body['summary'] == original['summary']
+        copied = self.s3_client.get_object(Bucket=self.bucket_name, Key=body['output_key'])
+        assert copied['Metadata']['served-from-cache'] == 'true'
+        assert json.loads(copied['Body'].read())['summary'] == original['summary']
+        assert self.table.get_item(Key={'sbom_id': 'build-2.json'})['Item']['served_from_cache'] is True
+
+    def test_cached_analysis_expires(self):
+        sbom = json.dumps(self.sample_sbom)
+        digest = json.loads(self.upload_and_invoke('sboms/old.json', sbom)['body'])['cache']['content_sha256']
+        self.table.update_item(Key={'sbom_id': f'sha256#{digest}'},
+                               UpdateExpression='SET analysis_timestamp = :old',
+                               ExpressionAttributeValues={':old': '2020-01-01T00:00:00'})
+        body = json.loads(self.upload_and_invoke('sboms/old.json', sbom)['body'])
+        assert body['cache']['hit'] is False
+
+    def test_streamed_sboms_are_deduplicated(self):
+        sbom = json.dumps(self.sample_sbom)
+        with patch.object(lambda_function, 'SBOM_STREAMING_THRESHOLD_BYTES', 0):
+            first = json.loads(self.upload_and_invoke('sboms/big-1.json', sbom)['body'])
+            second = json.loads(self.upload_and_invoke('sboms/big-2.json', sbom)['body'])
+        assert first['metadata']['ingestion'] == 'streaming'
+        assert first['cache']['hit'] is False
+        assert second['cache']['hit'] is True
+
+    def test_streamed_miss_parses_once(self):
+        sbom = json.dumps(self.sample_sbom)
+        with patch.object(lambda_function, 'SBOM_STREAMING_THRESHOLD_BYTES', 0), \
+                patch('lambda_function.open_sbom_reader', wraps=lambda_function.open_sbom_reader) as reader:
+            first = json.loads(self.upload_and_invoke('sboms/once-1.json', sbom)['body'])
+            assert reader.call_count == 1
+            # Reformatted content misses the ETag lookup but records the same content digest
+            response = self.upload_and_invoke('sboms/once-2.json', json.dumps(self.sample_sbom, indent=2))
+            reformatted = json.loads(response['body'])
+            assert reader.call_count == 2
+        expected = lambda_function.sbom_content_digest(self.sample_sbom['components'])
+        assert first['cache'] == reformatted['cache'] == {'hit': False, 'content_sha256': expected}
+        assert self.table.get_item(Key={'sbom_id': f'sha256#{expected}'})['Item']['output_key'] == \
+            reformatted['output_key']
+
+    def test_missing_components_is_not_served_from_cache(self):
+        response = self.upload_and_invoke('sboms/empty.json', json.dumps({"bomFormat": "CycloneDX", "components": []}))
+        assert response['statusCode'] == 200
+        response = self.upload_and_invoke('sboms/shapeless.json', json.dumps({"bomFormat": "CycloneDX"}))
+        assert response['statusCode'] == 400
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,494 @@
+"""
+Offline vulnerability database for the Erasmus SBOM analyzer.
+
+Locally synced NVD (API 2.0 JSON) or OSV feeds are imported into a compact
+SQLite index keyed by ecosystem + package, so CVE lookups resolve without
+network calls. Run as a script to build or update the index:
+
+    python vuln_db.py import --db vulns.db nvd-2024.json.gz osv-pypi.zip
+    python vuln_db.py stats --db vulns.db
+"""
+import argparse
+import gzip
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import zipfile
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+logger = logging.getLogger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vulnerabilities (
+    ecosystem TEXT NOT NULL,
+    package TEXT NOT NULL,
+    cve_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    cvss_score REAL NOT NULL,
+    severity TEXT NOT NULL,
+    description TEXT NOT NULL,
+    published_date TEXT NOT NULL,
+    last_modified TEXT NOT NULL,
+    affected TEXT NOT NULL,
+    PRIMARY KEY (ecosystem, package, cve_id, source)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS vulnerabilities_cve ON vulnerabilities (cve_id, source);
+CREATE TABLE IF NOT EXISTS feed_state (
+    feed TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    last_modified TEXT NOT NULL,
+    imported_at TEXT NOT NULL,
+    records INTEGER NOT NULL
+);
+"""
+
+# Wildcard ecosystem for NVD CPEs that do not name a package ecosystem
+ANY_ECOSYSTEM = '*'
+
+# CPE target_sw values mapped to purl ecosystems
+CPE_TARGET_ECOSYSTEMS = {
+    'python': 'pypi',
+    'node.js': 'npm',
+    'nodejs': 'npm',
+    'java': 'maven',
+    '.net': 'nuget',
+    '.net_framework': 'nuget'
+}
+
+OSV_ECOSYSTEMS = {
+    'PyPI': 'pypi',
+    'npm': 'npm',
+    'Maven': 'maven',
+    'NuGet': 'nuget'
+}
+
+# Representative scores for advisories that only carry a severity label
+SEVERITY_FALLBACK_SCORES = {
+    'CRITICAL': 9.0,
+    'HIGH': 7.0,
+    'MODERATE': 5.0,
+    'MEDIUM': 5.0,
+    'LOW': 2.0
+}
+
+INCLUDED_SEVERITIES = ('CRITICAL', 'HIGH')
+
+# CVSS v3.x base metric weights
+CVSS3_WEIGHTS = {
+    'AV': {'N': 0.85, 'A': 0.62, 'L': 0.55, 'P': 0.2},
+    'AC': {'L': 0.77, 'H': 0.44},
+    'UI': {'N': 0.85, 'R': 0.62},
+    'CIA': {'H': 0.56, 'L': 0.22, 'N': 0.0}
+}
+CVSS3_PRIVILEGES = {
+    'U': {'N': 0.85, 'L': 0.62, 'H': 0.27},
+    'C': {'N': 0.85, 'L': 0.68, 'H': 0.5}
+}
+
+def _cvss_roundup(value: float) -> float:
+    """CVSS v3.1 Roundup: smallest one-decimal number >= value, robust to float error."""
+    int_input = round(value * 100000)
+    if int_input % 10000 == 0:
+        return int_input / 100000.0
+    return (math.floor(int_input / 10000) + 1) / 10.0
+
+def cvss3_base_score(vector: str) -> Optional[float]:
+    """Compute the CVSS v3.x base score from a vector string, or None if it cannot be parsed."""
+    try:
+        metrics = dict(part.split(':', 1) for part in vector.split('/')[1:])
+        scope = metrics['S']
+        iss = 1 - ((1 - CVSS3_WEIGHTS['CIA'][metrics['C']]) *
+                   (1 - CVSS3_WEIGHTS['CIA'][metrics['I']]) *
+                   (1 - CVSS3_WEIGHTS['CIA'][metrics['A']]))
+        if scope == 'U':
+            impact = 6.42 * iss
+        else:
+            impact = 7.52 * (iss - 0.029) - 3.25 * ((iss - 0.02) ** 15)
+        exploitability = (8.22 * CVSS3_WEIGHTS['AV'][metrics['AV']] * CVSS3_WEIGHTS['AC'][metrics['AC']] *
+                          CVSS3_PRIVILEGES[scope][metrics['PR']] * CVSS3_WEIGHTS['UI'][metrics['UI']])
+    except (KeyError, ValueError):
+        return None
+
+    if impact <= 0:
+        return 0.0
+    if scope == 'U':
+        return _cvss_roundup(min(impact + exploitability, 10))
+    return _cvss_roundup(min(1.08 * (impact + exploitability), 10))
+
+def severity_for_score(score: float) -> str:
+    if score >= 9.0:
+        return 'CRITICAL'
+    if score >= 7.0:
+        return 'HIGH'
+    if score >= 4.0:
+        return 'MEDIUM'
+    if score > 0:
+        return 'LOW'
+    return 'NONE'
+
+def _truncate_description(description: str) -> str:
+    return description[:200] + '...' if len(description) > 200 else description
+
+def _version_range(start: Optional[str] = None, start_inclusive: bool = True,
+                   end: Optional[str] = None, end_inclusive: bool = False) -> Dict:
+    """Affected version interval; a None bound is unbounded."""
+    return {
+        'start': start,
+        'start_inclusive': start_inclusive,
+        'end': end,
+        'end_inclusive': end_inclusive
+    }
+
+def nvd_affected_ranges(cve: Dict) -> Dict[Tuple[str, str], List[Dict]]:
+    """Collect affected version ranges per (ecosystem, package) from vulnerable CPE matches."""
+    affected = {}
+    for configuration in cve.get('configurations', []):
+        for node in configuration.get('nodes', []):
+            for cpe_match in node.get('cpeMatch', []):
+                if not cpe_match.get('vulnerable', True):
+                    continue
+                parts = cpe_match.get('criteria', '').split(':')
+                if len(parts) < 13 or parts[2] != 'a':
+                    continue
+                package = parts[4].lower()
+                cpe_version = parts[5]
+                ecosystem = CPE_TARGET_ECOSYSTEMS.get(parts[10].lower(), ANY_ECOSYSTEM)
+
+                if any(bound in cpe_match for bound in ('versionStartIncluding', 'versionStartExcluding',
+                                                         'versionEndIncluding', 'versionEndExcluding')):
+                    version_range = _version_range(
+                        start=cpe_match.get('versionStartIncluding') or cpe_match.get('versionStartExcluding'),
+                        start_inclusive='versionStartExcluding' not in cpe_match,
+                        end=cpe_match.get('versionEndIncluding') or cpe_match.get('versionEndExcluding'),
+                        end_inclusive='versionEndIncluding' in cpe_match
+                    )
+                elif cpe_version not in ('*', '-', ''):
+                    version_range = _version_range(cpe_version, True, cpe_version, True)
+                else:
+                    version_range = _version_range()
+                affected.setdefault((ecosystem, package), []).append(version_range)
+    return affected
+
+def parse_nvd_vulnerability(vulnerability: Dict) -> Tuple[str, str, List[Dict]]:
+    """
+    Convert one NVD API 2.0 vulnerability into (cve_id, last_modified, rows).
+    Rows are empty for rejected or below-HIGH CVEs, which removes them from the index.
+    """
+    cve = vulnerability.get('cve', vulnerability)
+    cve_id = cve.get('id', '')
+    last_modified = cve.get('lastModified', '')
+    if cve.get('vulnStatus') == 'Rejected':
+        return cve_id, last_modified, []
+
+    metrics = cve.get('metrics', {})
+    cvss_score = 0.0
+    severity = 'UNKNOWN'
+    for cvss_version in ['cvssMetricV31', 'cvssMetricV30', 'cvssMetricV2']:
+        if metrics.get(cvss_version):
+            metric = metrics[cvss_version][0]
+            if 'cvssData' in metric:
+                cvss_score = metric['cvssData'].get('baseScore', 0.0)
+                severity = metric['cvssData'].get('baseSeverity', metric.get('baseSeverity', 'UNKNOWN'))
+                break
+    if severity not in INCLUDED_SEVERITIES:
+        return cve_id, last_modified, []
+
+    description = next((desc.get('value', '') for desc in cve.get('descriptions', [])
+                        if desc.get('lang') == 'en'), '')
+
+    affected = nvd_affected_ranges(cve)
+    rows = [{
+        'ecosystem': ecosystem,
+        'package': package,
+        'cve_id': cve_id,
+        'source': 'nvd',
+        'cvss_score': float(cvss_score),
+        'severity': severity,
+        'description': _truncate_description(description),
+        'published_date': cve.get('published', ''),
+        'last_modified': last_modified,
+        'affected': ranges
+    } for (ecosystem, package), ranges in affected.items()]
+    return cve_id, last_modified, rows
+
+def _osv_ranges(affected: Dict) -> List[Dict]:
+    """Turn OSV introduced/fixed/last_affected events into version intervals."""
+    ranges = []
+    for osv_range in affected.get('ranges', []):
+        if osv_range.get('type') not in ('ECOSYSTEM', 'SEMVER'):
+            continue
+        start = None
+        open_interval = False
+        for event in osv_range.get('events', []):
+            if 'introduced' in event:
+                start = None if event['introduced'] == '0' else event['introduced']
+                open_interval = True
+            elif 'fixed' in event and open_interval:
+                ranges.append(_version_range(start, True, event['fixed'], False))
+                open_interval = False
+            elif 'last_affected' in event and open_interval:
+                ranges.append(_version_range(start, True, event['last_affected'], True))
+                open_interval = False
+        if open_interval:
+            ranges.append(_version_range(start, True))
+
+    if not ranges:
+        ranges = [_version_range(v, True, v, True) for v in affected.get('versions', [])]
+    return ranges
+
+def package_lookup_name(ecosystem: str, purl: str, name: str) -> str:
+    """
+    Name a component is looked up by: group:artifact from the purl namespace and
+    name for Maven, as OSV records Maven packages, otherwise the component name.
+    """
+    if ecosystem == 'maven' and purl.startswith('pkg:maven/'):
+        path = purl[len('pkg:maven/'):].split('#', 1)[0].split('?', 1)[0].rsplit('@', 1)[0]
+        namespace, _, artifact = path.rpartition('/')
+        if namespace and artifact:
+            return f"{unquote(namespace)}:{unquote(artifact)}"
+    return name
+
+def parse_osv_record(record: Dict) -> Tuple[str, str, List[Dict]]:
+    """Convert one OSV advisory into (cve_id, last_modified, rows)."""
+    cve_id = next((alias for alias in record.get('aliases', []) if alias.startswith('CVE-')), record.get('id', ''))
+    last_modified = record.get('modified', '')
+    if record.get('withdrawn'):
+        return cve_id, last_modified, []
+
+    cvss_score = None
+    for severity_entry in record.get('severity', []):
+        if severity_entry.get('type', '').startswith('CVSS_V3'):
+            cvss_score = cvss3_base_score(severity_entry.get('score', ''))
+            if cvss_score is not None:
+                break
+    if cvss_score is None:
+        label = str(record.get('database_specific', {}).get('severity', '')).upper()
+        cvss_score = SEVERITY_FALLBACK_SCORES.get(label, 0.0)
+
+    severity = severity_for_score(cvss_score)
+    if severity not in INCLUDED_SEVERITIES:
+        return cve_id, last_modified, []
+
+    description = record.get('summary') or record.get('details', '')
+    rows = []
+    for affected in record.get('affected', []):
+        package_info = affected.get('package', {})
+        ecosystem = OSV_ECOSYSTEMS.get(package_info.get('ecosystem', '').split(':')[0])
+        if not ecosystem or not package_info.get('name'):
+            continue
+        rows.append({
+            'ecosystem': ecosystem,
+            'package': package_info['name'].lower(),
+            'cve_id': cve_id,
+            'source': 'osv',
+            'cvss_score': float(cvss_score),
+            'severity': severity,
+            'description': _truncate_description(description),
+            'published_date': record.get('published', ''),
+            'last_modified': last_modified,
+            'affected': _osv_ranges(affected)
+        })
+    return cve_id, last_modified, rows
+
+def _open_feed(path: str):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+def iter_feed_records(path: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (source, record) pairs from an NVD API 2.0 JSON file, an OSV record,
+    a directory of OSV records or an OSV zip dump.
+    """
+    if os.path.isdir(path):
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(('.json', '.json.gz')):
+                yield from iter_feed_records(os.path.join(path, file_name))
+        return
+
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for member in sorted(archive.namelist()):
+                if member.endswith('.json'):
+                    yield 'osv', json.loads(archive.read(member))
+        return
+
+    with _open_feed(path) as handle:
+        document = json.load(handle)
+
+    if isinstance(document, dict) and 'vulnerabilities' in document:
+        for vulnerability in document['vulnerabilities']:
+            yield 'nvd', vulnerability
+    elif isinstance(document, list):
+        for record in document:
+            yield 'osv', record
+    else:
+        yield 'osv', document
+
+class VulnerabilityDatabase:
+    """
+    SQLite-backed vulnerability index. Rows are clustered on (ecosystem, package),
+    so a package lookup is a single B-tree range scan.
+    """
+
+    def __init__(self, path: str, readonly: bool = True):
+        self.path = path
+        self.readonly = readonly
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # SQLite connections are per-thread; CVE lookups run in a thread pool
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.readonly:
+                connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            else:
+                connection = sqlite3.connect(self.path)
+                connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def lookup(self, ecosystem: str, package: str) -> List[Dict]:
+        """
+        Return CVEs recorded for a package (named as by package_lookup_name()),
+        including CPE matches without an ecosystem.
+        """
+        package = package.lower()
+        # NVD CPEs name a Maven package by its artifactId alone
+        product = package.rpartition(':')[2] if ecosystem == 'maven' else package
+        rows = self.connection.execute(
+            "SELECT cve_id, cvss_score, severity, description, published_date, last_modified, affected "
+            "FROM vulnerabilities WHERE package IN (?, ?) AND ecosystem IN (?, ?)",
+            (package, product, ecosystem, ANY_ECOSYSTEM)
+        ).fetchall()
+
+        # The same CVE can arrive from several feeds; keep its highest-scoring record
+        cves = {}
+        for cve_id, cvss_score, severity, description, published_date, last_modified, affected in rows:
+            existing = cves.get(cve_id)
+            if existing and existing['cvss_score'] >= cvss_score:
+                existing['affected'].extend(json.loads(affected))
+                continue
+            cves[cve_id] = {
+                'cve_id': cve_id,
+                'cvss_score': cvss_score,
+                'severity': severity,
+                'description': description,
+                'published_date': published_date,
+                'last_modified': last_modified,
+                'affected': json.loads(affected) + (existing['affected'] if existing else [])
+            }
+        return list(cves.values())
+
+    def last_synced(self) -> Optional[datetime]:
+        row = self.connection.execute("SELECT MAX(imported_at) FROM feed_state").fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def stats(self) -> Dict:
+        connection = self.connection
+        last_synced = self.last_synced()
+        return {
+            'path': self.path,
+            'records': connection.execute("SELECT COUNT(*) FROM vulnerabilities").fetchone()[0],
+            'packages': connection.execute(
+                "SELECT COUNT(*) FROM (SELECT DISTINCT ecosystem, package FROM vulnerabilities)"
+            ).fetchone()[0],
+            'feeds': connection.execute("SELECT COUNT(*) FROM feed_state").fetchone()[0],
+            'last_synced': last_synced.isoformat() if last_synced else None
+        }
+
+    def import_feed(self, path: str, feed_name: Optional[str] = None) -> Dict:
+        """
+        Upsert a full feed or delta into the index. Each CVE is replaced as a unit
+        (so dropped packages disappear), and records no newer than what is already
+        indexed are skipped, making re-imports and overlapping deltas idempotent.
+        """
+        if self.readonly:
+            raise ValueError("Vulnerability database is opened read-only")
+
+        feed_name = feed_name or os.path.basename(path)
+        connection = self.connection
+        counters = {'feed': feed_name, 'processed': 0, 'updated': 0, 'skipped': 0, 'removed': 0}
+        watermark = ''
+        source = None
+
+        with connection:
+            for source, record in iter_feed_records(path):
+                parse = parse_nvd_vulnerability if source == 'nvd' else parse_osv_record
+                cve_id, last_modified, rows = parse(record)
+                counters['processed'] += 1
+                if not cve_id:
+                    continue
+                watermark = max(watermark, last_modified)
+
+                indexed = connection.execute(
+                    "SELECT MAX(last_modified) FROM vulnerabilities WHERE cve_id = ? AND source = ?",
+                    (cve_id, source)
+                ).fetchone()[0]
+                if indexed and last_modified and indexed >= last_modified:
+                    counters['skipped'] += 1
+                    continue
+
+                deleted = connection.execute(
+                    "DELETE FROM vulnerabilities WHERE cve_id = ? AND source = ?", (cve_id, source)
+                ).rowcount
+                if not rows:
+                    counters['removed'] += 1 if deleted else 0
+                    continue
+
+                connection.executemany(
+                    "INSERT OR REPLACE INTO vulnerabilities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(row['ecosystem'], row['package'], row['cve_id'], row['source'], row['cvss_score'],
+                      row['severity'], row['description'], row['published_date'], row['last_modified'],
+                      json.dumps(row['affected'], separators=(',', ':'))) for row in rows]
+                )
+                counters['updated'] += 1
+
+            connection.execute(
+                "INSERT OR REPLACE INTO feed_state VALUES (?, ?, ?, ?, ?)",
+                (feed_name, source or 'unknown', watermark, datetime.utcnow().isoformat(), counters['processed'])
+            )
+        return counters
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build and inspect the offline vulnerability index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="Import NVD or OSV feeds (full or delta)")
+    import_parser.add_argument('--db', required=True, help="Path to the SQLite index (created if missing)")
+    import_parser.add_argument('feeds', nargs='+', help="NVD API 2.0 JSON(.gz), OSV JSON, directory or zip")
+
+    stats_parser = subparsers.add_parser('stats', help="Show index statistics")
+    stats_parser.add_argument('--db', required=True)
+
+    lookup_parser = subparsers.add_parser('lookup', help="Look up CVEs for one package")
+    lookup_parser.add_argument('--db', required=True)
+    lookup_parser.add_argument('ecosystem')
+    lookup_parser.add_argument('package')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        database = VulnerabilityDatabase(args.db, readonly=False)
+        for feed in args.feeds:
+            print(json.dumps(database.import_feed(feed)))
+        print(json.dumps(database.stats()))
+        database.close()
+    elif args.command == 'stats':
+        print(json.dumps(VulnerabilityDatabase(args.db).stats(), indent=2))
+    else:
+        print(json.dumps(VulnerabilityDatabase(args.db).lookup(args.ecosystem, args.package), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
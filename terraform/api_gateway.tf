@@ -83,6 +83,81 @@ resource "aws_api_gateway_integration" "analyze_lambda" {
   uri                    = aws_lambda_function.sbom_analyzer.invoke_arn
 }
 
+# Async job endpoints: POST /jobs submits, GET /jobs/{job_id} polls
+resource "aws_api_gateway_resource" "jobs_resource" {
+  rest_api_id = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  parent_id   = aws_api_gateway_rest_api.sbom_analyzer_api.root_resource_id
+  path_part   = "jobs"
+}
+
+resource "aws_api_gateway_method" "jobs_post" {
+  rest_api_id   = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  resource_id   = aws_api_gateway_resource.jobs_resource.id
+  http_method   = "POST"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "jobs_post_lambda" {
+  rest_api_id = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  resource_id = aws_api_gateway_resource.jobs_resource.id
+  http_method = aws_api_gateway_method.jobs_post.http_method
+
+  integration_http_method = "POST"
+  type                   = "AWS_PROXY"
+  uri                    = aws_lambda_function.sbom_analyzer.invoke_arn
+}
+
+resource "aws_api_gateway_resource" "job_resource" {
+  rest_api_id = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  parent_id   = aws_api_gateway_resource.jobs_resource.id
+  path_part   = "{job_id}"
+}
+
+resource "aws_api_gateway_method" "job_get" {
+  rest_api_id   = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  resource_id   = aws_api_gateway_resource.job_resource.id
+  http_method   = "GET"
+  authorization = "NONE"
+
+  request_parameters = {
+    "method.request.path.job_id" = true
+  }
+}
+
+resource "aws_api_gateway_integration" "job_get_lambda" {
+  rest_api_id = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  resource_id = aws_api_gateway_resource.job_resource.id
+  http_method = aws_api_gateway_method.job_get.http_method
+
+  integration_http_method = "POST"
+  type                   = "AWS_PROXY"
+  uri                    = aws_lambda_function.sbom_analyzer.invoke_arn
+}
+
+# Component index query: GET /components?purl=... or ?package=...&version=...
+resource "aws_api_gateway_resource" "components_resource" {
+  rest_api_id = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  parent_id   = aws_api_gateway_rest_api.sbom_analyzer_api.root_resource_id
+  path_part   = "components"
+}
+
+resource "aws_api_gateway_method" "components_get" {
+  rest_api_id   = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  resource_id   = aws_api_gateway_resource.components_resource.id
+  http_method   = "GET"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "components_get_lambda" {
+  rest_api_id = aws_api_gateway_rest_api.sbom_analyzer_api.id
+  resource_id = aws_api_gateway_resource.components_resource.id
+  http_method = aws_api_gateway_method.components_get.http_method
+
+  integration_http_method = "POST"
+  type                   = "AWS_PROXY"
+  uri                    = aws_lambda_function.sbom_analyzer.invoke_arn
+}
+
 # Lambda permission for API Gateway
 resource "aws_lambda_permission" "api_gw" {
   statement_id  = "AllowExecutionFromAPIGateway"
@@ -97,6 +172,12 @@ resource "aws_api_gateway_deployment" "api_deployment" {
   depends_on = [
     aws_api_gateway_method.analyze_post,
     aws_api_gateway_integration.analyze_lambda,
+    aws_api_gateway_method.jobs_post,
+    aws_api_gateway_integration.jobs_post_lambda,
+    aws_api_gateway_method.job_get,
+    aws_api_gateway_integration.job_get_lambda,
+    aws_api_gateway_method.components_get,
+    aws_api_gateway_integration.components_get_lambda,
     aws_api_gateway_method.options_method,
     aws_api_gateway_integration.options_integration,
   ]
@@ -78,6 +78,12 @@ resource "aws_dynamodb_table" "sbom_analysis_cache" {
     projection_type    = "ALL"
   }
 
+  # Expires cached CVE lookups (rows keyed "cve#<ecosystem>#<package>#<version>")
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
   tags = {
     Name        = "${var.project_name}-${var.environment}-cache"
     Environment = var.environment
@@ -85,6 +91,57 @@ resource "aws_dynamodb_table" "sbom_analysis_cache" {
   }
 }
 
+# Fleet-wide inverted index: component purl -> SBOMs containing it
+resource "aws_dynamodb_table" "component_index" {
+  name           = "ErasmusComponentIndex"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "package"
+  range_key      = "entry"
+
+  attribute {
+    name = "package"
+    type = "S"
+  }
+
+  # "<version>#<sbom_id>", so version prefixes are a begins_with key condition
+  attribute {
+    name = "entry"
+    type = "S"
+  }
+
+  attribute {
+    name = "sbom_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "product"
+    type = "S"
+  }
+
+  # Lists an SBOM's entries so reprocessing replaces them
+  global_secondary_index {
+    name               = "sbom-index"
+    hash_key           = "sbom_id"
+    projection_type    = "KEYS_ONLY"
+  }
+
+  # Finds components by the product name CVE data refers to, for CVE re-scans
+  global_secondary_index {
+    name               = "product-index"
+    hash_key           = "product"
+    range_key          = "entry"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["sbom_id", "version", "purl", "name", "source_key"]
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-component-index"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
 # IAM Role for Lambda
 resource "aws_iam_role" "lambda_execution_role" {
   name = "${var.project_name}-${var.environment}-lambda-role"
@@ -125,7 +182,8 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Action = [
           "s3:GetObject",
           "s3:PutObject",
-          "s3:DeleteObject"
+          "s3:DeleteObject",
+          "s3:AbortMultipartUpload"
         ]
         Resource = "${aws_s3_bucket.sbom_storage.arn}/*"
       },
@@ -141,14 +199,27 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Action = [
           "dynamodb:PutItem",
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem",
           "dynamodb:Query",
           "dynamodb:Scan"
         ]
         Resource = [
           aws_dynamodb_table.sbom_analysis_cache.arn,
-          "${aws_dynamodb_table.sbom_analysis_cache.arn}/*"
+          "${aws_dynamodb_table.sbom_analysis_cache.arn}/*",
+          aws_dynamodb_table.component_index.arn,
+          "${aws_dynamodb_table.component_index.arn}/*"
         ]
+      },
+      {
+        # Async API jobs run as an Event invocation of this same function
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction"
+        ]
+        Resource = "arn:aws:lambda:${var.aws_region}:*:function:${var.project_name}-${var.environment}-analyzer"
       }
     ]
   })
@@ -181,9 +252,28 @@ resource "aws_lambda_function" "sbom_analyzer" {
 
   environment {
     variables = {
-      DDB_TABLE_NAME = aws_dynamodb_table.sbom_analysis_cache.name
-      S3_BUCKET_NAME = aws_s3_bucket.sbom_storage.bucket
-      NVD_API_KEY    = var.nvd_api_key
+      DDB_TABLE_NAME                  = aws_dynamodb_table.sbom_analysis_cache.name
+      COMPONENT_INDEX_TABLE           = aws_dynamodb_table.component_index.name
+      S3_BUCKET_NAME                  = aws_s3_bucket.sbom_storage.bucket
+      NVD_API_KEY                     = var.nvd_api_key
+      CVE_LOOKUP_CONCURRENCY          = tostring(var.cve_lookup_concurrency)
+      CVE_CACHE_TTL_SECONDS           = tostring(var.cve_cache_ttl_seconds)
+      CVE_SOURCE                      = var.cve_source
+      VULN_DB_PATH                    = var.vuln_db_path
+      MAX_SBOM_SIZE_BYTES             = tostring(var.max_sbom_size_bytes)
+      ANALYSIS_OUTPUT_FORMAT          = var.analysis_output_format
+      ANALYSIS_OUTPUT_PRETTY          = tostring(var.analysis_output_pretty)
+      ANALYSIS_OUTPUT_ENCODING        = var.analysis_output_encoding
+      RECORD_CONCURRENCY              = tostring(var.record_concurrency)
+      INCREMENTAL_ANALYSIS            = tostring(var.incremental_analysis)
+      INCREMENTAL_MAX_BASE_AGE_HOURS  = tostring(var.incremental_max_base_age_hours)
+      DEDUP_FRESHNESS_SECONDS         = tostring(var.dedup_freshness_seconds)
+      SANCTIONS_RULES_LOCATION        = var.sanctions_rules_key != "" ? "s3://${aws_s3_bucket.sbom_storage.bucket}/${var.sanctions_rules_key}" : ""
+      SANCTIONS_RULES_REFRESH_SECONDS = tostring(var.sanctions_rules_refresh_seconds)
+      CVE_RESCAN_FEED_PATH            = var.cve_rescan_feed_path
+      CVE_RESCAN_LOOKBACK_HOURS       = tostring(var.cve_rescan_lookback_hours)
+      METRICS_ENABLED                 = tostring(var.metrics_enabled)
+      METRICS_NAMESPACE               = var.metrics_namespace
     }
   }
 
@@ -203,11 +293,15 @@ resource "aws_lambda_function" "sbom_analyzer" {
 resource "aws_s3_bucket_notification" "sbom_upload_notification" {
   bucket = aws_s3_bucket.sbom_storage.id
 
-  lambda_function {
-    lambda_function_arn = aws_lambda_function.sbom_analyzer.arn
-    events              = ["s3:ObjectCreated:*"]
-    filter_prefix       = "sboms/"
-    filter_suffix       = ".json"
+  # One rule per accepted extension; the analyzer detects the SBOM format from the content
+  dynamic "lambda_function" {
+    for_each = [".json", ".xml", ".spdx"]
+    content {
+      lambda_function_arn = aws_lambda_function.sbom_analyzer.arn
+      events              = ["s3:ObjectCreated:*"]
+      filter_prefix       = "sboms/"
+      filter_suffix       = lambda_function.value
+    }
   }
 
   depends_on = [aws_lambda_permission.s3_invoke_lambda]
@@ -221,3 +315,27 @@ resource "aws_lambda_permission" "s3_invoke_lambda" {
   principal     = "s3.amazonaws.com"
   source_arn    = aws_s3_bucket.sbom_storage.arn
 }
+
+# Scheduled CVE re-scan of the SBOMs affected by newly modified CVEs
+resource "aws_cloudwatch_event_rule" "cve_rescan" {
+  count               = var.cve_rescan_schedule != "" ? 1 : 0
+  name                = "${var.project_name}-${var.environment}-cve-rescan"
+  description         = "Re-analyze indexed SBOMs affected by CVEs modified since the last run"
+  schedule_expression = var.cve_rescan_schedule
+}
+
+resource "aws_cloudwatch_event_target" "cve_rescan" {
+  count = var.cve_rescan_schedule != "" ? 1 : 0
+  rule  = aws_cloudwatch_event_rule.cve_rescan[0].name
+  arn   = aws_lambda_function.sbom_analyzer.arn
+  input = jsonencode({ cve_rescan = {} })
+}
+
+resource "aws_lambda_permission" "cve_rescan_invoke_lambda" {
+  count         = var.cve_rescan_schedule != "" ? 1 : 0
+  statement_id  = "AllowExecutionFromCVERescanSchedule"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.sbom_analyzer.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.cve_rescan[0].arn
+}
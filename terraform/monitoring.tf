@@ -69,6 +69,31 @@ resource "aws_cloudwatch_metric_alarm" "dynamodb_throttles" {
   }
 }
 
+# NVD Error Rate Alarm (EMF metric published by the function)
+resource "aws_cloudwatch_metric_alarm" "nvd_error_rate" {
+  count               = var.metrics_enabled ? 1 : 0
+  alarm_name          = "${var.project_name}-${var.environment}-nvd-error-rate"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "2"
+  metric_name         = "NVDErrorRate"
+  namespace           = var.metrics_namespace
+  period              = "300"
+  statistic           = "Average"
+  threshold           = var.nvd_error_rate_threshold
+  treat_missing_data  = "notBreaching"
+  alarm_description   = "This metric monitors the share of failed or throttled NVD requests"
+  alarm_actions       = [aws_sns_topic.alerts.arn]
+
+  dimensions = {
+    FunctionName = aws_lambda_function.sbom_analyzer.function_name
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-nvd-errors"
+    Environment = var.environment
+  }
+}
+
 # SNS Topic for Alerts
 resource "aws_sns_topic" "alerts" {
   name = "${var.project_name}-${var.environment}-alerts"
@@ -124,6 +149,53 @@ resource "aws_cloudwatch_dashboard" "sbom_analyzer" {
           period  = 300
         }
       },
+      {
+        type   = "metric"
+        x      = 12
+        y      = 0
+        width  = 12
+        height = 6
+
+        properties = {
+          metrics = [
+            [var.metrics_namespace, "Stage.s3_read", "FunctionName", aws_lambda_function.sbom_analyzer.function_name],
+            [".", "Stage.json_parse", ".", "."],
+            [".", "Stage.component_read", ".", "."],
+            [".", "Stage.cve_lookup", ".", "."],
+            [".", "Stage.risk_scoring", ".", "."],
+            [".", "Stage.dependency_analysis", ".", "."],
+            [".", "Stage.output_write", ".", "."]
+          ]
+          view    = "timeSeries"
+          stacked = true
+          region  = var.aws_region
+          stat    = "Average"
+          title   = "Analysis Stage Latency (ms)"
+          period  = 300
+        }
+      },
+      {
+        type   = "metric"
+        x      = 12
+        y      = 6
+        width  = 12
+        height = 6
+
+        properties = {
+          metrics = [
+            [var.metrics_namespace, "NVDRequestLatency", "FunctionName", aws_lambda_function.sbom_analyzer.function_name, { stat = "p99" }],
+            [".", "NVDErrorRate", ".", "."],
+            [".", "CVECacheHitRate", ".", "."],
+            [".", "ComponentsPerSecond", ".", "."]
+          ]
+          view    = "timeSeries"
+          stacked = false
+          region  = var.aws_region
+          stat    = "Average"
+          title   = "NVD, Cache and Throughput"
+          period  = 300
+        }
+      },
       {
         type   = "log"
         x      = 0
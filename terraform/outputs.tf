@@ -28,6 +28,11 @@ output "dynamodb_table_arn" {
   value       = aws_dynamodb_table.sbom_analysis_cache.arn
 }
 
+output "component_index_table_name" {
+  description = "Name of the component index DynamoDB table"
+  value       = aws_dynamodb_table.component_index.name
+}
+
 output "cloudwatch_log_group_name" {
   description = "Name of the CloudWatch log group"
   value       = var.enable_cloudwatch_logs_retention ? aws_cloudwatch_log_group.lambda_logs[0].name : null
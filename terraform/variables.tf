@@ -52,3 +52,123 @@ variable "nvd_api_key" {
   default     = ""
   sensitive   = true
 }
+
+variable "cve_lookup_concurrency" {
+  description = "Maximum number of concurrent NVD lookups per SBOM analysis"
+  type        = number
+  default     = 8
+}
+
+variable "cve_cache_ttl_seconds" {
+  description = "How long cached NVD results stay valid in DynamoDB (0 disables the cache)"
+  type        = number
+  default     = 86400
+}
+
+variable "cve_source" {
+  description = "CVE lookup source: online (NVD API), offline (local index) or hybrid"
+  type        = string
+  default     = "online"
+}
+
+variable "vuln_db_path" {
+  description = "Path to the offline vulnerability index inside the Lambda environment"
+  type        = string
+  default     = ""
+}
+
+variable "max_sbom_size_bytes" {
+  description = "Largest SBOM object accepted from S3; objects above 10 MB are parsed as a stream"
+  type        = number
+  default     = 2147483648
+}
+
+variable "analysis_output_format" {
+  description = "Format of analysis results written to S3: json or ndjson"
+  type        = string
+  default     = "json"
+}
+
+variable "analysis_output_pretty" {
+  description = "Indent JSON analysis results (set false for compact output)"
+  type        = bool
+  default     = true
+}
+
+variable "analysis_output_encoding" {
+  description = "Content encoding for analysis results: none, gzip or zstd"
+  type        = string
+  default     = "none"
+}
+
+variable "record_concurrency" {
+  description = "Number of SBOMs from one S3/SQS event batch analyzed in parallel"
+  type        = number
+  default     = 4
+}
+
+variable "sanctions_rules_key" {
+  description = "Key of a sanctions rule bundle in the SBOM bucket (e.g. rules/sanctions.json); empty uses the built-in rules"
+  type        = string
+  default     = ""
+}
+
+variable "sanctions_rules_refresh_seconds" {
+  description = "Minimum seconds between ETag checks for a changed sanctions rule bundle"
+  type        = number
+  default     = 60
+}
+
+variable "incremental_analysis" {
+  description = "Re-analyze SBOMs uploaded again under the same name incrementally, reusing the previous run's CVE lookups"
+  type        = bool
+  default     = false
+}
+
+variable "incremental_max_base_age_hours" {
+  description = "Previous analyses older than this are not reused; a full analysis runs instead"
+  type        = number
+  default     = 24
+}
+
+variable "dedup_freshness_seconds" {
+  description = "Serve uploads with identical components from an analysis at most this old (0 disables deduplication)"
+  type        = number
+  default     = 3600
+}
+
+variable "cve_rescan_schedule" {
+  description = "EventBridge schedule of the CVE re-scan of indexed SBOMs (e.g. rate(6 hours)); empty disables it"
+  type        = string
+  default     = "rate(6 hours)"
+}
+
+variable "cve_rescan_feed_path" {
+  description = "NVD/OSV delta feed read by re-scans instead of the NVD API (e.g. in a Lambda layer under /opt)"
+  type        = string
+  default     = ""
+}
+
+variable "cve_rescan_lookback_hours" {
+  description = "Window of CVE changes covered by the first re-scan, before a sync watermark exists"
+  type        = number
+  default     = 24
+}
+
+variable "metrics_enabled" {
+  description = "Publish per-stage timings, NVD and cache metrics as CloudWatch Embedded Metric Format log lines"
+  type        = bool
+  default     = true
+}
+
+variable "metrics_namespace" {
+  description = "CloudWatch namespace of the analyzer's EMF metrics"
+  type        = string
+  default     = "ErasmusSBOMAnalyzer"
+}
+
+variable "nvd_error_rate_threshold" {
+  description = "Alarm when more than this percentage of NVD requests fail"
+  type        = number
+  default     = 20
+}